@@ -0,0 +1,211 @@
+"""
+Пакетная отрисовка портретов без графического интерфейса.
+
+Строит по одному портрету на каждую сущность (например, студента) из файла
+с данными и сохраняет их в PNG/SVG/PDF. Отрисовка распределяется по пулу
+процессов; каждый процесс создает одну фигуру и переиспользует ее между заданиями.
+
+Пример:
+    python batch_render.py scores.csv --entity student --items subject \
+        --values score --groups category --template circular_barchart \
+        --formats png pdf --workers 8
+"""
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+import multiprocessing
+from collections import Counter
+
+DEFAULT_COLORS = [
+    "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+    "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"
+]
+
+# Состояние процесса-исполнителя: фигура, ось и функция шаблона
+_worker = {}
+
+def parse_colors(specs, groups):
+    """
+    Сопоставляет группам цвета.
+
+    specs - список вида ["#hex", ...] (цвета по порядку групп) или
+    ["группа=#hex", ...]; группам без явного цвета назначается палитра по умолчанию.
+    """
+    group_colors = {group: DEFAULT_COLORS[i % len(DEFAULT_COLORS)] for i, group in enumerate(groups)}
+    positional = [spec for spec in specs if "=" not in spec]
+    for group, color in zip(groups, positional):
+        group_colors[group] = color
+    for spec in specs:
+        if "=" in spec:
+            group, color = spec.split("=", 1)
+            group_colors[group] = color
+    return group_colors
+
+def safe_file_name(name):
+    """Заменяет в имени сущности символы, недопустимые в именах файлов"""
+    return re.sub(r'[^\w.-]+', '_', str(name)).strip('_') or "entity"
+
+def unique_file_names(entities):
+    """
+    Сопоставляет сущностям различные имена файлов: {сущность: имя}.
+
+    Разные сущности могут дать одно безопасное имя ("A/B", "A B" и "A_B" -> "A_B",
+    а на Windows и macOS совпадают и имена, различающиеся регистром). К таким
+    именам добавляется короткий хэш исходного значения, поэтому имя файла
+    сущности не зависит от порядка строк в данных.
+    """
+    entities = list(entities)
+    names = [safe_file_name(entity) for entity in entities]
+    counts = Counter(name.casefold() for name in names)
+    file_names, used = {}, set()
+    for entity, name in zip(entities, names):
+        if counts[name.casefold()] > 1:
+            digest = hashlib.blake2b(str(entity).encode("utf-8", "surrogatepass"), digest_size=4).hexdigest()
+            name = f"{name}_{digest}"
+        # Совпадение с уже выданным именем после добавления хэша - номер по порядку
+        candidate, number = name, 1
+        while candidate.casefold() in used:
+            number += 1
+            candidate = f"{name}_{number}"
+        used.add(candidate.casefold())
+        file_names[entity] = candidate
+    return file_names
+
+def _init_worker(templates_dir, template_name, settings):
+    """Создает в процессе-исполнителе фигуру и загружает шаблон (один раз на процесс)"""
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from template_registry import TemplateRegistry
+
+    figure = Figure(figsize=settings["figsize"], dpi=settings["dpi"])
+    FigureCanvasAgg(figure)
+    _worker["figure"] = figure
+    _worker["ax"] = figure.add_subplot(polar=True)
+    _worker["plot_function"] = TemplateRegistry(templates_dir).get(template_name)
+    _worker["settings"] = settings
+
+def _render_job(job):
+    """Рисует портрет одной сущности и сохраняет его во всех форматах"""
+    entity, file_name, items, values, groups = job
+    settings = _worker["settings"]
+    figure, ax = _worker["figure"], _worker["ax"]
+
+    start = time.perf_counter()
+    ax.clear()
+    _worker["plot_function"](
+        items, values, groups, ax,
+        show_legend=settings["show_legend"],
+        group_colors=settings["group_colors"]
+    )
+    ax.set_ylim(settings["y_min"], settings["y_max"])
+
+    paths = []
+    base_name = os.path.join(settings["output_dir"], file_name)
+    for file_format in settings["formats"]:
+        path = f"{base_name}.{file_format}"
+        figure.savefig(path, format=file_format, bbox_inches="tight")
+        paths.append(path)
+    return entity, paths, time.perf_counter() - start
+
+def build_jobs(data_handler, entity_column, items_column, values_column, groups_column):
+    """Разбивает данные на задания по сущностям за один проход groupby"""
+    items = data_handler.get_array(items_column, 'str')
+    values = data_handler.get_array(values_column, 'float')
+    groups = data_handler.get_array(groups_column, 'str')
+    positions = data_handler.group_positions(entity_column)
+    file_names = unique_file_names(positions)
+    for entity, rows in positions.items():
+        yield entity, file_names[entity], items[rows], values[rows], groups[rows]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная отрисовка портретов без графического интерфейса")
+    parser.add_argument("data", help="Файл с данными (CSV, Parquet, Feather/Arrow IPC)")
+    parser.add_argument("--entity", required=True, help="Столбец с ключом сущности (один портрет на значение)")
+    parser.add_argument("--items", required=True, help="Столбец для 'items'")
+    parser.add_argument("--values", required=True, help="Столбец для 'values'")
+    parser.add_argument("--groups", required=True, help="Столбец для 'groups'")
+    parser.add_argument("--template", required=True, help="Имя шаблона из папки templates")
+    parser.add_argument("--templates-dir", default="templates", help="Папка с шаблонами")
+    parser.add_argument("--colors", nargs="*", default=[],
+                        help="Цвета групп: '#hex' по порядку групп или 'группа=#hex'")
+    parser.add_argument("--formats", nargs="+", default=["png"], choices=["png", "svg", "pdf"],
+                        help="Форматы выходных файлов")
+    parser.add_argument("--output-dir", default="portraits", help="Папка для результатов")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Количество процессов")
+    parser.add_argument("--y-min", type=float, default=-50.0, help="Нижняя граница оси Y")
+    parser.add_argument("--y-max", type=float, default=90.0, help="Верхняя граница оси Y")
+    parser.add_argument("--no-legend", action="store_true", help="Не рисовать легенду")
+    parser.add_argument("--dpi", type=float, default=100.0, help="Разрешение растровых файлов")
+    parser.add_argument("--size", type=float, nargs=2, default=[6.4, 4.8], metavar=("W", "H"),
+                        help="Размер фигуры в дюймах")
+    parser.add_argument("--parse-cache", action="store_true",
+                        help="Читать CSV из кэша разобранных файлов и сохранять его туда")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from data_handler import DataHandler
+    from parse_cache import ParseCache
+    parse_cache = ParseCache() if args.parse_cache else None
+    data_handler = DataHandler(parse_cache=parse_cache)
+    start = time.perf_counter()
+    if not data_handler.load_file(args.data):
+        print(f"Не удалось загрузить данные из {args.data}", file=sys.stderr)
+        return 1
+    if parse_cache is not None and parse_cache.error:
+        print(parse_cache.error, file=sys.stderr)
+    columns = [args.entity, args.items, args.values, args.groups]
+    missing = [column for column in columns if column not in data_handler.get_columns()]
+    if missing:
+        print(f"В данных нет столбцов: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    data_handler.select_columns(columns)
+    df = data_handler.df
+    load_time = time.perf_counter() - start
+
+    groups = sorted(data_handler.unique_values(args.groups))
+    settings = {
+        "figsize": tuple(args.size),
+        "dpi": args.dpi,
+        "show_legend": not args.no_legend,
+        "group_colors": parse_colors(args.colors, groups),
+        "y_min": args.y_min,
+        "y_max": args.y_max,
+        "formats": args.formats,
+        "output_dir": args.output_dir,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = list(build_jobs(data_handler, args.entity, args.items, args.values, args.groups))
+    total = len(jobs)
+    print(f"Загружено строк: {len(df)}, сущностей: {total} ({load_time:.2f} с)")
+
+    start = time.perf_counter()
+    render_time = 0.0
+    with multiprocessing.Pool(
+        processes=max(1, min(args.workers, total)),
+        initializer=_init_worker,
+        initargs=(args.templates_dir, args.template, settings)
+    ) as pool:
+        for done, (entity, paths, seconds) in enumerate(pool.imap_unordered(_render_job, jobs, chunksize=4), 1):
+            render_time += seconds
+            print(f"[{done}/{total}] {entity}: {', '.join(paths)}")
+    elapsed = time.perf_counter() - start
+
+    files = total * len(args.formats)
+    print(
+        f"Готово: {total} портретов, {files} файлов за {elapsed:.2f} с "
+        f"({total / elapsed if elapsed else 0.0:.1f} портретов/с, "
+        f"в среднем {render_time / total if total else 0.0:.3f} с на портрет в процессе)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Набор бенчмарков: чтение данных, заполнение таблицы, подготовка данных и отрисовка шаблонов.
+
+Запускается без экрана (Agg, QT_QPA_PLATFORM=offscreen) на синтетических данных
+разных размеров. Для каждого этапа измеряются время и пиковый объем выделенной
+памяти (tracemalloc, отдельным прогоном, чтобы трассировка не искажала время).
+Результаты сохраняются в JSON и могут сравниваться с сохраненным базовым прогоном.
+
+Пример:
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --baseline bench.json --fail-threshold 1.3
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import matplotlib
+matplotlib.use("Agg")
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import data_handler
+from data_handler import DataHandler
+from template_registry import TemplateRegistry
+
+DEFAULT_SIZES = [10**2, 10**4, 10**6]
+DEFAULT_GROUPS = [5, 50, 500]
+DEFAULT_MAX_DRAW_ROWS = 10**5  # Больше строк шаблоны без агрегации рисуют минутами
+DEFAULT_REPEAT = 3  # Время этапа - лучшее из нескольких прогонов
+
+repeat = DEFAULT_REPEAT
+
+def make_dataset(rows, groups, seed=0):
+    """Генерирует синтетический набор данных: предметы, оценки и группы"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "item": [f"item_{i}" for i in range(rows)],
+        "score": rng.uniform(-40, 90, rows).round(2),
+        "group": np.array([f"group_{i}" for i in range(groups)])[rng.integers(0, groups, rows)],
+    })
+
+def measure(function, *args, setup=None, **kwargs):
+    """
+    Замеряет время функции (лучшее из repeat прогонов) и отдельным прогоном под
+    tracemalloc - пиковый объем выделенной памяти.
+
+    setup() вызывается перед каждым прогоном и не входит в замер.
+    Возвращает (результат, секунды, пик выделенной памяти в байтах).
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+def record(results, stage, case, seconds, peak, **extra):
+    entry = {"stage": stage, "case": case, "seconds": seconds, "peak_bytes": peak}
+    entry.update(extra)
+    results.append(entry)
+    print(f"{stage:<36} {case:<40} {seconds * 1000:10.2f} мс {peak / 2**20:9.1f} МБ")
+
+def bench_parse(results, csv_path, case):
+    _, seconds, peak = measure(data_handler.detect_separator, csv_path)
+    record(results, "parse.detect_separator", case, seconds, peak)
+
+    handler = DataHandler()
+    handler.lean = False
+    _, seconds, peak = measure(handler.load_csv, csv_path)
+    record(results, "parse.load_csv", case, seconds, peak)
+
+    _, seconds, peak = measure(data_handler.read_csv_chunks, csv_path, lean=True)
+    record(results, "parse.read_csv_chunks_lean", case, seconds, peak)
+
+def bench_table(results, app, df, case):
+    from PyQt6.QtWidgets import QTableView
+    from table_model import DataFrameModel
+
+    view = QTableView()
+    view.resize(900, 600)
+    model = DataFrameModel()
+    view.setModel(model)
+
+    def fill():
+        # Аналог CSVViewer.show_data плюс первая отрисовка таблицы
+        model.set_dataframe(df)
+        view.grab()
+        app.processEvents()
+
+    _, seconds, peak = measure(fill)
+    record(results, "table.show_data", case, seconds, peak)
+    view.deleteLater()
+
+def bench_prep(results, handler, case):
+    def prepare():
+        return (
+            handler.get_array("item", "str"),
+            handler.get_array("score", "float"),
+            handler.get_array("group", "str"),
+        )
+
+    # Повторная установка данных сбрасывает кэш подготовленных массивов
+    arrays, seconds, peak = measure(prepare, setup=lambda: handler.set_dataframe(handler.df, handler.schema))
+    record(results, "prep.get_array", case, seconds, peak)
+    _, seconds, peak = measure(prepare)
+    record(results, "prep.get_array_cached", case, seconds, peak)
+    return arrays
+
+def bench_templates(results, registry, templates, arrays, group_colors, case):
+    items, values, groups = arrays
+    figure = Figure(figsize=(6.4, 4.8), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot(polar=True)
+
+    for name in templates:
+        plot_function = registry.get(name)
+        _, seconds, peak = measure(
+            plot_function, items, values, groups, ax,
+            show_legend=True, group_colors=group_colors, setup=ax.clear
+        )
+        record(results, f"template.{name}.build", case, seconds, peak)
+
+        _, seconds, peak = measure(canvas.draw)
+        record(results, f"template.{name}.draw", case, seconds, peak)
+
+def available_templates(registry, requested):
+    """Возвращает шаблоны, поддерживающие контракт реестра"""
+    names = []
+    for name in requested or registry.names():
+        try:
+            registry.get(name)
+        except Exception as e:
+            print(f"Шаблон {name} пропущен: {e}")
+            continue
+        names.append(name)
+    return names
+
+def compare(results, baseline_path, threshold):
+    """Сравнивает время этапов с базовым прогоном; возвращает число регрессий"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(entry["stage"], entry["case"]): entry for entry in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\nСравнение с {baseline_path} (порог {threshold:.2f}x):")
+    for entry in results:
+        base = baseline.get((entry["stage"], entry["case"]))
+        if base is None or not base["seconds"]:
+            continue
+        ratio = entry["seconds"] / base["seconds"]
+        marker = ""
+        if ratio > threshold:
+            marker = "  <-- регрессия"
+            regressions += 1
+        print(f"{entry['stage']:<36} {entry['case']:<40} {ratio:6.2f}x{marker}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки загрузки, таблицы и шаблонов")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Количество строк")
+    parser.add_argument("--groups", type=int, nargs="+", default=DEFAULT_GROUPS, help="Количество групп")
+    parser.add_argument("--templates", nargs="*", help="Шаблоны (по умолчанию все зарегистрированные)")
+    parser.add_argument("--max-draw-rows", type=int, default=DEFAULT_MAX_DRAW_ROWS,
+                        help="Не рисовать шаблоны на наборах больше этого размера")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Количество прогонов для замера времени")
+    parser.add_argument("--skip-table", action="store_true", help="Не измерять заполнение таблицы (без PyQt)")
+    parser.add_argument("--output", help="Файл для результатов в JSON")
+    parser.add_argument("--baseline", help="JSON базового прогона для сравнения")
+    parser.add_argument("--fail-threshold", type=float, default=1.5,
+                        help="Отношение времени к базовому, выше которого этап считается регрессией")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global repeat
+    args = parse_args(argv)
+    repeat = max(1, args.repeat)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(REPO_DIR)
+
+    registry = TemplateRegistry("templates")
+    templates = available_templates(registry, args.templates)
+
+    app = None
+    if not args.skip_table:
+        from PyQt6.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.sizes:
+            for groups in args.groups:
+                case = f"rows={rows},groups={groups}"
+                df = make_dataset(rows, groups)
+                csv_path = os.path.join(tmp_dir, f"data_{rows}_{groups}.csv")
+                df.to_csv(csv_path, index=False)
+
+                bench_parse(results, csv_path, case)
+
+                handler = DataHandler()
+                handler.load_csv(csv_path)
+                if app is not None:
+                    bench_table(results, app, handler.df, case)
+                arrays = bench_prep(results, handler, case)
+
+                if rows <= args.max_draw_rows:
+                    group_colors = {group: f"C{i % 10}" for i, group in enumerate(handler.unique_values("group"))}
+                    bench_templates(results, registry, templates, arrays, group_colors, case)
+                else:
+                    print(f"{'template.*':<36} {case:<40} пропущено (--max-draw-rows {args.max_draw_rows})")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": {"numpy": np.__version__, "pandas": pd.__version__, "matplotlib": matplotlib.__version__},
+        "results": results,
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {output}")
+
+    if baseline and compare(results, baseline, args.fail_threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+Подписи элементов для круговых шаблонов.
+
+Подписи направлены по радиусу от точки привязки (конца столбца, внешнего
+кольца точек). Углы, повороты и выравнивания всех подписей вычисляются
+массивами NumPy, ширина подписей - по таблице ширин символов, которая
+измеряется один раз на шрифт. Перекрывающиеся подписи отбрасываются
+проходом по подписям, отсортированным по углу, и рисуются только оставшиеся:
+контуры их символов (тоже один раз на шрифт) собираются в один составной
+путь, который рисуется одним вызовом renderer.draw_path.
+
+Отбор выполняется при каждой отрисовке в пикселях холста, поэтому после
+изменения размера окна или приближения подписей становится больше или меньше
+без перестроения графика. Подписи, которые попали бы под видимую легенду оси,
+тоже отбрасываются.
+"""
+import threading
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.colors import to_rgba
+from matplotlib.font_manager import FontProperties, findfont, get_font
+from matplotlib.ft2font import LoadFlags
+from matplotlib.path import Path
+from matplotlib.textpath import text_to_path
+from matplotlib.transforms import IdentityTransform
+
+LABEL_FONT_SIZE = 5.5  # Размер шрифта подписей в пунктах
+LABEL_COLOR = "#2b2a2a"
+LABEL_PAD = 2.0  # Отступ подписи от точки привязки в пунктах
+LABEL_SPACING = 1.1  # Минимальное расстояние между соседними подписями в долях высоты строки
+
+_metrics_lock = threading.Lock()
+_metrics = {}  # {(файл шрифта, размер): FontMetrics}
+
+
+class FontMetrics:
+    """Высота строки, ширины и контуры символов одного шрифта в пунктах"""
+
+    def __init__(self, font_path, size):
+        self.font_path = font_path
+        self.size = size
+        font = get_font(font_path)
+        self.height = (font.ascender - font.descender) / font.units_per_EM * size
+        # Сдвиг базовой линии, при котором строка центрирована по высоте
+        self.center_offset = -(font.ascender + font.descender) / 2 / font.units_per_EM * size
+        self._codepoints = np.zeros(1, dtype=np.uint32)  # Отсортированные измеренные символы (0 - заполнитель)
+        self._widths = np.zeros(1)
+        self._glyphs = {}  # {символ: (вершины, коды) контура в пунктах}
+
+    def glyph(self, codepoint):
+        """Контур символа в пунктах от начала базовой линии"""
+        glyph = self._glyphs.get(codepoint)
+        if glyph is None:
+            vertices, codes = text_to_path.get_text_path(FontProperties(fname=self.font_path), chr(codepoint))
+            vertices = np.asarray(vertices, dtype=float).reshape(-1, 2) * (self.size / text_to_path.FONT_SCALE)
+            glyph = self._glyphs[codepoint] = (vertices, np.asarray(codes, dtype=Path.code_type))
+        return glyph
+
+    def label_path(self, label):
+        """Контур подписи в пунктах: символы подряд по ширинам из таблицы (без кернинга)"""
+        vertices, codes = [], []
+        x = 0.0
+        with _metrics_lock:
+            for char in label:
+                glyph_vertices, glyph_codes = self.glyph(ord(char))
+                vertices.append(glyph_vertices + (x, 0.0))
+                codes.append(glyph_codes)
+                x += self._widths[np.searchsorted(self._codepoints, ord(char))]
+        if not vertices:
+            return np.zeros((0, 2)), np.zeros(0, dtype=Path.code_type)
+        return np.concatenate(vertices), np.concatenate(codes)
+
+    def label_widths(self, labels):
+        """Ширины подписей в пунктах: сумма ширин символов без кернинга"""
+        labels = np.asarray(labels, dtype=str)
+        if labels.size == 0:
+            return np.zeros(0)
+        # Строки NumPy хранят символы как UCS-4: матрица кодов "подпись x позиция", хвосты заполнены нулями
+        codes = np.ascontiguousarray(labels).view(np.uint32).reshape(len(labels), -1)
+        # Шаблоны рисуются и в фоновом потоке: таблица дополняется и читается под блокировкой
+        with _metrics_lock:
+            self._measure(np.unique(codes))
+            widths = self._widths[np.searchsorted(self._codepoints, codes)]
+        return widths.sum(axis=1)
+
+    def _measure(self, codepoints):
+        """Измеряет символы, которых еще нет в таблице"""
+        missing = np.setdiff1d(codepoints, self._codepoints)
+        if missing.size == 0:
+            return
+        font = get_font(self.font_path)
+        font.set_size(self.size, 72)
+        widths = []
+        for codepoint in missing:
+            glyph = font.load_char(int(codepoint), flags=LoadFlags.NO_HINTING)
+            widths.append(glyph.linearHoriAdvance / 65536)
+        codepoints = np.concatenate([self._codepoints, missing])
+        widths = np.concatenate([self._widths, widths])
+        order = np.argsort(codepoints)
+        self._codepoints, self._widths = codepoints[order], widths[order]
+
+
+def font_metrics(fontproperties):
+    """Возвращает метрики шрифта; каждый шрифт и размер измеряются один раз"""
+    key = (findfont(fontproperties), fontproperties.get_size_in_points())
+    with _metrics_lock:
+        metrics = _metrics.get(key)
+        if metrics is None:
+            metrics = _metrics[key] = FontMetrics(*key)
+    return metrics
+
+
+def label_rotations(screen_angles):
+    """
+    Поворот (в градусах) и выравнивание подписей по углу на экране.
+
+    Подписи левой половины круга переворачиваются, чтобы текст не шел вверх
+    ногами, и выравниваются по правому краю - так они тоже идут от центра.
+    Возвращает (повороты, маска выравнивания по правому краю).
+    """
+    flipped = np.cos(screen_angles) < 0
+    rotations = np.rad2deg(screen_angles) + np.where(flipped, 180.0, 0.0)
+    return np.mod(rotations, 360.0), flipped
+
+
+def cull_labels(angles, radii, lengths, height):
+    """
+    Отбирает неперекрывающиеся подписи проходом по углу.
+
+    angles - углы подписей на экране, radii - расстояния точек привязки от
+    центра, lengths - длины подписей по радиусу, height - высота строки
+    (все в пикселях). Подпись занимает отрезок радиуса [r, r + длина]; две
+    подписи мешают друг другу, если их отрезки пересекаются, а расстояние по
+    дуге на ближайшем общем радиусе меньше высоты строки. Подписи просматриваются
+    по возрастанию угла, и подпись остается, если не мешает уже оставленным.
+
+    Возвращает индексы оставшихся подписей в порядке угла.
+    """
+    count = len(angles)
+    if count == 0:
+        return np.zeros(0, dtype=np.intp)
+    order = np.argsort(np.mod(angles, 2 * np.pi), kind="stable")
+    theta = np.mod(angles, 2 * np.pi)[order]
+    inner = np.maximum(radii[order], 1.0)
+    outer = inner + lengths[order]
+    # Дальше этого угла подписи не мешают друг другу ни на каком радиусе
+    window = height / inner.min()
+
+    kept = []
+    for i in range(count):
+        collides = False
+        # Подписи, оставленные раньше, в пределах окна; при переходе через 0 - и первые оставленные
+        for j in reversed(kept):
+            if theta[i] - theta[j] >= window:
+                break
+            if _collide(theta[i] - theta[j], inner, outer, i, j, height):
+                collides = True
+                break
+        if not collides and theta[i] + window > 2 * np.pi:
+            for j in kept:
+                if theta[j] + 2 * np.pi - theta[i] >= window:
+                    break
+                if _collide(theta[j] + 2 * np.pi - theta[i], inner, outer, i, j, height):
+                    collides = True
+                    break
+        if not collides:
+            kept.append(i)
+    return order[np.asarray(kept, dtype=np.intp)]
+
+
+def _collide(delta, inner, outer, i, j, height):
+    """Проверяет, мешают ли друг другу подписи i и j с разностью углов delta"""
+    common_inner = max(inner[i], inner[j])
+    if common_inner >= min(outer[i], outer[j]):
+        return False
+    return delta * common_inner < height
+
+
+def outside_box(starts, ends, margin, box):
+    """
+    Маска подписей, которые не задевают прямоугольник box (Bbox в пикселях).
+
+    Подпись - отрезок от starts до ends толщиной 2 * margin; проверяется
+    ее описанный прямоугольник.
+    """
+    low = np.minimum(starts, ends) - margin
+    high = np.maximum(starts, ends) + margin
+    return (
+        (high[:, 0] < box.x0) | (low[:, 0] > box.x1) |
+        (high[:, 1] < box.y0) | (low[:, 1] > box.y1)
+    )
+
+
+class CircularLabels(Artist):
+    """
+    Подписи элементов по кругу, отобранные без перекрытий.
+
+    Контур каждой подписи строится при первом показе и кэшируется, при
+    отрисовке контуры оставшихся подписей поворачиваются и переносятся
+    массивами NumPy и заливаются одним вызовом renderer.draw_path.
+    """
+
+    def __init__(self, ax, angles, radii, labels, fontsize=LABEL_FONT_SIZE, color=LABEL_COLOR, pad=LABEL_PAD):
+        super().__init__()
+        self.axes = ax
+        self.set_figure(ax.figure)
+        self.set_zorder(3)
+        self.angles = np.asarray(angles, dtype=float)
+        self.radii = np.broadcast_to(np.asarray(radii, dtype=float), self.angles.shape)
+        self.labels = np.asarray(labels).astype(str)
+        self.color = to_rgba(color)
+        self.pad = pad
+        self.metrics = font_metrics(FontProperties(size=fontsize))
+        self.widths = self.metrics.label_widths(self.labels)  # Ширины в пунктах
+        self.visible_count = 0  # Сколько подписей нарисовано при последней отрисовке
+        self._paths = {}  # {индекс подписи: (вершины, коды) контура в пунктах}
+
+    def draw(self, renderer):
+        if not self.get_visible() or len(self.angles) == 0:
+            return
+        ax = self.axes
+        to_pixels = renderer.points_to_pixels
+
+        # Точки привязки и центр круга в пикселях
+        anchors = ax.transData.transform(np.column_stack([self.angles, self.radii]))
+        center = ax.transData.transform([(0.0, ax.get_rorigin())])[0]
+        offsets = anchors - center
+        radii = np.hypot(offsets[:, 0], offsets[:, 1]) + to_pixels(self.pad)
+        screen_angles = np.arctan2(offsets[:, 1], offsets[:, 0])
+
+        # Только подписи, точка привязки которых видна на холсте
+        width, height = renderer.get_canvas_width_height()
+        anchors = center + radii[:, None] * np.column_stack([np.cos(screen_angles), np.sin(screen_angles)])
+        visible = np.flatnonzero(
+            (anchors[:, 0] >= 0) & (anchors[:, 0] <= width) & (anchors[:, 1] >= 0) & (anchors[:, 1] <= height)
+        )
+        line_height = to_pixels(self.metrics.height * LABEL_SPACING)
+
+        # Легенда шаблона стоит справа от круга и закрывает крайние подписи
+        legend = ax.get_legend()
+        if legend is not None and legend.get_visible() and len(visible):
+            directions = anchors[visible] - center
+            directions /= np.maximum(radii[visible], 1.0)[:, None]
+            ends = anchors[visible] + to_pixels(self.widths[visible])[:, None] * directions
+            visible = visible[outside_box(anchors[visible], ends, line_height / 2, legend.get_window_extent(renderer))]
+
+        survivors = visible[cull_labels(
+            screen_angles[visible], radii[visible], to_pixels(self.widths[visible]), line_height
+        )]
+        self.visible_count = len(survivors)
+        self.stale = False
+        if not len(survivors):
+            return
+
+        # Контуры оставшихся подписей одним массивом вершин
+        pieces = [self._label_path(index) for index in survivors]
+        counts = np.array([len(piece[0]) for piece in pieces])
+        if not counts.sum():
+            return
+        vertices = np.concatenate([piece[0] for piece in pieces])
+        codes = np.concatenate([piece[1] for piece in pieces])
+
+        # Выравнивание (по правому краю у перевернутых подписей, по центру строки),
+        # поворот и перенос в точку привязки - для всех вершин сразу
+        rotations, flipped = label_rotations(screen_angles[survivors])
+        shift_x = np.repeat(np.where(flipped, -self.widths[survivors], 0.0), counts)
+        x = to_pixels(vertices[:, 0] + shift_x)
+        y = to_pixels(vertices[:, 1] + self.metrics.center_offset)
+        rotations = np.repeat(np.deg2rad(rotations), counts)
+        cos, sin = np.cos(rotations), np.sin(rotations)
+        points = np.column_stack([x * cos - y * sin, x * sin + y * cos]) + np.repeat(anchors[survivors], counts, axis=0)
+
+        gc = renderer.new_gc()
+        gc.set_linewidth(0)
+        gc.set_alpha(self.get_alpha())
+        renderer.draw_path(gc, Path(points, codes), IdentityTransform(), self.color)
+        gc.restore()
+
+    def _label_path(self, index):
+        path = self._paths.get(index)
+        if path is None:
+            path = self._paths[index] = self.metrics.label_path(self.labels[index])
+        return path
+
+
+def add_circular_labels(ax, angles, radii, labels, **kwargs):
+    """Добавляет на полярную ось подписи элементов с отбором перекрытий и возвращает их артист"""
+    artist = CircularLabels(ax, angles, radii, labels, **kwargs)
+    ax.add_artist(artist)
+    return artist
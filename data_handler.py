@@ -1,61 +1,896 @@
-import pandas as pd
-import csv
-from io import StringIO
-
-def detect_separator(source):
-    """Определяет разделитель в CSV (запятая, точка с запятой и др.)"""
-    try:
-        with open(source, 'r', newline='', encoding='utf-8') if isinstance(source, str) else source as f:
-            sample = f.read(1024)
-            sniffer = csv.Sniffer()
-            return sniffer.sniff(sample).delimiter
-    except Exception:
-        return ','
-
-def load_csv(file_path):
-    """Загружает CSV из файла с автоматическим определением разделителя"""
-    try:
-        separator = detect_separator(file_path)
-        return pd.read_csv(file_path, delimiter=separator)
-    except Exception:
-        return None
-
-def process_text_input(text):
-    """Обрабатывает данные, вставленные вручную, с автоопределением разделителя"""
-    try:
-        separator = detect_separator(StringIO(text))
-        return pd.read_csv(StringIO(text), delimiter=separator)
-    except Exception:
-        return None
-
-class DataHandler:
-    def __init__(self):
-        self.df = None  # DataFrame с загруженными данными
-
-    def load_csv(self, file_path):
-        """Загружает CSV из файла с автоматическим определением разделителя"""
-        try:
-            separator = detect_separator(file_path)
-            self.df = pd.read_csv(file_path, delimiter=separator)
-            return True
-        except Exception as e:
-            print(f"Ошибка загрузки CSV: {e}")
-            return False
-
-    def process_text_input(self, text):
-        """Обрабатывает данные, вставленные вручную, с автоопределением разделителя"""
-        try:
-            separator = detect_separator(StringIO(text))
-            self.df = pd.read_csv(StringIO(text), delimiter=separator)
-            return True
-        except Exception as e:
-            print(f"Ошибка обработки текста: {e}")
-            return False
-
-    def clear_data(self):
-        """Очищает данные"""
-        self.df = None
-
-    def get_columns(self):
-        """Возвращает список столбцов DataFrame"""
-        return self.df.columns.tolist() if self.df is not None else []
\ No newline at end of file
+import os
+import csv
+import importlib
+from io import BytesIO
+from profiling import span
+
+class _LazyModule:
+    """
+    Модуль, импортируемый при первом обращении к его атрибутам.
+
+    pandas и numpy загружаются долго, а для показа окна при запуске не нужны;
+    main.py подгружает их в фоне, пока пользователь выбирает данные.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        # import_module дожидается завершения импорта, начатого в фоновом потоке
+        return getattr(importlib.import_module(self._name), attr)
+
+np = _LazyModule("numpy")
+pd = _LazyModule("pandas")
+
+CHUNK_SIZE = 100_000  # Количество строк в одной порции при чтении по частям
+SCHEMA_SAMPLE_ROWS = 10_000  # Количество строк в выборке для определения схемы
+CATEGORY_MAX_RATIO = 0.5  # Максимальная доля уникальных значений для хранения столбца как category
+PREVIEW_ROWS = 1000  # Количество строк для предпросмотра колоночных файлов и вставленных данных
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.feather', '.arrow', '.ipc')
+APPENDED_MAX_CHUNKS = 64  # Сколько дописанных порций хранится отдельно, прежде чем они склеиваются между собой
+
+class LoadCancelled(Exception):
+    """Загрузка данных прервана пользователем"""
+
+class StringReader:
+    """
+    Текстовый файловый объект поверх строки.
+
+    В отличие от StringIO не копирует строку в свой буфер: read() возвращает
+    срезы исходной строки, поэтому разбор большого вставленного текста
+    не держит в памяти его вторую полную копию.
+    """
+
+    def __init__(self, text):
+        self._text = text
+        self._position = 0
+
+    def read(self, size=-1):
+        start = self._position
+        end = len(self._text) if size is None or size < 0 else min(len(self._text), start + size)
+        self._position = end
+        return self._text[start:end]
+
+    def readline(self, size=-1):
+        start = self._position
+        end = self._text.find('\n', start) + 1 or len(self._text)
+        if size is not None and size >= 0:
+            end = min(end, start + size)
+        self._position = end
+        return self._text[start:end]
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+def detect_separator(source):
+    """Определяет разделитель в CSV (запятая, точка с запятой и др.)"""
+    try:
+        with open(source, 'r', newline='', encoding='utf-8') if isinstance(source, str) else source as f:
+            sample = f.read(1024)
+            sniffer = csv.Sniffer()
+            return sniffer.sniff(sample).delimiter
+    except Exception:
+        return ','
+
+def load_csv(file_path):
+    """Загружает CSV из файла с автоматическим определением разделителя"""
+    try:
+        separator = detect_separator(file_path)
+        return pd.read_csv(file_path, delimiter=separator)
+    except Exception:
+        return None
+
+def infer_schema(df):
+    """
+    Определяет компактную схему хранения по выборке данных.
+
+    Возвращает словарь {столбец: вид}, где вид - 'category' для строковых столбцов
+    с небольшим числом различных значений, 'integer'/'float' для числовых
+    столбцов и None для столбцов, которые остаются без изменений.
+    """
+    schema = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            schema[column] = None
+        elif pd.api.types.is_integer_dtype(series):
+            schema[column] = 'integer'
+        elif pd.api.types.is_float_dtype(series):
+            schema[column] = 'float'
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            n_unique = series.nunique(dropna=True)
+            schema[column] = 'category' if n_unique <= max(1, len(series) * CATEGORY_MAX_RATIO) else None
+        else:
+            schema[column] = None
+    return schema
+
+def downcast_float(series):
+    """
+    Сужает числовой столбец до float32, только если все значения переводятся
+    в float32 и обратно без потерь; иначе возвращает столбец без изменений.
+
+    pd.to_numeric(downcast='float') проверяет лишь приблизительное
+    совпадение, и значения вроде 0.1 теряли точность (ошибка около 1e-7).
+    """
+    if series.dtype != np.float64:
+        return series
+    values = series.to_numpy()
+    narrowed = values.astype(np.float32)
+    if not np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+        return series
+    return pd.Series(narrowed, index=series.index, name=series.name)
+
+def apply_schema(df, schema):
+    """Приводит столбцы к компактным типам: category и минимальная точная разрядность чисел"""
+    for column, kind in schema.items():
+        if column not in df.columns or kind is None:
+            continue
+        if kind == 'category':
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+        else:
+            try:
+                if kind == 'integer':
+                    # Для целых to_numeric сужает тип, только если все значения в него помещаются
+                    df[column] = pd.to_numeric(df[column], downcast=kind)
+                else:
+                    df[column] = downcast_float(pd.to_numeric(df[column]))
+            except (ValueError, TypeError):
+                # В столбце встретились нечисловые значения - оставляем как есть
+                pass
+    return df
+
+def optimize_dtypes(df):
+    """Уменьшает объем DataFrame в памяти по схеме, определенной по нему самому"""
+    return apply_schema(df, infer_schema(df))
+
+def concat_chunks(chunks):
+    """Склеивает порции, сохраняя категориальные столбцы категориальными"""
+    if len(chunks) == 1:
+        return chunks[0]
+    for column in chunks[0].columns:
+        if all(isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks):
+            # pd.concat сохраняет category только при совпадающих категориях
+            categories = chunks[0][column].cat.categories
+            for chunk in chunks[1:]:
+                categories = categories.union(chunk[column].cat.categories)
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+def schema_kinds(df):
+    """Восстанавливает схему хранения {столбец: вид} по типам столбцов DataFrame"""
+    schema = {}
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            schema[column] = 'category'
+        elif pd.api.types.is_bool_dtype(dtype):
+            schema[column] = None
+        elif pd.api.types.is_integer_dtype(dtype):
+            schema[column] = 'integer'
+        elif pd.api.types.is_float_dtype(dtype):
+            schema[column] = 'float'
+        else:
+            schema[column] = None
+    return schema
+
+def category_strings(series):
+    """Категории столбца category строками (массив объектов) и 'nan' последним - для кода -1"""
+    return np.append(series.cat.categories.astype(str).to_numpy(dtype=object), 'nan')
+
+def prepare_array(series, dtype):
+    """
+    Преобразует столбец в NumPy-массив строк ('str') или чисел ('float').
+
+    Строки возвращаются массивом объектов str, а не массивом фиксированной
+    ширины: '<U' отводит каждой строке место под самое длинное значение
+    столбца. Строки столбца category общие для всех его строк.
+    """
+    if dtype == 'str':
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Преобразуем только категории, а не каждую строку; код -1 (пропуск) -> 'nan'
+            return category_strings(series)[series.cat.codes.to_numpy()]
+        strings = series.astype(str).to_numpy(dtype=object)
+        missing = series.isna().to_numpy()
+        if missing.any():
+            strings[missing] = 'nan'
+        return strings
+    if dtype == 'float':
+        return series.to_numpy(dtype=float)
+    raise ValueError(f"Неизвестный тип подготовленного столбца: {dtype}")
+
+def append_to_buffer(buffer, length, new):
+    """
+    Дописывает массив new в буфер после первых length элементов.
+
+    Если места не хватает (или тип new шире типа буфера), буфер
+    перевыделяется с запасом в половину длины, поэтому дописывание
+    порций в среднем стоит пропорционально их размеру.
+    Возвращает (буфер, новая длина).
+    """
+    total = length + len(new)
+    dtype = new.dtype if buffer is None else np.result_type(buffer.dtype, new.dtype)
+    if buffer is None or len(buffer) < total or dtype != buffer.dtype:
+        grown = np.empty(total + total // 2, dtype=dtype)
+        if buffer is not None:
+            grown[:length] = buffer[:length]
+        buffer = grown
+    buffer[length:total] = new
+    return buffer, total
+
+def filter_key(plot_filter):
+    """Хэшируемый ключ фильтра для кэшей и ключа данных шаблонов"""
+    if not plot_filter:
+        return None
+    key = (frozenset(plot_filter.get("groups") or ()), plot_filter.get("items") or "", plot_filter.get("values"))
+    return None if key == (frozenset(), "", None) else key
+
+def describe_schema(df):
+    """Возвращает типы столбцов и объем DataFrame в памяти (в байтах)"""
+    return {
+        "columns": {str(column): str(dtype) for column, dtype in df.dtypes.items()},
+        "memory_bytes": int(df.memory_usage(deep=True).sum())
+    }
+
+def read_csv_chunks(file_path, chunksize=CHUNK_SIZE, progress_callback=None, is_cancelled=None, lean=False,
+                    cache=None):
+    """
+    Читает CSV по частям и собирает их в один DataFrame.
+
+    progress_callback(прочитано байт, всего байт, прочитано строк) вызывается после
+    каждой порции, is_cancelled() проверяется между порциями; при отмене
+    выбрасывается LoadCancelled. При lean=True схема определяется по выборке
+    из начала файла, строковые столбцы с небольшим числом значений читаются
+    сразу как category, а числа сужаются до минимальной разрядности.
+
+    cache - ParseCache: если файл не изменился с прошлого разбора, DataFrame
+    читается из кэша без разбора, иначе результат разбора сохраняется в кэш.
+    """
+    total_bytes = os.path.getsize(file_path)
+    variant = "lean" if lean else "raw"
+    cache_key = None
+    if cache is not None and not cache.enabled:
+        cache = None
+    if cache is not None:
+        with span("load.cache_read"):
+            cached = cache.load(file_path, variant)
+        if cached is not None:
+            df = cached[0]
+            if progress_callback is not None:
+                progress_callback(total_bytes, total_bytes, len(df))
+            return df
+        cache_key = cache.key(file_path, variant)[0]
+
+    df = _parse_csv_chunks(file_path, total_bytes, chunksize, progress_callback, is_cancelled, lean)
+    if cache is not None:
+        with span("load.cache_store", rows=len(df)):
+            cache.store(file_path, variant, df, key=cache_key)
+    return df
+
+def _parse_csv_chunks(file_path, total_bytes, chunksize, progress_callback, is_cancelled, lean):
+    """Разбор CSV по частям для read_csv_chunks"""
+    with span("load.detect_separator"):
+        separator = detect_separator(file_path)
+
+    schema = {}
+    dtype = None
+    if lean:
+        with span("load.infer_schema"):
+            schema = infer_schema(pd.read_csv(file_path, delimiter=separator, nrows=SCHEMA_SAMPLE_ROWS))
+        dtype = {column: 'category' for column, kind in schema.items() if kind == 'category'}
+
+    with span("load.parse_chunks", bytes=total_bytes), open(file_path, 'rb') as f:
+        reader = pd.read_csv(f, delimiter=separator, chunksize=chunksize, encoding='utf-8', dtype=dtype)
+        chunks = _collect_chunks(
+            reader, schema, is_cancelled,
+            progress_callback and (lambda rows: progress_callback(f.tell(), total_bytes, rows))
+        )
+
+    if not chunks:
+        # Файл содержит только заголовок
+        return pd.read_csv(file_path, delimiter=separator, nrows=0)
+    with span("load.concat", chunks=len(chunks)):
+        return concat_chunks(chunks)
+
+def read_text_chunks(text, chunksize=CHUNK_SIZE, preview_callback=None, is_cancelled=None, lean=False):
+    """
+    Разбирает вставленный текст по частям, как read_csv_chunks - файл.
+
+    Текст читается через StringReader без копирования. До разбора всего текста
+    вызывается preview_callback(первые строки, разделитель, схема), где схема -
+    типы столбцов, определенные по выборке.
+    """
+    with span("paste.detect_separator"):
+        separator = detect_separator(StringReader(text))
+
+    with span("paste.sample"):
+        sample = pd.read_csv(StringReader(text), delimiter=separator, nrows=max(PREVIEW_ROWS, SCHEMA_SAMPLE_ROWS))
+    schema = infer_schema(sample) if lean else {}
+    dtype = {column: 'category' for column, kind in schema.items() if kind == 'category'} or None
+    if preview_callback is not None:
+        preview = apply_schema(sample.head(PREVIEW_ROWS).copy(), schema)
+        preview_callback(preview, separator, describe_schema(preview)["columns"])
+
+    with span("paste.parse_chunks", chars=len(text)):
+        reader = pd.read_csv(StringReader(text), delimiter=separator, chunksize=chunksize, dtype=dtype)
+        chunks = _collect_chunks(reader, schema, is_cancelled)
+
+    if not chunks:
+        return sample.head(0)
+    with span("paste.concat", chunks=len(chunks)):
+        return concat_chunks(chunks)
+
+def _collect_chunks(reader, schema, is_cancelled=None, rows_callback=None):
+    """Читает порции из reader, приводя их к схеме; между порциями проверяет отмену"""
+    chunks = []
+    rows = 0
+    for chunk in reader:
+        if is_cancelled is not None and is_cancelled():
+            reader.close()
+            raise LoadCancelled()
+        chunks.append(apply_schema(chunk, schema))
+        rows += len(chunk)
+        if rows_callback is not None:
+            rows_callback(rows)
+    return chunks
+
+def is_columnar_file(file_path):
+    """Проверяет, является ли файл колоночным (Parquet, Feather/Arrow IPC)"""
+    return file_path.lower().endswith(PARQUET_EXTENSIONS + ARROW_EXTENSIONS)
+
+class ColumnarSource:
+    """
+    Колоночный источник данных: Parquet или Feather/Arrow IPC.
+
+    При открытии читаются только метаданные. Arrow IPC отображается в память
+    (memory_map), поэтому столбцы читаются без копирования; в pandas
+    материализуются только запрошенные столбцы.
+    """
+
+    def __init__(self, file_path):
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Для чтения Parquet и Feather/Arrow IPC необходим пакет pyarrow") from None
+
+        self.file_path = file_path
+        if file_path.lower().endswith(ARROW_EXTENSIONS):
+            self.format = 'arrow'
+            self._parquet = None
+            # Таблица ссылается на отображенный в память файл, данные не копируются
+            self._table = pa.ipc.open_file(pa.memory_map(file_path, 'r')).read_all()
+            schema = self._table.schema
+            self.num_rows = self._table.num_rows
+        else:
+            self.format = 'parquet'
+            self._table = None
+            self._parquet = pq.ParquetFile(file_path, memory_map=True)
+            schema = self._parquet.schema_arrow
+            self.num_rows = self._parquet.metadata.num_rows
+        self.column_names = list(schema.names)
+        self.column_types = {name: str(schema.field(name).type) for name in schema.names}
+
+    def read_columns(self, columns):
+        """Материализует в pandas только указанные столбцы"""
+        if self.format == 'arrow':
+            table = self._table.select(columns)
+        else:
+            table = self._parquet.read(columns=columns)
+        return table.to_pandas()
+
+    def read_preview(self, rows=PREVIEW_ROWS):
+        """Читает первые строки всех столбцов для предпросмотра"""
+        if self.format == 'arrow':
+            return self._table.slice(0, rows).to_pandas()
+        batches = self._parquet.iter_batches(batch_size=rows)
+        batch = next(batches, None)
+        if batch is None:
+            return self._parquet.schema_arrow.empty_table().to_pandas()
+        return batch.to_pandas()
+
+class CategoryIndex:
+    """
+    Индекс столбца для фильтрации: коды значений и их количество.
+
+    labels - строковые значения столбца в порядке первого появления, codes -
+    номер значения в labels для каждой строки. Отбор строк по набору
+    значений сводится к маске по кодам - одному проходу по массиву кодов
+    без просмотра DataFrame и без сортировки.
+    """
+
+    def __init__(self, codes, labels):
+        self.codes = codes
+        self.codes.flags.writeable = False
+        self._buffer = None  # Буфер кодов с запасом для дописывания строк
+        self.labels = list(labels)
+        self._lookup = {label: code for code, label in enumerate(self.labels)}
+        self._counts = None
+        self._folded = None  # Значения в нижнем регистре для поиска подстроки
+
+    @classmethod
+    def from_series(cls, series, strings):
+        """Строит индекс по столбцу; strings - тот же столбец, подготовленный как 'str'"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Перенумеровываются только коды категорий; код -1 (пропуск) -> 'nan', как в prepare_array
+            codes, uniques = pd.factorize(series.cat.codes.to_numpy())
+            labels = category_strings(series)[uniques]
+        else:
+            codes, labels = pd.factorize(strings)
+        return cls(codes.astype(np.int32), labels.tolist())
+
+    @property
+    def counts(self):
+        """Количество строк каждого значения"""
+        if self._counts is None:
+            self._counts = np.bincount(self.codes, minlength=len(self.labels))
+        return self._counts
+
+    def rows(self, labels):
+        """Номера строк с любым из значений labels по возрастанию"""
+        keep = np.zeros(len(self.labels), dtype=bool)
+        keep[[self._lookup[label] for label in labels if label in self._lookup]] = True
+        return np.flatnonzero(keep[self.codes])
+
+    def match(self, text):
+        """Маска значений (по кодам), содержащих подстроку text без учета регистра"""
+        if self._folded is None:
+            self._folded = [label.casefold() for label in self.labels]
+        text = text.casefold()
+        return np.fromiter((text in label for label in self._folded), dtype=bool, count=len(self._folded))
+
+    def present(self, rows=None):
+        """Значения, которые встречаются в строках rows (по умолчанию - во всех)"""
+        if rows is None:
+            return list(self.labels)
+        counts = np.bincount(self.codes[rows], minlength=len(self.labels))
+        return [label for label, count in zip(self.labels, counts) if count]
+
+    def extend(self, strings):
+        """Дописывает в индекс новые строки столбца, подготовленные как 'str'"""
+        codes, uniques = pd.factorize(strings)
+        mapping = np.array([self._code(label) for label in uniques.tolist()], dtype=np.int32)
+        new_codes = mapping[codes] if len(codes) else np.zeros(0, dtype=np.int32)
+        if self._buffer is None:
+            self._buffer = self.codes
+        self._buffer, length = append_to_buffer(self._buffer, len(self.codes), new_codes)
+        self.codes = self._buffer[:length]
+        self.codes.flags.writeable = False
+        if self._counts is not None:
+            counts = np.zeros(len(self.labels), dtype=self._counts.dtype)
+            counts[:len(self._counts)] = self._counts
+            self._counts = counts + np.bincount(new_codes, minlength=len(self.labels))
+
+    def _code(self, label):
+        code = self._lookup.get(label)
+        if code is None:
+            code = self._lookup[label] = len(self.labels)
+            self.labels.append(label)
+            if self._folded is not None:
+                self._folded.append(label.casefold())
+        return code
+
+def process_text_input(text):
+    """Обрабатывает данные, вставленные вручную, с автоопределением разделителя"""
+    try:
+        separator = detect_separator(StringReader(text))
+        return pd.read_csv(StringReader(text), delimiter=separator)
+    except Exception:
+        return None
+
+class DataHandler:
+    def __init__(self, parse_cache=None):
+        self._df = None
+        self._appended = []  # Дописанные порции, еще не склеенные с DataFrame
+        self.lean = True  # Компактное хранение: category для групп, суженные числовые типы
+        self.schema = None  # Типы столбцов и объем данных в памяти
+        self.source = None  # Колоночный источник (Parquet, Feather/Arrow IPC), если открыт
+        self.preview = None  # Первые строки колоночного источника для таблицы
+        self.version = 0  # Номер версии данных, увеличивается при каждой загрузке и очистке
+        self._arrays = {}  # Кэш подготовленных массивов: {(столбец, тип): np.ndarray}
+        self._buffers = {}  # Буферы с запасом под подготовленные массивы дописываемых данных
+        self._filtered = None  # Последний отфильтрованный набор: (ключ фильтра, массивы)
+        self.tail = None  # Состояние дочитывания файла: путь, смещение, разделитель, схема
+        # Кэш разобранных CSV на диске (ParseCache) для повторного открытия без разбора;
+        # None - без кэша (по умолчанию; в окне приложения кэш включается флажком)
+        self.parse_cache = parse_cache
+
+    @property
+    def df(self):
+        """DataFrame с загруженными данными; дописанные порции склеиваются с ним при первом обращении"""
+        if self._appended:
+            with span("data.concat_appended", chunks=len(self._appended)):
+                self._df = concat_chunks([self._df] + self._appended)
+            self._appended = []
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+        self._appended = []
+
+    def row_count(self):
+        """Количество строк данных без склеивания дописанных порций"""
+        if self._df is None:
+            return 0
+        return len(self._df) + sum(len(chunk) for chunk in self._appended)
+
+    def last_rows(self, count):
+        """Последние count строк; дописанные порции при этом не склеиваются со всем DataFrame"""
+        chunks, total = [], 0
+        for chunk in reversed(self._appended):
+            if total >= count:
+                break
+            chunks.append(chunk)
+            total += len(chunk)
+        if total < count:
+            return self.df.iloc[-count:]
+        return concat_chunks(chunks[::-1]).iloc[-count:]
+
+    def load_csv(self, file_path):
+        """Загружает CSV из файла с автоматическим определением разделителя"""
+        try:
+            df = read_csv_chunks(file_path, lean=self.lean, cache=self.parse_cache)
+            self.set_dataframe(df, describe_schema(df))
+            return True
+        except Exception as e:
+            print(f"Ошибка загрузки CSV: {e}")
+            return False
+
+    def load_file(self, file_path):
+        """Открывает файл: колоночные форматы напрямую, остальные как CSV"""
+        if not is_columnar_file(file_path):
+            return self.load_csv(file_path)
+        try:
+            source = ColumnarSource(file_path)
+            preview = source.read_preview()
+        except Exception as e:
+            print(f"Ошибка открытия файла: {e}")
+            return False
+
+        # Столбцы материализуются по запросу в get_column
+        self.tail = None
+        self.source = source
+        self.preview = preview
+        self.df = pd.DataFrame(index=pd.RangeIndex(source.num_rows))
+        self._data_changed()
+        self._update_schema()
+        return True
+
+    def process_text_input(self, text):
+        """Обрабатывает данные, вставленные вручную, с автоопределением разделителя"""
+        try:
+            separator = detect_separator(StringReader(text))
+            self.set_dataframe(pd.read_csv(StringReader(text), delimiter=separator))
+            return True
+        except Exception as e:
+            print(f"Ошибка обработки текста: {e}")
+            return False
+
+    def set_dataframe(self, df, schema=None):
+        """Подменяет данные целиком готовым DataFrame (например, загруженным в фоне)"""
+        if self.lean and schema is None:
+            df = optimize_dtypes(df)
+        self.source = None
+        self.preview = None
+        self.tail = None
+        self.df = df
+        self._data_changed()
+        self.schema = schema if schema is not None else describe_schema(df)
+
+    def clear_data(self):
+        """Очищает данные"""
+        self.df = None
+        self.schema = None
+        self.source = None
+        self.preview = None
+        self.tail = None
+        self._data_changed()
+
+    def get_columns(self):
+        """Возвращает список столбцов DataFrame"""
+        if self.source is not None:
+            return list(self.source.column_names)
+        return self.df.columns.tolist() if self.df is not None else []
+
+    def get_column(self, column):
+        """Возвращает столбец, при необходимости материализуя его из колоночного источника"""
+        if self.source is not None and column not in self.df.columns:
+            series = self.source.read_columns([column])[column]
+            self.df[column] = optimize_dtypes(series.to_frame())[column] if self.lean else series
+            self._update_schema()
+        return self.df[column]
+
+    def select_columns(self, columns):
+        """Оставляет в памяти только указанные столбцы колоночного источника"""
+        if self.source is None:
+            return
+        columns = list(dict.fromkeys(columns))
+        extra = [column for column in self.df.columns if column not in columns]
+        if extra:
+            self.df = self.df.drop(columns=extra)
+            self._arrays = {key: array for key, array in self._arrays.items() if key[0] not in extra}
+        for column in columns:
+            self.get_column(column)
+        self._update_schema()
+
+    def get_array(self, column, dtype):
+        """
+        Возвращает столбец как подготовленный NumPy-массив нужного типа.
+
+        dtype - 'str' (строки) или 'float' (числа). Массивы кэшируются по ключу
+        (столбец, тип) до следующей загрузки или очистки данных, поэтому
+        повторные перерисовки не выполняют поэлементных преобразований.
+        Возвращаемые массивы доступны только для чтения.
+        """
+        key = (column, dtype)
+        array = self._arrays.get(key)
+        if array is None:
+            array = prepare_array(self.get_column(column), dtype)
+            array.flags.writeable = False
+            self._arrays[key] = array
+        return array
+
+    def unique_values(self, column):
+        """Возвращает различные строковые значения столбца в порядке первого появления"""
+        return list(self.category_index(column).labels)
+
+    def value_bounds(self, column):
+        """Минимум и максимум числового столбца без учета пропусков; (0, 0), если чисел нет"""
+        values = self.get_array(column, 'float')
+        finite = np.isfinite(values)
+        if not finite.any():
+            return 0.0, 0.0
+        if finite.all():
+            return float(values.min()), float(values.max())
+        return float(values[finite].min()), float(values[finite].max())
+
+    def category_index(self, column):
+        """
+        Возвращает индекс столбца (CategoryIndex): коды значений и номера строк.
+
+        Индекс строится один раз на загрузку и кэшируется вместе с подготовленными
+        массивами; дописанные строки добавляются в него без перестроения.
+        """
+        key = (column, 'index')
+        index = self._arrays.get(key)
+        if index is None:
+            with span("data.category_index", column=column):
+                index = CategoryIndex.from_series(self.get_column(column), self.get_array(column, 'str'))
+            self._arrays[key] = index
+        return index
+
+    def filter_rows(self, columns, plot_filter):
+        """
+        Возвращает номера строк, прошедших фильтр, или None, если фильтр ничего не исключает.
+
+        columns - столбцы (items, values, groups). plot_filter - словарь:
+        "groups" - множество исключенных групп, "items" - подстрока в названии
+        элемента, "values" - (минимум, максимум) или None. Группы и элементы
+        отбираются по маске кодов индекса, значения - сравнением
+        подготовленного массива; DataFrame не просматривается.
+        """
+        items_column, values_column, groups_column = columns
+        rows = None
+        excluded = plot_filter.get("groups")
+        if excluded:
+            index = self.category_index(groups_column)
+            rows = index.rows([label for label in index.labels if label not in excluded])
+
+        text = plot_filter.get("items")
+        if text:
+            index = self.category_index(items_column)
+            matched = index.match(text)
+            if rows is None:
+                rows = np.flatnonzero(matched[index.codes])
+            else:
+                rows = rows[matched[index.codes[rows]]]
+
+        value_range = plot_filter.get("values")
+        if value_range is not None:
+            low, high = value_range
+            values = self.get_array(values_column, 'float')
+            if rows is None:
+                rows = np.flatnonzero((values >= low) & (values <= high))
+            else:
+                selected = values[rows]
+                rows = rows[(selected >= low) & (selected <= high)]
+        return rows
+
+    def filter_positions(self, positions, rows):
+        """Сужает разбиение {значение: номера строк} до строк rows; опустевшие значения отбрасываются"""
+        kept = np.zeros(self.row_count(), dtype=bool)
+        kept[rows] = True
+        positions = {value: value_rows[kept[value_rows]] for value, value_rows in positions.items()}
+        return {value: value_rows for value, value_rows in positions.items() if len(value_rows)}
+
+    def filtered_arrays(self, columns, plot_filter):
+        """
+        Возвращает (items, values, groups, номера строк) для отфильтрованных строк.
+
+        Без фильтра возвращаются подготовленные массивы целиком и None вместо
+        номеров строк. Результат последнего фильтра кэшируется, поэтому
+        перерисовки с тем же фильтром не выбирают строки повторно.
+        """
+        key = (tuple(columns), filter_key(plot_filter))
+        if self._filtered is not None and self._filtered[0] == key:
+            return self._filtered[1]
+        items_column, values_column, groups_column = columns
+        arrays = [
+            self.get_array(items_column, 'str'),
+            self.get_array(values_column, 'float'),
+            self.get_array(groups_column, 'str')
+        ]
+        rows = self.filter_rows(columns, plot_filter)
+        if rows is not None:
+            with span("filter.take", rows=len(rows)):
+                arrays = [array[rows] for array in arrays]
+            for array in arrays:
+                array.flags.writeable = False
+        result = (*arrays, rows)
+        self._filtered = (key, result)
+        return result
+
+    def group_positions(self, column):
+        """
+        Возвращает {значение столбца: номера строк} в порядке первого появления.
+
+        Разбиение выполняется одним проходом groupby и кэшируется вместе
+        с подготовленными массивами.
+        """
+        key = (column, 'positions')
+        positions = self._arrays.get(key)
+        if positions is None:
+            self.get_column(column)
+            positions = self.df.groupby(column, sort=False, observed=True).indices
+            self._arrays[key] = positions
+        return positions
+
+    def start_tail(self, file_path, offset=None):
+        """
+        Запоминает файл для дочитывания: смещение конца прочитанных данных,
+        разделитель и схему загруженного DataFrame.
+
+        offset - сколько байт файла уже прочитано (по умолчанию - весь файл).
+        """
+        if self.df is None or self.source is not None:
+            return False
+        with open(file_path, 'rb') as f:
+            header_end = len(f.readline())
+        stat = os.stat(file_path)
+        self.tail = {
+            "path": file_path,
+            "inode": stat.st_ino,
+            "offset": max(header_end, stat.st_size if offset is None else offset),
+            "separator": detect_separator(file_path),
+            "columns": self.df.columns.tolist(),
+            "schema": schema_kinds(self.df),
+        }
+        return True
+
+    def stop_tail(self):
+        """Прекращает дочитывание файла"""
+        self.tail = None
+
+    def read_tail(self):
+        """
+        Дочитывает строки, дописанные в файл после последнего чтения.
+
+        Разбираются только новые байты до последнего полного перевода строки,
+        разделитель и схема не определяются заново. Возвращает количество
+        добавленных строк или None, если файл был укорочен или заменен
+        и его нужно загрузить заново.
+        """
+        tail = self.tail
+        if tail is None:
+            return 0
+        try:
+            stat = os.stat(tail["path"])
+        except OSError:
+            return None
+        if stat.st_ino != tail["inode"] or stat.st_size < tail["offset"]:
+            return None
+        if stat.st_size == tail["offset"]:
+            return 0
+
+        with open(tail["path"], 'rb') as f:
+            f.seek(tail["offset"])
+            data = f.read(stat.st_size - tail["offset"])
+        complete = data.rfind(b'\n') + 1
+        if not complete:
+            # Последняя строка еще дописывается
+            return 0
+        tail["offset"] += complete
+
+        try:
+            with span("tail.parse", bytes=complete):
+                chunk = pd.read_csv(
+                    BytesIO(data[:complete]), delimiter=tail["separator"], header=None,
+                    names=tail["columns"], encoding='utf-8'
+                )
+                chunk = apply_schema(chunk, tail["schema"])
+        except Exception as e:
+            print(f"Ошибка чтения новых строк: {e}")
+            return 0
+        if chunk.empty:
+            return 0
+        with span("tail.append", rows=len(chunk)):
+            self.append_rows(chunk)
+        return len(chunk)
+
+    def append_rows(self, chunk):
+        """
+        Дописывает строки в конец данных.
+
+        Порция хранится отдельно и склеивается с DataFrame только при обращении
+        к self.df. Подготовленные массивы и индексы продлеваются в буферах
+        с запасом, схема - объемом порции, поэтому стоимость дописывания
+        зависит от числа новых строк, а не от размера файла.
+        """
+        base = self._df
+        for column, dtype in chunk.dtypes.items():
+            # Порция сужается по своим значениям (int8), DataFrame мог получить более широкий тип (int16)
+            base_dtype = base[column].dtype
+            if dtype != base_dtype and isinstance(dtype, np.dtype) and isinstance(base_dtype, np.dtype) \
+                    and np.promote_types(dtype, base_dtype) == base_dtype:
+                chunk[column] = chunk[column].astype(base_dtype)
+        same_types = all(str(dtype) == str(base[column].dtype) for column, dtype in chunk.dtypes.items())
+
+        arrays, buffers = self._arrays, self._buffers
+        self._data_changed()
+        self._appended.append(chunk)
+        if len(self._appended) > APPENDED_MAX_CHUNKS:
+            # Мелкие порции склеиваются между собой, не затрагивая основной DataFrame
+            self._appended = [concat_chunks(self._appended)]
+        for (column, dtype), array in arrays.items():
+            if dtype in ('str', 'float'):
+                key = (column, dtype)
+                buffer, length = append_to_buffer(buffers.get(key, array), len(array), prepare_array(chunk[column], dtype))
+                array = buffer[:length]
+                array.flags.writeable = False
+                self._arrays[key] = array
+                self._buffers[key] = buffer
+            elif dtype == 'index':
+                array.extend(prepare_array(chunk[column], 'str'))
+                self._arrays[(column, dtype)] = array
+
+        if same_types and self.schema is not None:
+            self.schema = {
+                "columns": self.schema["columns"],
+                "memory_bytes": self.schema["memory_bytes"] + int(chunk.memory_usage(deep=True, index=False).sum())
+            }
+        else:
+            # Тип столбца расширился (например, появились пропуски в целых) - схема по склеенным данным
+            self.schema = describe_schema(self.df)
+
+    def _data_changed(self):
+        """Отмечает смену данных: новая версия и сброс подготовленных массивов"""
+        self.version += 1
+        self._arrays = {}
+        self._buffers = {}
+        self._filtered = None
+
+    def display_frame(self):
+        """Возвращает DataFrame для таблицы на странице данных"""
+        return self.preview if self.source is not None else self.df
+
+    def _update_schema(self):
+        """Пересчитывает схему колоночного источника с учетом материализованных столбцов"""
+        columns = dict(self.source.column_types)
+        columns.update(describe_schema(self.df)["columns"])
+        self.schema = {
+            "columns": columns,
+            "memory_bytes": int(self.df.memory_usage(deep=True, index=False).sum())
+        }
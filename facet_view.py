@@ -0,0 +1,205 @@
+"""
+Режим малых множеств: сетка портретов по значениям выбранного столбца (фасета).
+
+Данные разбиваются на фасеты одним проходом groupby. Портреты показываются
+постранично, и рисуются только фасеты текущей страницы. Каждый фасет рисуется
+шаблоном на одной переиспользуемой фигуре Agg и сохраняется в кэше как растровое
+изображение, поэтому листание страниц не вызывает шаблоны повторно. Фасеты
+с одинаковым набором элементов и групп получают общий ключ раскладки, и шаблоны
+с кэшем геометрии вычисляют ее один раз.
+"""
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QImage, QPixmap
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QPushButton
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from profiling import span
+from template_layout import first_appearance_codes
+
+FACET_COLUMNS = 4  # Количество фасетов в строке сетки
+FACET_ROWS = 3  # Количество строк сетки на странице
+FACET_SIZE = 2.4  # Размер одного фасета в дюймах
+FACET_DPI = 100
+FACET_CACHE_SIZE = 256  # Сколько растровых фасетов хранить в кэше
+
+def layout_key(items, groups):
+    """
+    Ключ раскладки фасета: совпадает у фасетов с одинаковыми элементами и группами.
+
+    Строковые столбцы - массивы объектов, и их байты - это адреса объектов,
+    а не строки. Поэтому хэшируются коды значений и сами различные значения.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (items, groups):
+        array = np.asarray(array)
+        digest.update(array.dtype.str.encode())
+        if array.dtype != object:
+            digest.update(array.tobytes())
+            continue
+        uniques, codes = first_appearance_codes(array)
+        digest.update(np.asarray(codes, dtype=np.int64).tobytes())
+        for value in uniques:
+            encoded = str(value).encode("utf-8", "surrogatepass")
+            digest.update(len(encoded).to_bytes(8, "little"))
+            digest.update(encoded)
+    return ("facet", len(items), digest.hexdigest())
+
+
+class FacetRenderer:
+    """Рисует фасеты на одной фигуре Agg и кэширует результат как изображения"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.figure = Figure(figsize=(FACET_SIZE, FACET_SIZE), dpi=FACET_DPI)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(polar=True)
+        self._cache = OrderedDict()  # {(настройки, фасет): QImage}
+
+    def render(self, settings_key, facet, items, values, groups, template_name, group_colors, y_min, y_max):
+        """Возвращает изображение фасета из кэша или рисует его шаблоном"""
+        key = (settings_key, facet)
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+            return image
+
+        plot_function = self.registry.get(template_name)
+        extra_kwargs = {}
+        if self.registry.accepts(template_name, "data_key"):
+            extra_kwargs["data_key"] = layout_key(items, groups)
+
+        with span("facet.template", template=template_name, items=len(items)):
+            self.ax.clear()
+            plot_function(
+                items, values, groups, self.ax,
+                show_legend=False,
+                group_colors=group_colors or None,
+                **extra_kwargs
+            )
+            self.ax.set_ylim(y_min, y_max)
+            self.ax.set_title(str(facet), fontsize=9)
+
+        with span("facet.rasterize"):
+            self.canvas.draw()
+            width, height = self.canvas.get_width_height()
+            image = QImage(bytes(self.canvas.buffer_rgba()), width, height, QImage.Format.Format_RGBA8888).copy()
+
+        self._cache[key] = image
+        if len(self._cache) > FACET_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return image
+
+    def clear_cache(self):
+        self._cache.clear()
+
+
+class FacetView(QWidget):
+    """Постраничная сетка фасетов"""
+
+    def __init__(self, registry, parent=None):
+        super().__init__(parent)
+        self.renderer = FacetRenderer(registry)
+        self.facets = []  # [(значение фасета, номера строк)]
+        self.arrays = None  # (items, values, groups) для всех строк
+        self.settings = None
+        self.settings_key = None
+        self.page = 0
+
+        layout = QVBoxLayout()
+
+        navigation = QHBoxLayout()
+        self.btn_prev = QPushButton("< Назад")
+        self.btn_prev.clicked.connect(lambda: self.show_page(self.page - 1))
+        self.page_label = QLabel()
+        self.page_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.btn_next = QPushButton("Вперед >")
+        self.btn_next.clicked.connect(lambda: self.show_page(self.page + 1))
+        navigation.addWidget(self.btn_prev)
+        navigation.addWidget(self.page_label, 1)
+        navigation.addWidget(self.btn_next)
+        layout.addLayout(navigation)
+
+        # Ячейки сетки создаются один раз и переиспользуются на всех страницах
+        grid = QGridLayout()
+        self.tiles = []
+        for i in range(FACET_COLUMNS * FACET_ROWS):
+            tile = QLabel()
+            tile.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            grid.addWidget(tile, i // FACET_COLUMNS, i % FACET_COLUMNS)
+            self.tiles.append(tile)
+        layout.addLayout(grid, 1)
+
+        self.setLayout(layout)
+        self.update_navigation()
+
+    @property
+    def page_count(self):
+        per_page = len(self.tiles)
+        return max(1, (len(self.facets) + per_page - 1) // per_page)
+
+    def set_facets(self, positions, items, values, groups, template_name, group_colors, y_min, y_max, data_key):
+        """
+        Задает фасеты и настройки отрисовки и показывает первую страницу.
+
+        positions - {значение фасета: номера строк} (DataHandler.group_positions).
+        data_key - ключ данных; вместе с шаблоном, цветами и границами оси он
+        определяет, можно ли взять фасет из кэша изображений.
+        """
+        self.facets = list(positions.items())
+        self.arrays = (items, values, groups)
+        self.settings = {
+            "template_name": template_name,
+            "group_colors": dict(group_colors),
+            "y_min": y_min,
+            "y_max": y_max,
+        }
+        self.settings_key = (
+            data_key, template_name, tuple(sorted(group_colors.items())), y_min, y_max
+        )
+        self.show_page(0)
+
+    def show_page(self, page):
+        """Рисует (или берет из кэша) фасеты страницы page"""
+        page = min(max(page, 0), self.page_count - 1)
+        self.page = page
+        per_page = len(self.tiles)
+        visible = self.facets[page * per_page:(page + 1) * per_page]
+
+        items, values, groups = self.arrays or (None, None, None)
+        for tile, facet in zip(self.tiles, visible + [None] * (per_page - len(visible))):
+            if facet is None:
+                tile.clear()
+                continue
+            name, rows = facet
+            try:
+                image = self.renderer.render(
+                    self.settings_key, name, items[rows], values[rows], groups[rows], **self.settings
+                )
+            except Exception as e:
+                print(f"Ошибка при построении фасета {name}: {e}")
+                tile.setText(f"{name}\nошибка построения")
+                continue
+            tile.setPixmap(QPixmap.fromImage(image))
+            tile.setToolTip(f"{name}: {len(rows)} строк")
+        self.update_navigation()
+
+    def update_navigation(self):
+        self.page_label.setText(f"Страница {self.page + 1} из {self.page_count} (фасетов: {len(self.facets)})")
+        self.btn_prev.setEnabled(self.page > 0)
+        self.btn_next.setEnabled(self.page < self.page_count - 1)
+
+    def wheelEvent(self, event):
+        """Колесо мыши листает страницы"""
+        delta = event.angleDelta().y()
+        if delta:
+            self.show_page(self.page - 1 if delta > 0 else self.page + 1)
+        event.accept()
+
+    def clear(self):
+        self.facets = []
+        self.arrays = None
+        self.renderer.clear_cache()
+        self.show_page(0)
@@ -0,0 +1,200 @@
+"""
+Панель фильтра портрета: группы, подстрока в названии элемента и диапазон значений.
+
+Панель хранит только состояние фильтра. Строки отбираются в DataHandler по
+индексам столбцов (DataHandler.filter_rows), поэтому переключение групп
+сводится к индексированию массивов и не просматривает DataFrame.
+"""
+import math
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtWidgets import (
+    QGroupBox, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, QLineEdit,
+    QCheckBox, QDoubleSpinBox, QLabel, QPushButton
+)
+
+MAX_LISTED_GROUPS = 500  # Группы столбца с большим числом значений не перечисляются в списке
+FILTER_DELAY_MS = 300  # Задержка применения фильтра после ввода текста или границ
+VALUE_DECIMALS = 3  # Точность полей диапазона значений
+
+
+class FilterPanel(QGroupBox):
+    """
+    Элементы управления фильтром на странице визуализации.
+
+    filterChanged испускается при каждом изменении фильтра: сразу при
+    переключении групп и после паузы при вводе текста и границ значений.
+    """
+
+    filterChanged = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__("Фильтр", parent)
+        self.groups_column = None  # Столбец групп, для которого заполнен список
+        self.values_column = None  # Столбец значений, для которого заданы границы
+        self._groups_signature = None
+        self._excluded = set()  # Исключенные группы
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FILTER_DELAY_MS)
+        self._timer.timeout.connect(self.filterChanged)
+
+        layout = QVBoxLayout()
+        layout.setSpacing(5)
+
+        self.group_list = QListWidget()
+        self.group_list.setMaximumHeight(160)
+        self.group_list.itemChanged.connect(self._on_group_toggled)
+        layout.addWidget(self.group_list)
+
+        group_buttons = QHBoxLayout()
+        self.btn_all_groups = QPushButton("Все группы")
+        self.btn_all_groups.clicked.connect(lambda: self._check_all_groups(True))
+        self.btn_no_groups = QPushButton("Ни одной")
+        self.btn_no_groups.clicked.connect(lambda: self._check_all_groups(False))
+        group_buttons.addWidget(self.btn_all_groups)
+        group_buttons.addWidget(self.btn_no_groups)
+        layout.addLayout(group_buttons)
+
+        self.items_edit = QLineEdit()
+        self.items_edit.setPlaceholderText("Элементы содержат...")
+        self.items_edit.textChanged.connect(lambda: self._timer.start())
+        layout.addWidget(self.items_edit)
+
+        range_layout = QHBoxLayout()
+        self.range_checkbox = QCheckBox("Значения от")
+        self.range_checkbox.toggled.connect(self.filterChanged)
+        self.value_min = QDoubleSpinBox()
+        self.value_max = QDoubleSpinBox()
+        for spinbox in (self.value_min, self.value_max):
+            spinbox.setDecimals(VALUE_DECIMALS)
+            spinbox.valueChanged.connect(self._on_range_changed)
+        range_layout.addWidget(self.range_checkbox)
+        range_layout.addWidget(self.value_min)
+        range_layout.addWidget(QLabel("до"))
+        range_layout.addWidget(self.value_max)
+        layout.addLayout(range_layout)
+
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+
+        self.btn_reset = QPushButton("Сбросить фильтр")
+        self.btn_reset.clicked.connect(self.reset)
+        layout.addWidget(self.btn_reset)
+
+        self.setLayout(layout)
+
+    def filter_state(self):
+        """Состояние фильтра для DataHandler.filter_rows"""
+        return {
+            "groups": frozenset(self._excluded),
+            "items": self.items_edit.text().strip(),
+            "values": (self.value_min.value(), self.value_max.value()) if self.range_checkbox.isChecked() else None,
+        }
+
+    def set_groups(self, column, labels, counts):
+        """
+        Заполняет список групп столбца column с количеством строк каждой.
+
+        Для того же столбца исключенные группы сохраняются (в том числе после
+        дописывания строк), для другого столбца фильтр групп сбрасывается.
+        """
+        signature = (column, len(labels), tuple(counts))
+        if signature == self._groups_signature:
+            return
+        if column != self.groups_column:
+            self._excluded = set()
+        self.groups_column = column
+        self._groups_signature = signature
+
+        self.group_list.blockSignals(True)
+        self.group_list.clear()
+        listed = len(labels) <= MAX_LISTED_GROUPS
+        if listed:
+            for label, count in zip(labels, counts):
+                item = QListWidgetItem(f"{label} ({count})")
+                item.setData(Qt.ItemDataRole.UserRole, label)
+                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+                item.setCheckState(Qt.CheckState.Unchecked if label in self._excluded else Qt.CheckState.Checked)
+                self.group_list.addItem(item)
+        else:
+            self._excluded = set()
+            self.group_list.addItem(f"Значений слишком много для списка: {len(labels)}")
+        self.group_list.blockSignals(False)
+        self.group_list.setEnabled(listed)
+        self.btn_all_groups.setEnabled(listed)
+        self.btn_no_groups.setEnabled(listed)
+
+    def set_values_column(self, column, low, high):
+        """Задает границы диапазона значений по столбцу column; фильтр значений выключается"""
+        self.values_column = column
+        # Границы округляются наружу до точности полей, чтобы крайние строки проходили фильтр
+        scale = 10 ** VALUE_DECIMALS
+        low, high = math.floor(low * scale) / scale, math.ceil(high * scale) / scale
+        for spinbox, value in ((self.value_min, low), (self.value_max, high)):
+            spinbox.blockSignals(True)
+            spinbox.setRange(low, high)
+            spinbox.setSingleStep(max((high - low) / 100, 0.001))
+            spinbox.setValue(value)
+            spinbox.blockSignals(False)
+        self.range_checkbox.blockSignals(True)
+        self.range_checkbox.setChecked(False)
+        self.range_checkbox.blockSignals(False)
+
+    def set_shown(self, shown, total):
+        """Показывает, сколько строк прошло фильтр"""
+        self.summary.setText(f"Показано строк: {shown} из {total}")
+
+    def reset(self):
+        """Снимает все условия фильтра"""
+        self.clear_conditions()
+        self.filterChanged.emit()
+
+    def clear_conditions(self):
+        """Снимает условия фильтра без сигнала filterChanged"""
+        self._timer.stop()
+        self._excluded = set()
+        self.group_list.blockSignals(True)
+        for row in range(self.group_list.count()):
+            item = self.group_list.item(row)
+            if item.flags() & Qt.ItemFlag.ItemIsUserCheckable:
+                item.setCheckState(Qt.CheckState.Checked)
+        self.group_list.blockSignals(False)
+        for widget in (self.items_edit, self.range_checkbox):
+            widget.blockSignals(True)
+        self.items_edit.clear()
+        self.range_checkbox.setChecked(False)
+        for widget in (self.items_edit, self.range_checkbox):
+            widget.blockSignals(False)
+
+    def clear(self):
+        """Сбрасывает фильтр и списки при очистке данных"""
+        self.clear_conditions()
+        self.groups_column = None
+        self.values_column = None
+        self._groups_signature = None
+        self.group_list.clear()
+        self.summary.clear()
+
+    def _on_group_toggled(self, item):
+        label = item.data(Qt.ItemDataRole.UserRole)
+        if item.checkState() == Qt.CheckState.Checked:
+            self._excluded.discard(label)
+        else:
+            self._excluded.add(label)
+        self.filterChanged.emit()
+
+    def _check_all_groups(self, checked):
+        self.group_list.blockSignals(True)
+        self._excluded = set()
+        for row in range(self.group_list.count()):
+            item = self.group_list.item(row)
+            item.setCheckState(Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
+            if not checked:
+                self._excluded.add(item.data(Qt.ItemDataRole.UserRole))
+        self.group_list.blockSignals(False)
+        self.filterChanged.emit()
+
+    def _on_range_changed(self):
+        if self.range_checkbox.isChecked():
+            self._timer.start()
@@ -0,0 +1,216 @@
+"""
+Подсказки при наведении и просмотр элемента по щелчку на портрете.
+
+Попадание курсора определяется не перебором артистов matplotlib (contains()
+по тысячам столбцов и точек), а индексом, построенным из геометрии шаблона
+(GEOMETRY_FUNCTION): угол курсора переводится в номер углового сектора
+(сектор -> элемент), радиус - в номер кольца или проверяется по высоте
+столбца. Поиск занимает O(1) при любом числе элементов.
+
+Подсветка рисуется поверх готового изображения холста (blitting): при
+перемещении курсора восстанавливается сохраненный фон и дорисовывается один
+анимированный артист, без перерисовки всего графика.
+"""
+import numpy as np
+from matplotlib.lines import Line2D
+
+HIGHLIGHT_COLOR = "#202020"
+ARC_POINTS = 24  # Точек на дугу контура подсвеченного столбца
+
+
+class PortraitIndex:
+    """Индекс геометрии шаблона: угловой сектор -> элемент, радиус -> кольцо"""
+
+    def __init__(self, geometry):
+        self.kind = geometry["kind"]
+        if self.kind == "bars":
+            self.angles = np.asarray(geometry["angles"], dtype=float)
+            self.width = float(geometry["width"])
+            self.heights = np.asarray(geometry["heights"], dtype=float)
+            self.rows = np.asarray(geometry["rows"])
+            # Сектор каждого столбца; секторы-отступы между группами остаются пустыми (-1)
+            self.sectors = max(1, int(round(2 * np.pi / self.width))) if self.width else 1
+            self.sector_items = np.full(self.sectors, -1, dtype=np.intp)
+            if self.width:
+                self.sector_items[np.rint(self.angles / self.width).astype(np.intp) % self.sectors] = \
+                    np.arange(len(self.angles))
+        else:
+            self.angles = np.asarray(geometry["item_angles"], dtype=float)
+            self.sectors = len(self.angles)
+            self.width = 2 * np.pi / self.sectors if self.sectors else 0.0
+            self.ring_radii = np.asarray(geometry["ring_radii"], dtype=float)
+            self.ring_step = float(self.ring_radii[1] - self.ring_radii[0]) if len(self.ring_radii) > 1 else 1.0
+
+    def lookup(self, theta, r):
+        """
+        Возвращает элемент под точкой (угол, радиус) в координатах данных или None.
+
+        Результат - словарь: "row" - номер строки входных массивов шаблона,
+        "theta" - угол элемента, "r0"/"r1" - границы столбца (для столбцов)
+        или "ring"/"r" - номер и радиус кольца (для точек).
+        """
+        if not self.sectors or not self.width:
+            return None
+        sector = int(np.floor(theta / self.width + 0.5)) % self.sectors
+        if self.kind == "bars":
+            position = self.sector_items[sector]
+            if position < 0:
+                return None
+            height = self.heights[position]
+            low, high = min(0.0, height), max(0.0, height)
+            if not low <= r <= high:
+                return None
+            return {"row": int(self.rows[position]), "theta": self.angles[position], "r0": low, "r1": high}
+
+        ring = int(np.floor((r - self.ring_radii[0]) / self.ring_step + 0.5))
+        if not 0 <= ring < len(self.ring_radii):
+            return None
+        return {"row": sector, "theta": self.angles[sector], "ring": ring, "r": self.ring_radii[ring]}
+
+
+class PortraitInspector:
+    """
+    Подсказки и подсветка элементов на холсте Visualization.
+
+    Индекс строится при первом наведении на новый график. on_select(row, aggregated) -
+    функция, которая вызывается по щелчку на элементе: row - номер строки
+    нарисованных массивов, aggregated - True, если элементы объединены
+    уровнем детализации и номер не совпадает со строкой данных.
+    """
+
+    def __init__(self, visualization):
+        self.visualization = visualization
+        self.column_names = ("items", "values", "groups")  # Подписи полей в подсказке
+        self.on_select = None
+        self._job = None  # Задание, по которому построен индекс
+        self._index = None
+        self._hit = None
+        self._background = None  # Изображение холста без подсветки
+        self._highlight = None
+
+        visualization.connect_canvas_event("motion_notify_event", self.on_move)
+        visualization.connect_canvas_event("button_press_event", self.on_press)
+        visualization.connect_canvas_event("axes_leave_event", self.on_leave)
+        visualization.connect_canvas_event("draw_event", self.on_draw)
+
+    def on_draw(self, event):
+        # Холст перерисован: сохраненный фон устарел, подсветка стерта
+        self._background = None
+        self._hit = None
+
+    def on_leave(self, event):
+        self._set_hit(None)
+
+    def on_move(self, event):
+        if self._toolbar_busy():
+            return
+        self._set_hit(self.hit_test(event))
+
+    def on_press(self, event):
+        if self._toolbar_busy() or event.button != 1:
+            return
+        hit = self.hit_test(event)
+        if hit is not None and self.on_select is not None:
+            self.on_select(hit["row"], len(self._job["items"]) != self._job["source_rows"])
+
+    def hit_test(self, event):
+        """Возвращает элемент под курсором или None"""
+        visualization = self.visualization
+        if event.inaxes is not visualization.ax or event.xdata is None:
+            return None
+        index = self._get_index()
+        if index is None:
+            return None
+        return index.lookup(event.xdata, event.ydata)
+
+    def describe(self, row):
+        """Текст подсказки: поля items, values и groups строки нарисованных массивов"""
+        job = self._job
+        item_name, value_name, group_name = self.column_names
+        return (
+            f"{item_name}: {job['items'][row]}\n"
+            f"{value_name}: {job['values'][row]:g}\n"
+            f"{group_name}: {job['groups'][row]}"
+        )
+
+    def _toolbar_busy(self):
+        toolbar = self.visualization.toolbar
+        return toolbar is not None and bool(toolbar.mode)
+
+    def _get_index(self):
+        """Индекс для показанного графика; перестраивается, когда на холсте новый график"""
+        visualization = self.visualization
+        job = visualization.shown_job
+        if job is not self._job:
+            self._job = job
+            self._index = None
+            self._hit = None
+            self._background = None
+            self._highlight = None
+            if job is not None:
+                geometry = visualization.compute_geometry(
+                    job["items"], job["values"], job["groups"], job["template_name"],
+                    data_key=job["kwargs"].get("data_key")
+                )
+                self._index = PortraitIndex(geometry) if geometry is not None else None
+        return self._index
+
+    def _set_hit(self, hit):
+        """Подсвечивает элемент и показывает подсказку, если элемент под курсором сменился"""
+        from PyQt6.QtGui import QCursor
+        from PyQt6.QtWidgets import QToolTip
+
+        same = (hit is None and self._hit is None) or (
+            hit is not None and self._hit is not None and
+            hit["row"] == self._hit["row"] and hit.get("ring") == self._hit.get("ring")
+        )
+        if same:
+            return
+        self._hit = hit
+        self._blit(hit)
+        canvas = self.visualization.canvas
+        if hit is None:
+            QToolTip.hideText()
+        else:
+            QToolTip.showText(QCursor.pos(), self.describe(hit["row"]), canvas)
+
+    def _blit(self, hit):
+        """Восстанавливает фон и дорисовывает подсветку только поверх изображения холста"""
+        visualization = self.visualization
+        canvas, figure, ax = visualization.canvas, visualization.figure, visualization.ax
+        if self._background is None:
+            if hit is None:
+                return
+            self._background = canvas.copy_from_bbox(figure.bbox)
+        else:
+            canvas.restore_region(self._background)
+        if hit is not None:
+            ax.draw_artist(self._highlight_artist(hit))
+        canvas.blit(figure.bbox)
+
+    def _highlight_artist(self, hit):
+        """Анимированный артист подсветки: контур столбца или кольцо вокруг точки"""
+        ax = self.visualization.ax
+        if self._highlight is None or self._highlight.axes is not ax:
+            self._highlight = Line2D([], [], color=HIGHLIGHT_COLOR, linewidth=1.5, animated=True)
+            self._highlight.set_transform(ax.transData)
+            self._highlight.axes = ax
+            self._highlight.set_figure(ax.figure)
+        line = self._highlight
+        if self._index.kind == "bars":
+            half = self._index.width / 2
+            arc = np.linspace(hit["theta"] - half, hit["theta"] + half, ARC_POINTS)
+            theta = np.concatenate([arc, arc[::-1], arc[:1]])
+            r = np.concatenate([np.full(ARC_POINTS, hit["r1"]), np.full(ARC_POINTS, hit["r0"]), [hit["r1"]]])
+            line.set_data(theta, r)
+            line.set_marker("None")
+            line.set_linestyle("-")
+        else:
+            line.set_data([hit["theta"]], [hit["r"]])
+            line.set_linestyle("None")
+            line.set_marker("o")
+            line.set_markersize(13)
+            line.set_markerfacecolor("none")
+            line.set_markeredgecolor(HIGHLIGHT_COLOR)
+            line.set_markeredgewidth(1.5)
+        return line
@@ -0,0 +1,86 @@
+"""
+Уровень детализации (LOD) для портретов с очень большим числом элементов.
+
+Когда элементов больше, чем угловых позиций, различимых на холсте, элементы
+каждой группы объединяются в не более чем K соседних угловых слотов, а значения
+внутри слота агрегируются (среднее, максимум или квантиль). Тогда стоимость
+отрисовки ограничена размером холста в пикселях, а не числом строк.
+"""
+import numpy as np
+from template_layout import group_order
+
+PIXELS_PER_SLOT = 8  # Ширина одного слота по внешней окружности в пикселях (с учетом обводки столбцов)
+
+# Доступные способы агрегации: {ключ: подпись для интерфейса}
+AGGREGATIONS = {
+    "mean": "Среднее",
+    "max": "Максимум",
+    "q50": "Медиана",
+    "q90": "90-й перцентиль",
+}
+
+def slot_budget(diameter_px, zoom=1.0, pixels_per_slot=PIXELS_PER_SLOT):
+    """
+    Возвращает общее число угловых слотов для круга диаметром diameter_px.
+
+    zoom - во сколько раз увеличен масштаб по радиусу. Результат округляется
+    вниз до степени двойки, чтобы небольшие изменения размера холста
+    не вызывали пересчет агрегации.
+    """
+    slots = int(np.pi * diameter_px * max(zoom, 1.0) / pixels_per_slot)
+    if slots < 1:
+        return 1
+    return 1 << (slots.bit_length() - 1)
+
+def aggregate(items, values, groups, total_slots, how="mean"):
+    """
+    Объединяет элементы каждой группы в угловые слоты и агрегирует значения.
+
+    На группу приходится не более total_slots // (число групп) слотов; соседние
+    элементы группы (в исходном порядке) попадают в один слот. Подписью слота
+    служит первый элемент с числом объединенных элементов.
+
+    Возвращает (items, values, groups, counts) для слотов, упорядоченных по группам.
+    """
+    items = np.asarray(items)
+    values = np.asarray(values, dtype=float)
+    groups = np.asarray(groups)
+
+    order, unique_groups, codes, sizes = group_order(groups)
+
+    # Количество слотов каждой группы и номер слота для каждого элемента
+    per_group = max(1, total_slots // max(1, len(sizes)))
+    slots = np.minimum(sizes, per_group)
+    group_starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    position = np.arange(len(order)) - group_starts[codes]
+    slot_offsets = np.concatenate(([0], np.cumsum(slots)[:-1]))
+    bins = slot_offsets[codes] + position * slots[codes] // sizes[codes]
+
+    # Номера слотов не убывают, поэтому слоты - непрерывные отрезки массива
+    n_bins = int(slots.sum())
+    counts = np.bincount(bins, minlength=n_bins)
+    bin_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_values = values[order]
+
+    if how == "mean":
+        aggregated = np.bincount(bins, weights=sorted_values, minlength=n_bins) / counts
+    elif how == "max":
+        aggregated = np.maximum.reduceat(sorted_values, bin_starts) if n_bins else sorted_values[:0]
+    elif how.startswith("q"):
+        # Квантиль: сортируем значения внутри слотов и интерполируем между соседними
+        q = int(how[1:]) / 100
+        within = sorted_values[np.lexsort((sorted_values, bins))]
+        exact = bin_starts + q * (counts - 1)
+        low = np.floor(exact).astype(int)
+        high = np.ceil(exact).astype(int)
+        aggregated = within[low] + (within[high] - within[low]) * (exact - low)
+    else:
+        raise ValueError(f"Неизвестный способ агрегации: {how}")
+
+    bin_groups = unique_groups[np.repeat(np.arange(len(sizes)), slots)]
+    first_items = items[order][bin_starts]
+    labels = np.array([
+        str(item) if count == 1 else f"{item} (+{count - 1})"
+        for item, count in zip(first_items, counts)
+    ], dtype=object)
+    return labels, aggregated, bin_groups, counts
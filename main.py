@@ -1,9 +1,45 @@
-import sys
-from PyQt6.QtWidgets import QApplication
-from ui import CSVViewer
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    viewer = CSVViewer()
-    viewer.show()
-    sys.exit(app.exec())
+import time
+_start = time.perf_counter()
+
+import sys
+import threading
+import importlib
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+from ui import CSVViewer
+
+# Тяжелые модули, которые подгружаются в фоне после показа окна
+PRELOAD_MODULES = ("numpy", "pandas")
+# Модули, которых не должно быть среди загруженных к показу окна
+HEAVY_MODULES = ("numpy", "pandas", "matplotlib", "matplotlib.pyplot")
+
+def preload_modules(timings):
+    """Импортирует тяжелые модули в фоновом потоке"""
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    timings["preloaded"] = time.perf_counter() - _start
+
+def print_startup_report(window_time, timings, preload_thread, app):
+    """Печатает время запуска и завершает приложение (режим --startup-report)"""
+    print(f"Окно показано через {window_time * 1000:.0f} мс после запуска main.py")
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"Тяжелые модули, загруженные к показу окна: {', '.join(loaded) if loaded else 'нет'}")
+    preload_thread.join()
+    print(f"Фоновая загрузка {', '.join(PRELOAD_MODULES)} завершена через {timings['preloaded'] * 1000:.0f} мс")
+    print("Подробный отчет по импортам: python -X importtime main.py --startup-report")
+    app.quit()
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    viewer = CSVViewer()
+    viewer.show()
+    app.processEvents()
+    window_time = time.perf_counter() - _start
+
+    timings = {}
+    preload_thread = threading.Thread(target=preload_modules, args=(timings,), daemon=True)
+    preload_thread.start()
+
+    if "--startup-report" in sys.argv:
+        QTimer.singleShot(0, lambda: print_startup_report(window_time, timings, preload_thread, app))
+    sys.exit(app.exec())
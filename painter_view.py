@@ -0,0 +1,332 @@
+"""
+Отрисовка круговых шаблонов через QPainter без matplotlib.
+
+Виджет рисует ту же геометрию, что и функции построения шаблонов (столбцы,
+кольца точек, фоновый круг, легенда), но напрямую в QImage. Геометрия
+переводится в координаты круга единичного радиуса один раз на построение;
+при каждой отрисовке остается одно аффинное преобразование NumPy и вызовы
+QPainter по группам.
+
+Готовое изображение кэшируется: при перемещении и масштабировании кэш
+показывается с преобразованием вида (это и дает плавные 60 кадров в секунду),
+а после паузы перерисовывается в полном разрешении только видимая область.
+"""
+import numpy as np
+from matplotlib.colors import to_rgba_array
+from PyQt6.QtCore import Qt, QPointF, QRectF, QTimer
+from PyQt6.QtGui import QColor, QImage, QPainter, QPen, QPolygonF, QTransform, QFont
+from PyQt6.QtWidgets import QWidget
+from profiling import span
+
+RERENDER_DELAY_MS = 120  # Пауза после перемещения/масштабирования перед перерисовкой в полном разрешении
+ZOOM_STEP = 1.25  # Множитель масштаба на одно деление колеса мыши
+MAX_ZOOM = 200.0
+ARC_STEP = np.radians(2)  # Шаг аппроксимации дуги столбца
+LEGEND_WIDTH = 140  # Ширина области легенды в пикселях
+LEGEND_ROW = 16  # Высота строки легенды в пикселях
+
+
+def polygon_from_array(points):
+    """Создает QPolygonF из массива (n, 2) копированием в его буфер, без цикла по точкам"""
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    polygon = QPolygonF()
+    polygon.resize(len(points))
+    if len(points):
+        buffer = polygon.data()
+        buffer.setsize(points.nbytes)
+        np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)[:] = points
+    return polygon
+
+
+def qcolors(colors):
+    """Переводит цвета matplotlib в QColor"""
+    return [QColor.fromRgbF(*rgba) for rgba in to_rgba_array(colors).reshape(-1, 4)]
+
+
+class PortraitView(QWidget):
+    """
+    Виджет для отрисовки портрета через QPainter.
+
+    Цвета групп берутся из visualization.group_colors, чтобы оба способа
+    отрисовки показывали одно и то же. Колесо мыши масштабирует вокруг курсора,
+    перетаскивание сдвигает, двойной щелчок возвращает исходный вид.
+    """
+
+    def __init__(self, visualization, parent=None):
+        super().__init__(parent)
+        self.visualization = visualization
+        self.geometry = None
+        self.plot_key = None  # Шаблон и ключ данных последнего построения
+        self.show_legend = True
+        self.y_min, self.y_max = -50.0, 90.0
+        self._model = None  # Геометрия в координатах единичного круга
+        self._zoom = 1.0
+        self._pan = QPointF(0, 0)
+        self._drag_start = None
+        self._cache = None  # (QImage, преобразование вида, при котором оно нарисовано)
+
+        self._rerender_timer = QTimer(self)
+        self._rerender_timer.setSingleShot(True)
+        self._rerender_timer.setInterval(RERENDER_DELAY_MS)
+        self._rerender_timer.timeout.connect(self.invalidate)
+
+        self.setMinimumSize(200, 200)
+
+    # Построение
+
+    def set_portrait(self, geometry, template_name, show_legend=True, y_min=-50.0, y_max=90.0, data_key=None):
+        """Задает геометрию портрета и перерисовывает виджет"""
+        self.geometry = geometry
+        self.show_legend = show_legend
+        self.y_min, self.y_max = y_min, y_max
+        self.plot_key = (template_name, data_key)
+        self._build_model()
+        self.invalidate()
+        return True
+
+    def clear(self):
+        self.geometry = None
+        self.plot_key = None
+        self._model = None
+        self.invalidate()
+
+    def set_legend_visible(self, visible):
+        if self.geometry is None:
+            return False
+        self.show_legend = visible
+        self.invalidate()
+        return True
+
+    def set_ylim(self, y_min, y_max):
+        if self.geometry is None:
+            return False
+        self.y_min, self.y_max = y_min, y_max
+        self._build_model()
+        self.invalidate()
+        return True
+
+    def update_colors(self):
+        if self.geometry is None:
+            return False
+        self.invalidate()
+        return True
+
+    def reset_view(self):
+        self._zoom = 1.0
+        self._pan = QPointF(0, 0)
+        self.invalidate()
+
+    def invalidate(self):
+        """Сбрасывает кэш изображения: следующая отрисовка будет в полном разрешении"""
+        self._cache = None
+        self.update()
+
+    def _to_unit(self, theta, r):
+        """Переводит полярные координаты (угол, значение) в точки круга единичного радиуса"""
+        rho = np.clip((np.asarray(r, dtype=float) - self.y_min) / (self.y_max - self.y_min), 0, None)
+        angle = np.asarray(theta, dtype=float) + self.geometry.get("theta_offset", 0.0)
+        # Ось Y в Qt направлена вниз
+        return np.stack([rho * np.cos(angle), -rho * np.sin(angle)], axis=-1)
+
+    def _build_model(self):
+        """Переводит геометрию шаблона в координаты единичного круга"""
+        geometry = self.geometry
+        if geometry is None or self.y_max == self.y_min:
+            self._model = None
+            return
+        with span("painter.model", kind=geometry["kind"]):
+            if geometry["kind"] == "bars":
+                # Сектор столбца: внешняя дуга от 0 до значения и обратно по внутренней
+                width = geometry["width"]
+                steps = max(1, int(np.ceil(width / ARC_STEP)))
+                offsets = np.linspace(-width / 2, width / 2, steps + 1)
+                theta = geometry["angles"][:, None] + offsets[None, :]
+                heights = geometry["heights"][:, None]
+                outer = self._to_unit(theta, np.broadcast_to(heights, theta.shape))
+                inner = self._to_unit(theta[:, ::-1], np.zeros_like(theta))
+                self._model = {
+                    "polygons": np.concatenate([outer, inner], axis=1),
+                    "codes": geometry["codes"],
+                }
+            else:
+                self._model = {
+                    "empty": self._to_unit(geometry["empty_theta"], geometry["empty_r"]),
+                    "filled": self._to_unit(geometry["filled_theta"], geometry["filled_r"]),
+                    "filled_codes": geometry["filled_codes"],
+                }
+
+    # Преобразование вида
+
+    def _view_transform(self):
+        """Возвращает (масштаб, сдвиг x, сдвиг y) из единичного круга в пиксели виджета"""
+        legend_width = LEGEND_WIDTH if self.show_legend else 0
+        width = max(1, self.width() - legend_width)
+        scale = 0.45 * min(width, self.height()) * self._zoom
+        return scale, width / 2 + self._pan.x(), self.height() / 2 + self._pan.y()
+
+    def wheelEvent(self, event):
+        factor = ZOOM_STEP if event.angleDelta().y() > 0 else 1 / ZOOM_STEP
+        zoom = min(max(self._zoom * factor, 1.0), MAX_ZOOM)
+        factor = zoom / self._zoom
+        # Масштабируем вокруг курсора: точка под курсором остается на месте
+        scale, center_x, center_y = self._view_transform()
+        position = event.position()
+        self._pan += (QPointF(center_x, center_y) - position) * (factor - 1)
+        self._zoom = zoom
+        self._schedule_rerender()
+        event.accept()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_start = event.position()
+
+    def mouseMoveEvent(self, event):
+        if self._drag_start is not None:
+            self._pan += event.position() - self._drag_start
+            self._drag_start = event.position()
+            self._schedule_rerender()
+
+    def mouseReleaseEvent(self, event):
+        self._drag_start = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.reset_view()
+
+    def resizeEvent(self, event):
+        self.invalidate()
+        super().resizeEvent(event)
+
+    def _schedule_rerender(self):
+        """Показывает кэш с новым преобразованием и откладывает полную перерисовку"""
+        self.update()
+        self._rerender_timer.start()
+
+    # Отрисовка
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("white"))
+        if self._model is not None:
+            transform = self._view_transform()
+            if self._cache is None:
+                self._cache = (self.render_image(transform), transform)
+            image, cached = self._cache
+            if cached == transform:
+                painter.drawImage(0, 0, image)
+            else:
+                # Кэш, нарисованный при другом виде, сдвигается и масштабируется целиком
+                factor = transform[0] / cached[0]
+                view = QTransform()
+                view.translate(transform[1] - cached[1] * factor, transform[2] - cached[2] * factor)
+                view.scale(factor, factor)
+                painter.setTransform(view)
+                painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+                painter.drawImage(0, 0, image)
+                painter.resetTransform()
+            if self.show_legend:
+                self._paint_legend(painter)
+        painter.end()
+
+    def render_image(self, transform=None):
+        """Рисует портрет (без легенды) в QImage размером с виджет"""
+        scale, center_x, center_y = transform or self._view_transform()
+        width, height = self.width(), self.height()
+        ratio = self.devicePixelRatioF()
+        image = QImage(int(width * ratio), int(height * ratio), QImage.Format.Format_ARGB32_Premultiplied)
+        image.setDevicePixelRatio(ratio)
+        image.fill(Qt.GlobalColor.transparent)
+
+        with span("painter.render", kind=self.geometry["kind"]):
+            painter = QPainter(image)
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            background = self.geometry.get("background")
+            if background:
+                painter.setPen(Qt.PenStyle.NoPen)
+                painter.setBrush(qcolors([background])[0])
+                painter.drawEllipse(QPointF(center_x, center_y), scale, scale)
+            viewport = np.array([0, 0, width, height], dtype=float)
+            if self.geometry["kind"] == "bars":
+                self._paint_bars(painter, scale, center_x, center_y, viewport)
+            else:
+                self._paint_dots(painter, scale, center_x, center_y, viewport)
+            painter.end()
+        return image
+
+    def _group_colors(self):
+        group_colors = self.visualization.group_colors
+        groups = self.geometry["groups"]
+        default = [f"C{i % 10}" for i in range(len(groups))]
+        return qcolors([group_colors.get(group, default[i]) for i, group in enumerate(groups)])
+
+    def _points_size(self, points):
+        """Переводит размер в пунктах в пиксели"""
+        return points * self.logicalDpiX() / 72
+
+    def _paint_bars(self, painter, scale, center_x, center_y, viewport):
+        polygons = self._model["polygons"] * scale + (center_x, center_y)
+        # Пропускаем столбцы за пределами видимой области
+        low, high = polygons.min(axis=1), polygons.max(axis=1)
+        visible = (high[:, 0] >= viewport[0]) & (low[:, 0] <= viewport[2]) & \
+                  (high[:, 1] >= viewport[1]) & (low[:, 1] <= viewport[3])
+
+        pen = QPen(qcolors([self.geometry["edgecolor"]])[0])
+        pen.setWidthF(self._points_size(self.geometry["linewidth"]))
+        painter.setPen(pen)
+        codes = self._model["codes"]
+        for code, color in enumerate(self._group_colors()):
+            painter.setBrush(color)
+            for polygon in polygons[visible & (codes == code)]:
+                painter.drawPolygon(polygon_from_array(polygon))
+
+    def _paint_dots(self, painter, scale, center_x, center_y, viewport):
+        diameter = self._points_size(np.sqrt(self.geometry["dot_size"]))
+        edge = self._points_size(self.geometry["linewidth"])
+        margin = diameter
+        edge_color = qcolors([self.geometry["edgecolor"]])[0]
+
+        def draw(points, color):
+            # Точка - круглый конец пера: сначала обводка, затем заливка поверх
+            points = points * scale + (center_x, center_y)
+            inside = (points[:, 0] >= viewport[0] - margin) & (points[:, 0] <= viewport[2] + margin) & \
+                     (points[:, 1] >= viewport[1] - margin) & (points[:, 1] <= viewport[3] + margin)
+            polygon = polygon_from_array(points[inside])
+            for pen_color, pen_width in ((edge_color, diameter + edge), (color, diameter - edge)):
+                pen = QPen(pen_color)
+                pen.setWidthF(pen_width)
+                pen.setCapStyle(Qt.PenCapStyle.RoundCap)
+                painter.setPen(pen)
+                painter.drawPoints(polygon)
+
+        draw(self._model["empty"], qcolors([self.geometry["empty_color"]])[0])
+        codes = self._model["filled_codes"]
+        for code, color in enumerate(self._group_colors()):
+            draw(self._model["filled"][codes == code], color)
+
+    def _paint_legend(self, painter):
+        """Рисует легенду справа от портрета (не масштабируется вместе с ним)"""
+        groups = self.geometry["groups"]
+        colors = self._group_colors()
+        font = QFont(self.font())
+        font.setPointSizeF(8)
+        painter.setFont(font)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        rows = min(len(groups), max(1, self.height() // LEGEND_ROW))
+        left = self.width() - LEGEND_WIDTH + 10
+        top = (self.height() - rows * LEGEND_ROW) / 2
+        edge_color = qcolors([self.geometry.get("edgecolor", "lightgray")])[0]
+        for i in range(rows):
+            y = top + i * LEGEND_ROW
+            marker = QRectF(left, y + 3, 18, LEGEND_ROW - 6)
+            if self.geometry["kind"] == "dots":
+                painter.setPen(QPen(edge_color))
+                painter.setBrush(colors[i])
+                size = LEGEND_ROW - 6
+                painter.drawEllipse(QRectF(left + 4, y + 3, size, size))
+            else:
+                painter.setPen(Qt.PenStyle.NoPen)
+                painter.setBrush(colors[i])
+                painter.drawRect(marker)
+            painter.setPen(QColor("black"))
+            painter.drawText(QRectF(left + 24, y, LEGEND_WIDTH - 34, LEGEND_ROW),
+                             Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, str(groups[i]))
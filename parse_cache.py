@@ -0,0 +1,332 @@
+"""
+Кэш разобранных CSV на диске.
+
+Разобранный и типизированный DataFrame сохраняется в Feather (Arrow IPC) под
+ключом - отпечатком файла: путь, размер, время изменения и хэш начала и конца
+содержимого. Повторное открытие неизмененного файла читает Feather и
+пропускает определение разделителя и разбор; измененный файл получает новый
+отпечаток и разбирается заново, а его устаревшая запись удаляется.
+
+Общий объем кэша ограничен: при превышении удаляются записи, которые дольше
+всего не использовались (LRU по времени изменения файла записи, которое
+обновляется при каждом попадании). Запись, удаление и вытеснение выполняются
+под блокировкой файла ".lock" в папке кэша, поэтому одной папкой могут
+пользоваться несколько процессов (окно приложения и пакетная отрисовка).
+Запись больше предела объема не сохраняется. Без pyarrow кэш отключен.
+
+Пример:
+    python parse_cache.py --list
+    python parse_cache.py --clear
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import contextlib
+import importlib.util
+
+CACHE_FORMAT_VERSION = 1  # Увеличивается при изменении разбора, чтобы старые записи не использовались
+CACHE_MAX_BYTES = 2 * 2**30  # Предельный объем кэша по умолчанию
+HASH_BYTES = 1 * 2**20  # Сколько байт начала и конца файла входит в отпечаток
+CACHE_DIR_ENV = "PORTRAIT_PARSE_CACHE_DIR"  # Переменная окружения с папкой кэша
+LOCK_FILE_NAME = ".lock"  # Файл межпроцессной блокировки в папке кэша
+LOCK_TIMEOUT = 10.0  # Сколько секунд ждать блокировку кэша, прежде чем отказаться от него
+LOCK_RETRY_INTERVAL = 0.05
+
+
+def default_cache_dir():
+    """Папка кэша: из переменной окружения или в пользовательской папке кэшей"""
+    directory = os.environ.get(CACHE_DIR_ENV)
+    if directory:
+        return directory
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "data_portrait_constructor", "parse_cache")
+
+
+@contextlib.contextmanager
+def locked_file(path, timeout=LOCK_TIMEOUT):
+    """
+    Удерживает исключительную блокировку файла path.
+
+    Если другой процесс не снимает блокировку timeout секунд (завис или
+    ведет долгую запись), выбрасывается TimeoutError.
+    """
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            def lock():
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+            def unlock():
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            def lock():
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+            def unlock():
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                lock()
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Блокировка {path} не снята за {timeout:g} с")
+                time.sleep(LOCK_RETRY_INTERVAL)
+        try:
+            yield
+        finally:
+            unlock()
+
+
+def fingerprint(file_path):
+    """
+    Отпечаток файла: путь, размер, время изменения и хэш первых и последних HASH_BYTES байт.
+
+    Возвращает (шестнадцатеричный хэш, размер, время изменения в наносекундах).
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(os.path.abspath(file_path).encode("utf-8", "surrogatepass"))
+    digest.update(f"|{stat.st_size}|{stat.st_mtime_ns}|".encode())
+    with open(file_path, "rb") as f:
+        digest.update(f.read(HASH_BYTES))
+        if stat.st_size > HASH_BYTES:
+            f.seek(max(HASH_BYTES, stat.st_size - HASH_BYTES))
+            digest.update(f.read(HASH_BYTES))
+    return digest.hexdigest(), stat.st_size, stat.st_mtime_ns
+
+
+class ParseCache:
+    """
+    Кэш разобранных файлов: по записи "<ключ>.feather" с данными и "<ключ>.json"
+    с описанием (исходный файл, вариант разбора, число строк, время создания).
+
+    variant различает способы разбора одного файла (например, компактное
+    хранение с category и без него). Ошибки чтения и записи не прерывают
+    загрузку: запрос считается промахом, а текст последней ошибки хранится
+    в error.
+    """
+
+    def __init__(self, directory=None, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.error = None  # Последняя ошибка кэша
+        # Feather читается и пишется через pyarrow; без него кэш не используется
+        self.enabled = importlib.util.find_spec("pyarrow") is not None
+        if not self.enabled:
+            self.error = "Кэш разбора отключен: не установлен pyarrow"
+        self._lock = threading.Lock()  # Запись и вытеснение из потока загрузки и из интерфейса
+
+    def key(self, file_path, variant=""):
+        """Возвращает (ключ записи, размер файла) для текущего содержимого файла"""
+        digest, size, mtime_ns = fingerprint(file_path)
+        key = hashlib.blake2b(f"{digest}|{variant}|{CACHE_FORMAT_VERSION}".encode(), digest_size=20).hexdigest()
+        return key, size
+
+    def load(self, file_path, variant=""):
+        """
+        Возвращает (DataFrame, описание записи) для неизмененного файла или None.
+
+        При попадании запись отмечается как использованная последней.
+        """
+        if not self.enabled:
+            return None
+        key = None
+        try:
+            key, size = self.key(file_path, variant)
+            data_path = self._path(key, ".feather")
+            if not os.path.exists(data_path):
+                return None
+            import pandas as pd
+            df = pd.read_feather(data_path)
+            with open(self._path(key, ".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(data_path)
+        except FileNotFoundError:
+            # Запись вытеснена другим процессом между проверкой и чтением
+            return None
+        except Exception as e:
+            # Поврежденная запись удаляется, чтобы не читать ее при каждой загрузке
+            self.error = f"Ошибка чтения кэша разбора: {e}"
+            if key is not None:
+                try:
+                    with self._locked():
+                        self._remove(key)
+                except OSError:
+                    pass
+            return None
+        return df, meta
+
+    def store(self, file_path, variant, df, key=None, **meta):
+        """
+        Сохраняет разобранный DataFrame. key - ключ, полученный до разбора:
+        если файл изменился во время разбора, запись не сохраняется. Запись
+        больше max_bytes тоже не сохраняется. Возвращает True, если запись сохранена.
+        """
+        if not self.enabled:
+            return False
+        current_key = None
+        # Временные файлы уникальны для процесса и потока, поэтому пишутся без блокировки
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            current_key, size = self.key(file_path, variant)
+            if key is not None and key != current_key:
+                return False
+            os.makedirs(self.directory, exist_ok=True)
+            meta.update(
+                source=os.path.abspath(file_path), variant=variant, size=size,
+                rows=len(df), columns=[str(column) for column in df.columns], created=time.time()
+            )
+            data_path = self._path(current_key, ".feather")
+            df.reset_index(drop=True).to_feather(data_path + suffix)
+            with open(self._path(current_key, ".json" + suffix), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            entry_bytes = os.path.getsize(data_path + suffix) + \
+                os.path.getsize(self._path(current_key, ".json" + suffix))
+            if entry_bytes > self.max_bytes:
+                self.error = (
+                    f"Файл не сохранен в кэш разбора: запись {entry_bytes / 2**20:.1f} МБ "
+                    f"больше предела {self.max_bytes / 2**20:.1f} МБ"
+                )
+                self._remove(current_key, suffix)
+                return False
+            with self._locked():
+                # Запись появляется целиком: переименование атомарно
+                os.replace(self._path(current_key, ".json" + suffix), self._path(current_key, ".json"))
+                os.replace(data_path + suffix, data_path)
+
+                # Записи прежнего содержимого того же файла больше не понадобятся
+                for entry in self._entries():
+                    if entry["key"] != current_key and entry["source"] == meta["source"] and \
+                            entry["variant"] == variant:
+                        self._remove(entry["key"])
+                self._evict()
+        except Exception as e:
+            self.error = f"Ошибка записи в кэш разбора: {e}"
+            if current_key is not None:
+                self._remove(current_key, suffix)
+            return False
+        return True
+
+    def entries(self):
+        """Записи кэша от последней использованной к самой старой"""
+        with self._locked():
+            return sorted(self._entries(), key=lambda entry: entry["last_used"], reverse=True)
+
+    def total_bytes(self):
+        return sum(entry["bytes"] for entry in self.entries())
+
+    def clear(self):
+        """Удаляет все записи; возвращает их количество"""
+        with self._locked():
+            entries = self._entries()
+            for entry in entries:
+                self._remove(entry["key"])
+        return len(entries)
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Блокировка кэша от других потоков этого процесса и от других процессов"""
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                yield
+                return
+            with locked_file(os.path.join(self.directory, LOCK_FILE_NAME)):
+                yield
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".feather"):
+                continue
+            key = name[:-len(".feather")]
+            try:
+                data_stat = os.stat(self._path(key, ".feather"))
+            except OSError:
+                # Запись удалена, пока просматривалась папка
+                continue
+            try:
+                with open(self._path(key, ".json"), encoding="utf-8") as f:
+                    meta = json.load(f)
+                meta_bytes = os.path.getsize(self._path(key, ".json"))
+            except (OSError, ValueError):
+                # Запись без описания (прервана запись) - только данные
+                meta, meta_bytes = {}, 0
+            entries.append({
+                "key": key,
+                "source": meta.get("source"),
+                "variant": meta.get("variant"),
+                "rows": meta.get("rows"),
+                "bytes": data_stat.st_size + meta_bytes,
+                "last_used": data_stat.st_mtime,
+            })
+        return entries
+
+    def _remove(self, key, suffix=""):
+        """Удаляет запись key; с suffix - ее временные файлы"""
+        for name in (".feather", ".json"):
+            try:
+                os.remove(self._path(key, name + suffix))
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Удаляет давно не использованные записи, пока объем кэша больше предела"""
+        entries = sorted(self._entries(), key=lambda entry: entry["last_used"])
+        total = sum(entry["bytes"] for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(entry["key"])
+            total -= entry["bytes"]
+
+
+def format_entries(cache):
+    """Текстовое описание кэша: записи и общий объем"""
+    entries = cache.entries()
+    lines = [f"Кэш разбора: {cache.directory}"]
+    for entry in entries:
+        lines.append(
+            f"  {entry['source']} [{entry['variant']}]: строк {entry['rows']}, "
+            f"{entry['bytes'] / 2**20:.1f} МБ, использован {time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['last_used']))}"
+        )
+    total = sum(entry["bytes"] for entry in entries)
+    lines.append(f"Записей: {len(entries)}, объем {total / 2**20:.1f} из {cache.max_bytes / 2**20:.0f} МБ")
+    if cache.error:
+        lines.append(cache.error)
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Просмотр и очистка кэша разобранных CSV")
+    parser.add_argument("--dir", default=None, help="Папка кэша")
+    parser.add_argument("--list", action="store_true", help="Показать записи кэша")
+    parser.add_argument("--clear", action="store_true", help="Удалить все записи")
+    args = parser.parse_args(argv)
+
+    cache = ParseCache(args.dir)
+    if args.clear:
+        print(f"Удалено записей: {cache.clear()}")
+    if args.list or not args.clear:
+        print(format_entries(cache))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
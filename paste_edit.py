@@ -0,0 +1,69 @@
+from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtWidgets import QTextEdit
+
+LARGE_PASTE_CHARS = 1_000_000  # Вставки длиннее этого не помещаются в редактор
+
+
+class PasteEdit(QTextEdit):
+    """
+    Поле для вставки CSV-данных.
+
+    Небольшие вставки и ручной ввод редактируются как обычно. Большая вставка
+    из буфера обмена не помещается в документ редактора (он плохо справляется
+    с сотнями тысяч строк): текст хранится одной строкой Python, а в поле
+    показывается только сводка. Любая правка в поле заменяет такую вставку.
+    """
+
+    dataChanged = pyqtSignal()  # Изменился текст данных (правка или большая вставка)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAcceptRichText(False)
+        self._payload = None  # Текст большой вставки
+        self._placeholder = ""
+        self.textChanged.connect(self._on_text_changed)
+
+    def data_text(self):
+        """Возвращает текст данных: большую вставку или содержимое редактора"""
+        if self._payload is not None:
+            return self._payload
+        return self.toPlainText()
+
+    def has_payload(self):
+        return self._payload is not None
+
+    def insertFromMimeData(self, source):
+        if not source.hasText():
+            super().insertFromMimeData(source)
+            return
+        text = source.text()
+        if len(text) < LARGE_PASTE_CHARS:
+            super().insertFromMimeData(source)
+            return
+
+        # Документ очищается без сигнала, чтобы не сбросить только что сохраненную вставку
+        self.blockSignals(True)
+        super().clear()
+        self.blockSignals(False)
+        self._payload = text
+        if not self._placeholder:
+            self._placeholder = self.placeholderText()
+        lines = text.count('\n') + 1
+        self.setPlaceholderText(
+            f"Вставлено строк: {lines} ({len(text) / 1e6:.1f} млн символов).\n"
+            "Текст не показывается в редакторе. Начните ввод, чтобы заменить вставку."
+        )
+        self.dataChanged.emit()
+
+    def clear(self):
+        self._drop_payload()
+        super().clear()
+
+    def _on_text_changed(self):
+        self._drop_payload()
+        self.dataChanged.emit()
+
+    def _drop_payload(self):
+        if self._payload is not None:
+            self._payload = None
+            self.setPlaceholderText(self._placeholder)
@@ -0,0 +1,174 @@
+"""
+Легковесные замеры времени этапов загрузки и отрисовки.
+
+Замеры выключены по умолчанию: span() тогда возвращает общий пустой контекст,
+и накладные расходы сводятся к одной проверке флага. Включаются переменной
+окружения PORTRAIT_PROFILE=1 или функцией enable().
+
+Этапы (span) группируются в трассы (trace): например, одна трасса на одну
+отрисовку. Разбивка последней трассы каждого вида доступна через last_trace(),
+а все этапы пишутся в журнал JSON Lines (PORTRAIT_PROFILE_LOG,
+по умолчанию portrait_profile.jsonl).
+
+Шаблоны могут добавлять свои этапы:
+    from profiling import span
+    with span("template.layout"):
+        ...
+"""
+import os
+import json
+import time
+import threading
+import itertools
+
+DEFAULT_LOG_PATH = "portrait_profile.jsonl"
+
+_enabled = os.environ.get("PORTRAIT_PROFILE", "") not in ("", "0")
+_log_path = os.environ.get("PORTRAIT_PROFILE_LOG", DEFAULT_LOG_PATH)
+_log_lock = threading.Lock()
+_local = threading.local()  # Текущая трасса своя у каждого потока
+_trace_ids = itertools.count(1)
+_last_traces = {}  # {вид трассы: последняя завершенная трасса}
+
+
+class _NullContext:
+    """Пустой контекст для выключенных замеров"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL = _NullContext()
+
+
+class _Span:
+    """Замер одного этапа"""
+
+    __slots__ = ("name", "attrs", "start", "wall_start")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record = {
+            "span": self.name,
+            "start": self.wall_start,
+            "ms": (time.perf_counter() - self.start) * 1000,
+        }
+        if self.attrs:
+            record.update(self.attrs)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            record["trace"] = trace.kind
+            record["trace_id"] = trace.trace_id
+            trace.spans.append(record)
+        else:
+            _write([record])
+        return False
+
+
+class _Trace:
+    """Группа этапов одной операции (загрузки, отрисовки)"""
+
+    __slots__ = ("kind", "attrs", "trace_id", "spans", "start", "parent")
+
+    def __init__(self, kind, attrs):
+        self.kind = kind
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.trace_id = next(_trace_ids)
+        self.spans = []
+        self.parent = getattr(_local, "trace", None)
+        _local.trace = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        total_ms = (time.perf_counter() - self.start) * 1000
+        _local.trace = self.parent
+        summary = {
+            "trace": self.kind,
+            "trace_id": self.trace_id,
+            "span": self.kind,
+            "start": time.time() - total_ms / 1000,
+            "ms": total_ms,
+        }
+        if self.attrs:
+            summary.update(self.attrs)
+        _last_traces[self.kind] = {
+            "total_ms": total_ms,
+            "spans": [(record["span"], record["ms"]) for record in self.spans],
+        }
+        _write(self.spans + [summary])
+        return False
+
+
+def span(name, **attrs):
+    """Контекст замера этапа; при выключенных замерах ничего не делает"""
+    if not _enabled:
+        return _NULL
+    return _Span(name, attrs)
+
+
+def trace(kind, **attrs):
+    """Контекст трассы: этапы внутри нее попадают в одну разбивку"""
+    if not _enabled:
+        return _NULL
+    return _Trace(kind, attrs)
+
+
+def last_trace(kind):
+    """Возвращает разбивку последней трассы вида kind: {"total_ms", "spans": [(этап, мс)]}"""
+    return _last_traces.get(kind)
+
+
+def format_trace(kind):
+    """Форматирует разбивку последней трассы для строки состояния"""
+    summary = last_trace(kind)
+    if summary is None:
+        return ""
+    parts = " · ".join(f"{name} {ms:.1f} мс" for name, ms in summary["spans"])
+    return f"{kind}: {summary['total_ms']:.1f} мс ({parts})"
+
+
+def enable(log_path=None):
+    """Включает замеры; log_path - путь к журналу JSON Lines (None - не менять)"""
+    global _enabled, _log_path
+    if log_path is not None:
+        _log_path = log_path
+    _enabled = True
+
+
+def disable():
+    """Выключает замеры"""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def _write(records):
+    """Дописывает записи в журнал JSON Lines"""
+    if not records or not _log_path:
+        return
+    lines = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+    try:
+        with _log_lock, open(_log_path, "a", encoding="utf-8") as f:
+            f.write(lines)
+    except OSError as e:
+        print(f"Ошибка записи журнала замеров: {e}")
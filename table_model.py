@@ -0,0 +1,72 @@
+from bisect import bisect_right
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class DataFrameModel(QAbstractTableModel):
+    """
+    Табличная модель поверх столбцов DataFrame.
+
+    Значения ячеек форматируются лениво: QTableView запрашивает только видимые
+    строки, поэтому время первой отрисовки и расход памяти не зависят
+    от количества строк в файле. Дописанные строки хранятся отдельными блоками,
+    чтобы добавление не копировало уже показанные данные.
+    """
+
+    def __init__(self, df=None, parent=None):
+        super().__init__(parent)
+        self._headers = []
+        self._blocks = []  # Блоки строк: массивы значений по столбцам (без копирования DataFrame)
+        self._block_starts = []  # Номер первой строки каждого блока
+        self._row_count = 0
+        if df is not None:
+            self.set_dataframe(df)
+
+    def set_dataframe(self, df):
+        """Подключает модель к новому DataFrame"""
+        self.beginResetModel()
+        self._blocks = []
+        self._block_starts = []
+        self._row_count = 0
+        if df is None:
+            self._headers = []
+        else:
+            self._headers = [str(column) for column in df.columns]
+            self._add_block(df)
+        self.endResetModel()
+
+    def append_rows(self, df):
+        """Добавляет строки в конец таблицы без сброса модели"""
+        if df.shape[0] == 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._row_count, self._row_count + df.shape[0] - 1)
+        self._add_block(df)
+        self.endInsertRows()
+
+    def _add_block(self, df):
+        self._blocks.append([df.iloc[:, col].to_numpy() for col in range(df.shape[1])])
+        self._block_starts.append(self._row_count)
+        self._row_count += df.shape[0]
+
+    def clear(self):
+        """Отключает модель от данных"""
+        self.set_dataframe(None)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        row = index.row()
+        block = bisect_right(self._block_starts, row) - 1
+        return str(self._blocks[block][index.column()][row - self._block_starts[block]])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self._headers[section] if section < len(self._headers) else None
+        return str(section + 1)
@@ -0,0 +1,103 @@
+"""
+Общие вычисления раскладки для шаблонов.
+
+Коды значений в порядке первого появления, порядок строк по группам,
+сводная матрица "серия x ось" и кэш раскладок по ключу данных. Шаблоны
+загружаются реестром по пути к файлу, поэтому общий код лежит в корне
+проекта, как и circular_labels.
+
+Строковые столбцы приходят массивами объектов str (DataHandler.get_array),
+поэтому значения кодируются хэшированием (pd.factorize), а сортируются
+только различные значения, а не все строки.
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+LAYOUT_CACHE_SIZE = 8  # Сколько раскладок хранить в кэше одного шаблона
+
+
+def first_appearance_codes(array):
+    """Возвращает (уникальные значения в порядке первого появления, коды элементов)"""
+    codes, uniques = pd.factorize(np.asarray(array), use_na_sentinel=False)
+    return np.asarray(uniques), codes
+
+
+def group_order(groups):
+    """
+    Устойчивый порядок строк по группам, группы по возрастанию.
+
+    Возвращает (порядок строк, группы по возрастанию, коды групп в этом
+    порядке строк, размеры групп) - как argsort(groups, kind="stable")
+    с np.unique, но сортируются только различные группы.
+    """
+    uniques, codes = first_appearance_codes(groups)
+    unique_order = np.argsort(uniques, kind="stable")
+    rank = np.empty_like(unique_order)
+    rank[unique_order] = np.arange(len(unique_order))
+    ranked = rank[codes]
+    order = np.argsort(ranked, kind="stable")
+    return order, uniques[unique_order], ranked[order], np.bincount(ranked, minlength=len(uniques))
+
+
+def pivot_cells(items, groups):
+    """
+    Оси (элементы) и серии (группы) в порядке первого появления и плоский
+    индекс ячейки "серия x ось" для каждой строки.
+    """
+    axes, axis_codes = first_appearance_codes(items)
+    series, series_codes = first_appearance_codes(groups)
+    return axes, series, series_codes * len(axes) + axis_codes
+
+
+def pivot_scores(cells, values, shape):
+    """
+    Сводит значения в матрицу shape = (серии, оси) одним проходом bincount.
+
+    Повторяющиеся пары усредняются, отсутствующие заполняются нулями.
+    """
+    size = shape[0] * shape[1]
+    values = np.asarray(values, dtype=float)
+    totals = np.bincount(cells, weights=values, minlength=size)
+    counts = np.bincount(cells, minlength=size)
+    scores = np.divide(totals, counts, out=np.zeros(size), where=counts > 0)
+    return scores.reshape(shape)
+
+
+class LayoutCache:
+    """
+    Кэш раскладок шаблона: {ключ данных: раскладка}, вытесняется самая давняя.
+
+    Перекраска и переключение легенды не меняют раскладку, поэтому она
+    вычисляется только для новых данных. Кэшем пользуются поток интерфейса
+    и поток фоновой отрисовки, поэтому обращения к нему защищены блокировкой.
+    """
+
+    def __init__(self, compute_layout, size=LAYOUT_CACHE_SIZE):
+        self.compute_layout = compute_layout  # compute_layout(items, groups) -> раскладка
+        self.size = size
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, data_key):
+        with self._lock:
+            return data_key in self._layouts
+
+    def get(self, items, groups, data_key=None):
+        """Возвращает раскладку из кэша по ключу данных или вычисляет ее заново"""
+        if data_key is None:
+            return self.compute_layout(items, groups)
+        with self._lock:
+            layout = self._layouts.get(data_key)
+            if layout is not None:
+                self._layouts.move_to_end(data_key)
+                return layout
+        # Раскладка считается вне блокировки: поток интерфейса не ждет фоновую отрисовку
+        layout = self.compute_layout(items, groups)
+        with self._lock:
+            self._layouts[data_key] = layout
+            self._layouts.move_to_end(data_key)
+            if len(self._layouts) > self.size:
+                self._layouts.popitem(last=False)
+        return layout
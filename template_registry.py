@@ -0,0 +1,106 @@
+import os
+import inspect
+import importlib.util
+
+# Имя атрибута, через который шаблон регистрирует свою функцию построения
+PLOT_FUNCTION_ATTR = "PLOT_FUNCTION"
+# Имя необязательного атрибута с функцией геометрии для отрисовки без matplotlib
+GEOMETRY_FUNCTION_ATTR = "GEOMETRY_FUNCTION"
+
+
+class TemplateRegistry:
+    """
+    Реестр шаблонов визуализации.
+
+    Шаблоны обнаруживаются один раз при первом обращении, модули и их функции
+    построения кэшируются. Модуль перезагружается только если изменилось
+    время модификации файла шаблона.
+
+    Контракт шаблона: модуль объявляет на верхнем уровне
+    PLOT_FUNCTION = <функция(items, values, groups, ax, show_legend, group_colors)>.
+    Необязательные именованные параметры (например, data_key) передаются
+    только тем шаблонам, которые их объявляют.
+
+    Шаблоны, которые можно рисовать через QPainter (painter_view), дополнительно
+    объявляют GEOMETRY_FUNCTION = <функция(items, values, groups[, data_key])>,
+    возвращающую геометрию в полярных координатах.
+    """
+
+    def __init__(self, templates_dir="templates"):
+        self.templates_dir = templates_dir
+        self._paths = None  # {имя шаблона: путь к файлу}
+        # {имя шаблона: (mtime, модуль, функция построения, имена параметров,
+        #               функция геометрии или None, имена ее параметров)}
+        self._cache = {}
+
+    def discover(self):
+        """Сканирует папку с шаблонами и запоминает найденные файлы"""
+        self._paths = {}
+        if os.path.exists(self.templates_dir):
+            for file_name in sorted(os.listdir(self.templates_dir)):
+                if file_name.endswith(".py") and not file_name.startswith("_"):
+                    name = file_name[:-len(".py")]
+                    self._paths[name] = os.path.join(self.templates_dir, file_name)
+        # Удаляем из кэша шаблоны, файлы которых исчезли
+        for name in list(self._cache):
+            if name not in self._paths:
+                del self._cache[name]
+        return self.names()
+
+    def names(self):
+        """Возвращает список доступных шаблонов"""
+        if self._paths is None:
+            self.discover()
+        return list(self._paths)
+
+    def get_module(self, name):
+        """Возвращает модуль шаблона, загружая его только при изменении файла"""
+        return self._load(name)[1]
+
+    def get(self, name):
+        """Возвращает зарегистрированную функцию построения шаблона"""
+        return self._load(name)[2]
+
+    def get_geometry(self, name):
+        """Возвращает функцию геометрии шаблона или None, если шаблон ее не объявляет"""
+        return self._load(name)[4]
+
+    def accepts(self, name, parameter):
+        """Проверяет, объявляет ли функция построения шаблона указанный параметр"""
+        return parameter in self._load(name)[3]
+
+    def geometry_accepts(self, name, parameter):
+        """Проверяет, объявляет ли функция геометрии шаблона указанный параметр"""
+        return parameter in self._load(name)[5]
+
+    def _load(self, name):
+        if self._paths is None:
+            self.discover()
+        if name not in self._paths:
+            raise ValueError(f"Шаблон {name} не найден в папке {self.templates_dir}.")
+
+        path = self._paths[name]
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached
+
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        plot_function = getattr(module, PLOT_FUNCTION_ATTR, None)
+        if not callable(plot_function):
+            raise ValueError(
+                f"В шаблоне {name} не зарегистрирована функция построения графика "
+                f"({PLOT_FUNCTION_ATTR} = <функция>)."
+            )
+
+        parameters = frozenset(inspect.signature(plot_function).parameters)
+        geometry_function = getattr(module, GEOMETRY_FUNCTION_ATTR, None)
+        if callable(geometry_function):
+            geometry_parameters = frozenset(inspect.signature(geometry_function).parameters)
+        else:
+            geometry_function, geometry_parameters = None, frozenset()
+        self._cache[name] = (mtime, module, plot_function, parameters, geometry_function, geometry_parameters)
+        return self._cache[name]
@@ -1,44 +1,185 @@
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy.interpolate import interp1d
-
-# Исходные данные
-categories = ['Скорость', 'Сила', 'Интеллект', 'Выносливость', 'Ловкость']
-values = [4, 3, 5, 2, 4]
-
-# Замыкаем данные (добавляем первый элемент в конец)
-closed_values = values + [values[0]]
-
-# Углы для основных категорий (без дублирования!)
-n = len(categories)
-base_angles = np.linspace(0, 2*np.pi, n, endpoint=False)
-closed_angles = np.append(base_angles, base_angles[0])
-
-# Углы для интерполяции (100 точек + замыкание)
-interp_angles = np.linspace(0, 2*np.pi, 100, endpoint=True)
-
-# Периодическая интерполяция (учитываем зацикленность данных)
-interp_func = interp1d(
-    closed_angles,
-    closed_values,
-    kind='cubic',
-    fill_value='extrapolate'  # Разрешаем экстраполяцию
-)
-
-# Сглаженные значения
-smooth_values = interp_func(interp_angles)
-
-# Создаем график
-fig, ax = plt.subplots(figsize=(6, 6), subplot_kw={'projection': 'polar'})
-
-# Отрисовка
-ax.plot(interp_angles, smooth_values, linewidth=2)
-ax.fill(interp_angles, smooth_values, alpha=0.25)
-
-# Настройки осей
-ax.set_xticks(base_angles)
-ax.set_xticklabels(categories)
-ax.set_ylim(0, max(values)+1)
-
-plt.title('Сглаженная паутинная диаграмма')
-plt.show()
+from functools import lru_cache
+import numpy as np
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.patches import Patch
+from profiling import span
+from template_layout import pivot_cells, pivot_scores
+
+RESOLUTION = 20  # Количество точек сглаженного контура на отрезок между соседними осями
+MAX_CONTOUR_POINTS = 20000  # Предел точек контура при большом числе осей (не меньше одной на отрезок)
+FILL_ALPHA = 0.25  # Прозрачность заливки под контуром
+MAX_AXIS_LABELS = 60  # При большем числе осей подписи не рисуются
+
+@lru_cache(maxsize=32)
+def cyclic_factors(n_axes):
+    """
+    Разложение циклической трехдиагональной матрицы A периодического сплайна
+    (4 на диагонали, 1 рядом с ней и в углах) для решения A @ M = r за O(n).
+
+    Угловые элементы убираются по формуле Шермана - Моррисона: A = B + u v^T,
+    где B - обычная трехдиагональная матрица. Возвращает прогоночные
+    коэффициенты B и решение B @ z = u с множителем поправки.
+    """
+    gamma = -4.0
+    diagonal = np.full(n_axes, 4.0)
+    diagonal[0] -= gamma
+    diagonal[-1] -= 1 / gamma
+
+    # Прямой ход прогонки для B не зависит от правой части
+    upper = np.empty(n_axes)  # Коэффициенты c'
+    pivots = np.empty(n_axes)  # Знаменатели прямого хода
+    pivots[0] = diagonal[0]
+    upper[0] = 1 / pivots[0]
+    for i in range(1, n_axes):
+        pivots[i] = diagonal[i] - upper[i - 1]
+        upper[i] = 1 / pivots[i]
+
+    u = np.zeros((n_axes, 1))
+    u[0], u[-1] = gamma, 1.0
+    z = thomas_solve(upper, pivots, u)[:, 0]
+    correction = 1 + z[0] + z[-1] / gamma
+    for array in (upper, pivots, z):
+        array.flags.writeable = False
+    return upper, pivots, z, gamma, correction
+
+def thomas_solve(upper, pivots, rhs):
+    """Прогонка для трехдиагональной матрицы с единицами рядом с диагональю; rhs - (n, k)"""
+    n = len(pivots)
+    solution = np.empty_like(rhs, dtype=float)
+    solution[0] = rhs[0] / pivots[0]
+    for i in range(1, n):
+        solution[i] = (rhs[i] - solution[i - 1]) / pivots[i]
+    for i in range(n - 2, -1, -1):
+        solution[i] -= upper[i] * solution[i + 1]
+    return solution
+
+def spline_curvature(scores):
+    """
+    Вторые производные периодического кубического сплайна в узлах для каждой
+    серии: решение A @ M = D @ y, где D - циклическая вторая разность.
+    scores - (серии, оси); возвращает массив того же размера.
+    """
+    n_axes = scores.shape[1]
+    h = 2 * np.pi / n_axes
+    rhs = 6 / h ** 2 * (np.roll(scores, -1, axis=1) - 2 * scores + np.roll(scores, 1, axis=1))
+    if n_axes < 3:
+        # При одной и двух осях соседи совпадают, матрица вырождается в плотную 1x1 или 2x2
+        identity = np.eye(n_axes)
+        A = 4 * identity + np.roll(identity, 1, axis=1) + np.roll(identity, -1, axis=1)
+        return np.linalg.solve(A, rhs.T).T
+
+    upper, pivots, z, gamma, correction = cyclic_factors(n_axes)
+    x = thomas_solve(upper, pivots, rhs.T)
+    factor = (x[0] + x[-1] / gamma) / correction
+    return (x - z[:, None] * factor).T
+
+@lru_cache(maxsize=32)
+def contour_weights(n_axes, resolution=RESOLUTION):
+    """
+    Точки сглаженного контура: номера левой и правой оси отрезка и веса
+    значений и вторых производных в этих осях.
+
+    На каждый отрезок между осями приходится resolution точек (но всего не
+    больше MAX_CONTOUR_POINTS), последняя точка совпадает с первой.
+    """
+    per_segment = max(1, min(resolution, MAX_CONTOUR_POINTS // n_axes))
+    h = 2 * np.pi / n_axes
+    position = np.linspace(0, n_axes, per_segment * n_axes + 1)
+    left = np.minimum(position.astype(int), n_axes - 1)
+    u = position - left
+    right = (left + 1) % n_axes
+    weights = (
+        1 - u, u,
+        h ** 2 / 6 * ((1 - u) ** 3 - (1 - u)),
+        h ** 2 / 6 * (u ** 3 - u),
+    )
+    for array in (left, right) + weights:
+        array.flags.writeable = False
+    return left, right, weights
+
+def smooth_contours(scores):
+    """Значения периодического кубического сплайна по всем сериям в точках контура"""
+    n_axes = scores.shape[1]
+    if not n_axes:
+        return np.zeros((len(scores), 0))
+    curvature = spline_curvature(scores)
+    left, right, (value_left, value_right, curve_left, curve_right) = contour_weights(n_axes)
+    return (
+        scores[:, left] * value_left + scores[:, right] * value_right +
+        curvature[:, left] * curve_left + curvature[:, right] * curve_right
+    )
+
+def smooth_radar_chart(items, values, groups, ax, show_legend=True, group_colors=None):
+    """
+    Рисует сглаженную паутинную диаграмму: по одному контуру на каждую группу.
+
+    Параметры:
+    - items: Список названий осей (характеристик).
+    - values: Список числовых значений.
+    - groups: Список групп (серии графика).
+    - ax: Ось для рисования графика.
+    - show_legend: Если True, отображает легенду, иначе скрывает.
+    - group_colors: Словарь с цветами для каждой группы.
+
+    Возвращает словарь с артистами графика: "legend" - легенда,
+    "recolor" - функция перекраски групп без перестроения графика.
+    """
+    with span("template.pivot"):
+        # Оси и серии в порядке первого появления; повторяющиеся пары усредняются
+        axes, series, cells = pivot_cells(items, groups)
+        scores = pivot_scores(cells, values, (len(series), len(axes)))
+
+    if group_colors is None:
+        group_colors = {group: f"C{i % 10}" for i, group in enumerate(series)}
+    palette = to_rgba_array([group_colors[group] for group in series]).reshape(-1, 4)
+
+    # Сглаживание всех серий сразу: прогонка по осям и закэшированные веса точек контура
+    with span("template.smooth", series=len(series), axes=len(axes)):
+        smooth_values = smooth_contours(scores)
+        interp_angles = np.linspace(0, 2 * np.pi, smooth_values.shape[1])
+
+        vertices = np.empty(smooth_values.shape + (2,))
+        vertices[..., 0] = interp_angles
+        vertices[..., 1] = smooth_values
+
+    # Все контуры одной коллекцией: полупрозрачная заливка и непрозрачная обводка
+    def fill_colors(colors):
+        fill = colors.copy()
+        fill[:, 3] *= FILL_ALPHA
+        return fill
+
+    contours = PolyCollection(
+        vertices, closed=True, facecolors=fill_colors(palette), edgecolors=palette,
+        linewidths=2, transform=ax.transData
+    )
+    ax.add_collection(contours, autolim=False)
+
+    # Настройки осей
+    base_angles = np.linspace(0, 2 * np.pi, len(axes), endpoint=False)
+    if len(axes) <= MAX_AXIS_LABELS:
+        ax.set_xticks(base_angles)
+        ax.set_xticklabels([str(axis) for axis in axes])
+    else:
+        ax.set_xticks([])
+    ax.set_ylim(0, (scores.max() if scores.size else 0) + 1)
+    ax.set_title('Сглаженная паутинная диаграмма')
+
+    # Легенда создается всегда и только скрывается, чтобы ее можно было включить без перестроения
+    legend_elements = [Patch(facecolor=color, label=str(group)) for color, group in zip(palette, series)]
+    legend = ax.legend(handles=legend_elements, loc='center left', bbox_to_anchor=(1.1, 0.5), fontsize=8, frameon=False)
+    legend.set_visible(show_legend)
+
+    def recolor(new_colors):
+        """Перекрашивает контуры и легенду по новым цветам групп"""
+        new_palette = to_rgba_array([new_colors[group] for group in series]).reshape(-1, 4)
+        contours.set_facecolors(fill_colors(new_palette))
+        contours.set_edgecolors(new_palette)
+        legend_handles = legend.legend_handles if hasattr(legend, "legend_handles") else legend.legendHandles
+        for handle, color in zip(legend_handles, new_palette):
+            handle.set_facecolor(color)
+
+    return {"legend": legend, "recolor": recolor}
+
+
+PLOT_FUNCTION = smooth_radar_chart
@@ -1,87 +1,106 @@
-import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
-from matplotlib.patches import Patch
-
-
-def category_spider_chart(df, colors=None):
-    """
-    Рисует радарный график для данных из датафрейма, сгруппированных по категориям.
-
-    Параметры:
-    df: Датафрейм с колонками 'Category', 'Subject', 'Score'.
-    colors: Список цветов для каждого набора данных.
-    """
-    # Группируем данные по категориям
-    grouped = df.groupby("Category")
-
-    # Извлекаем уникальные категории (метки)
-    labels = df["Category"].unique().tolist()
-
-    # Сохраняем порядок предметов из исходного датафрейма
-    unique_categories = df["Subject"].unique().tolist()
-
-    # Создаем углы для графика
-    angles = np.linspace(0, 2 * np.pi, len(unique_categories), endpoint=False)
-    angles = np.append(angles, angles[0])  # Замыкаем круг
-
-    # Подготовка данных для графика
-    values_list = []
-    for _, group in grouped:
-        score_dict = dict(zip(group["Subject"], group["Score"]))  # Создаем словарь {предмет: оценка}
-        aligned_scores = [score_dict.get(cat, 0) for cat in unique_categories]  # Заполняем пропуски нулями
-        aligned_scores.append(aligned_scores[0])  # Замыкаем круг
-        values_list.append(aligned_scores)
-
-    # Создаем график
-    fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(polar=True))
-
-    # Настройка осей
-    ax.set_theta_offset(np.pi / 2)
-    ax.set_theta_direction(-1)
-
-    # Настройка радиальных меток
-    plt.yticks([71, 86, 100],color="#5d5d61", size=8, alpha=1, fontsize=8,
-                ha="center", va="bottom", fontweight="bold", zorder=2)
-
-    # Пунктирная сетка для всех угловых меток
-    ax.set_xticks([])  # Устанавливаем метки для всех углов (кроме последнего, который дублирует первый)
-    ax.set_xticklabels([])
-    # Пунктирные линии для всех осей
-    ax.grid(color='#c3c3c7', linestyle='--', linewidth=0.5, alpha=1, zorder=0)
-
-    ax.add_artist(plt.Circle((0, 0), 30, transform=ax.transData._b, color="white", zorder=3))
-    ax.text(0, 0, "student_name",
-            ha='center', va='center',
-            fontsize=10,
-            color='#333333', zorder=4)
-    ax.set_frame_on(False)
-
-
-    # Если цвета не переданы, используем стандартную палитру
-    if colors is None:
-        colors = plt.cm.tab20.colors[:len(labels)]
-
-    # Рисуем данные
-    for values, label, color in zip(values_list, labels, colors):
-        ax.plot(angles, values, linewidth=0, label=label, color=color)
-        ax.fill(angles, values, color=color, alpha=1,  zorder=2)
-
-    # Легенда
-    ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1.1))
-    # Создаем кастомные элементы для легенды
-    legend_elements = [Patch(facecolor=color, label=label)
-                       for color, label in zip(colors, labels)]
-    ax.legend(handles=legend_elements, loc='upper right', bbox_to_anchor=(1.3, 1.1))
-
-    plt.show()
-
-
-# Пример использования
-df = pd.read_csv('../templates/subjects_scores.csv')
-
-# Вызов функции
-category_spider_chart(
-    df,
-    colors=["#665191", "#a05195", "#d45087", "#f95d6a", "#ff7c43", "#ffa600"]
-)
\ No newline at end of file
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.patches import Patch
+from profiling import span
+from template_layout import LayoutCache, pivot_cells, pivot_scores
+
+def compute_layout(items, groups):
+    """
+    Вычисляет раскладку: категории (серии) и предметы (оси) в порядке первого
+    появления и плоский индекс ячейки "категория x предмет" для каждой строки.
+    """
+    subjects, categories, cells = pivot_cells(items, groups)
+    return {
+        "subjects": subjects,
+        "categories": categories,
+        "cells": cells,
+        "angles": np.linspace(0, 2 * np.pi, len(subjects), endpoint=False),
+    }
+
+# Кэш раскладки: раскладка зависит только от предметов и категорий,
+# значения сводятся в матрицу при каждой отрисовке
+_layout_cache = LayoutCache(compute_layout)
+
+def get_layout(items, groups, data_key=None):
+    """Возвращает раскладку из кэша по ключу данных или вычисляет ее заново"""
+    return _layout_cache.get(items, groups, data_key)
+
+
+def category_spider_chart(items, values, groups, ax, show_legend=True, group_colors=None, data_key=None):
+    """
+    Рисует радарный график: по одной закрашенной области на каждую категорию.
+
+    Параметры:
+    - items: Список предметов (оси радара).
+    - values: Список оценок.
+    - groups: Список категорий (серии графика).
+    - ax: Ось для рисования графика.
+    - show_legend: Если True, отображает легенду, иначе скрывает.
+    - group_colors: Словарь с цветами для каждой категории.
+    - data_key: Ключ данных; при совпадении ключа раскладка берется из кэша.
+
+    Возвращает словарь с артистами графика: "legend" - легенда,
+    "recolor" - функция перекраски категорий без перестроения графика.
+    """
+    with span("template.layout", cached=data_key in _layout_cache):
+        layout = get_layout(items, groups, data_key)
+    with span("template.pivot"):
+        scores = pivot_scores(layout["cells"], values, (len(layout["categories"]), len(layout["subjects"])))
+
+    categories = layout["categories"]
+    angles = layout["angles"]
+
+    # Если цвета не переданы, используем стандартную палитру
+    if group_colors is None:
+        tab20 = plt.cm.tab20.colors
+        group_colors = {category: tab20[i % len(tab20)] for i, category in enumerate(categories)}
+    palette = to_rgba_array([group_colors[category] for category in categories]).reshape(-1, 4)
+
+    # Настройка осей
+    ax.set_theta_offset(np.pi / 2)
+    ax.set_theta_direction(-1)
+
+    # Настройка радиальных меток
+    ax.set_yticks([71, 86, 100])
+    plt.setp(ax.get_yticklabels(), color="#5d5d61", alpha=1, fontsize=8,
+             ha="center", va="bottom", fontweight="bold", zorder=2)
+
+    # Пунктирная сетка без угловых меток
+    ax.set_xticks([])
+    ax.set_xticklabels([])
+    ax.grid(color='#c3c3c7', linestyle='--', linewidth=0.5, alpha=1, zorder=0)
+
+    ax.add_artist(plt.Circle((0, 0), 30, transform=ax.transData._b, color="white", zorder=3))
+    ax.set_frame_on(False)
+
+    # Вершины всех серий одним массивом (категории x предметы x 2): по одному
+    # многоугольнику на категорию в одной коллекции
+    with span("template.polygons", series=len(categories), subjects=len(angles)):
+        vertices = np.empty(scores.shape + (2,))
+        vertices[..., 0] = angles
+        vertices[..., 1] = scores
+        polygons = PolyCollection(
+            vertices, closed=True, facecolors=palette, edgecolors="none",
+            transform=ax.transData, zorder=2
+        )
+        ax.add_collection(polygons, autolim=False)
+
+    # Легенда создается всегда и только скрывается, чтобы ее можно было включить без перестроения
+    legend_elements = [Patch(facecolor=color, label=str(category)) for color, category in zip(palette, categories)]
+    legend = ax.legend(handles=legend_elements, loc='upper right', bbox_to_anchor=(1.3, 1.1))
+    legend.set_visible(show_legend)
+
+    def recolor(new_colors):
+        """Перекрашивает области и легенду по новым цветам категорий"""
+        new_palette = to_rgba_array([new_colors[category] for category in categories]).reshape(-1, 4)
+        polygons.set_facecolors(new_palette)
+        legend_handles = legend.legend_handles if hasattr(legend, "legend_handles") else legend.legendHandles
+        for handle, color in zip(legend_handles, new_palette):
+            handle.set_facecolor(color)
+
+    return {"legend": legend, "recolor": recolor}
+
+
+PLOT_FUNCTION = category_spider_chart
@@ -1,85 +1,166 @@
-# templates/circular_barchart.py
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-
-def plot_circular_barchart(items, values, groups, ax, show_legend=True, group_colors=None):
-    """
-    Рисует круговую барчарт-диаграмму.
-
-    Параметры:
-    - items: Список названий (предметов).
-    - values: Список числовых значений.
-    - groups: Список категорий.
-    - ax: Ось для рисования графика.
-    - show_legend: Если True, отображает легенду, иначе скрывает.
-    - group_colors: Словарь с цветами для каждой группы.
-    """
-    df = pd.DataFrame({"items": items, "values": values, "groups": groups})
-
-    df = df.sort_values(by="groups").reset_index(drop=True)
-
-    # Извлечение данных
-    VALUES = df["values"].values
-    LABELS = df["items"].values
-    GROUP = df["groups"].values
-
-    pad = 1
-
-    if group_colors is None:
-        CUSTOM_COLORS = ["#a8e6cf", "#dcedc1", "#ffd3b6", "#ffdca6", "#f2aeae", "#dbdcff"]
-        unique_categories = list(dict.fromkeys(GROUP))
-        group_colors = {category: CUSTOM_COLORS[i % len(CUSTOM_COLORS)] for i, category in enumerate(unique_categories)}
-
-    # Назначаем цвета, чтобы категории соответствовали цветам
-    COLORS = [group_colors[cat] for cat in GROUP]
-
-    # Вычисление углов и индексов
-    GROUPS_SIZE = [len(group) for _, group in df.groupby("groups")]
-    ANGLES_N = len(VALUES) + pad * len(GROUPS_SIZE)  # Общее количество углов
-    ANGLES = np.linspace(0, 2 * np.pi, num=ANGLES_N, endpoint=False)  # Углы для всех секторов
-    WIDTH = (2 * np.pi) / len(ANGLES)  # Ширина каждого столбца
-
-    # Индексы для непустых столбцов
-    IDXS = []
-    offset = 0
-    for size in GROUPS_SIZE:
-        IDXS += list(range(offset + pad, offset + size + pad))
-        offset += size + pad
-
-    # Добавление фонового круга
-    ax.add_artist(plt.Circle((0, 0), 150, transform=ax.transData._b, color="#fff0f0", zorder=-1))
-
-    # Настройка оси
-    ax.set_theta_offset(np.pi / 2)  # Смещение для начала первого столбца (90 градусов)
-    ax.set_ylim(-50, 100)
-    ax.set_frame_on(False)
-    ax.xaxis.grid(False)
-    ax.yaxis.grid(False)
-    ax.set_xticks([])
-    ax.set_yticks([])
-
-    # Добавление столбцов
-    ax.bar(ANGLES[IDXS], VALUES, width=WIDTH, color=COLORS, edgecolor="#fff0f0", linewidth=2)
-
-    # Функция для вычисления поворота и выравнивания меток
-    def get_label_rotation(angle, offset):
-        rotation = np.rad2deg(angle + offset)
-        alignment = "right" if angle <= np.pi else "left"
-        rotation = rotation + 180 if angle <= np.pi else rotation
-        return rotation, alignment
-
-    def add_labels(angles, labels, offset, ax, radius=40):
-        for angle, label in zip(angles, labels):
-            rotation, alignment = get_label_rotation(angle, offset)
-            ax.text(
-                x=angle, y=radius, s=label, ha=alignment, va="center",
-                fontsize=5.5, rotation=rotation, rotation_mode="anchor", color="#2b2a2a"
-            )
-
-    #add_labels(ANGLES[IDXS], LABELS, np.pi / 2, ax, radius=5)
-
-    if show_legend:
-        handles = [plt.Rectangle((0, 0), 1, 1, color=group_colors[cat]) for cat in group_colors]
-        labels = list(group_colors.keys())
-        ax.legend(handles, labels, loc="center left", bbox_to_anchor=(1.1, 0.5), fontsize=8, frameon=False)
\ No newline at end of file
+# templates/circular_barchart.py
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba_array
+from profiling import span
+from circular_labels import add_circular_labels
+from template_layout import LayoutCache, group_order
+
+PAD = 1  # Количество пустых секторов между группами
+ARC_STEP = np.pi / 180  # Наибольший шаг по углу между вершинами дуги столбца
+
+def compute_layout(items, groups, pad=PAD):
+    """
+    Вычисляет раскладку секторов: порядок элементов, размеры групп, углы и ширину столбцов.
+
+    Элементы упорядочиваются по группам (устойчивая сортировка), между группами
+    оставляется pad пустых секторов. Раскладка зависит только от элементов и групп,
+    поэтому ее можно разделять между графиками с разными значениями.
+    """
+    order, unique_groups, codes, sizes = group_order(groups)
+
+    angles_n = len(order) + pad * len(sizes)  # Общее количество углов
+    angles = np.linspace(0, 2 * np.pi, num=angles_n, endpoint=False)  # Углы для всех секторов
+
+    # Индексы непустых столбцов: позиция в порядке сортировки плюс отступы предыдущих групп
+    idxs = np.arange(len(order)) + pad * (codes + 1)
+
+    return {
+        "order": order,
+        "groups": unique_groups,
+        "codes": codes,
+        "sizes": sizes,
+        "angles": angles[idxs],
+        "width": (2 * np.pi) / angles_n if angles_n else 0.0,  # Ширина каждого столбца
+        "labels": np.asarray(items)[order]
+    }
+
+# Кэш геометрии: раскладка зависит только от элементов и групп
+_layout_cache = LayoutCache(compute_layout)
+
+def get_layout(items, groups, data_key=None):
+    """Возвращает раскладку из кэша по ключу данных или вычисляет ее заново"""
+    return _layout_cache.get(items, groups, data_key)
+
+def compute_geometry(items, values, groups, data_key=None):
+    """
+    Геометрия диаграммы в полярных координатах: столбцы от 0 до значения,
+    центры столбцов по углу, общая ширина, коды групп и оформление.
+
+    Используется и функцией построения, и отрисовкой без matplotlib (painter_view).
+    """
+    layout = get_layout(items, groups, data_key)
+    return {
+        "kind": "bars",
+        "theta_offset": np.pi / 2,  # Смещение для начала первого столбца (90 градусов)
+        "angles": layout["angles"],
+        "width": layout["width"],
+        "heights": np.asarray(values, dtype=float)[layout["order"]],
+        "labels": layout["labels"],
+        "rows": layout["order"],  # Номера строк входных массивов в порядке столбцов
+        "codes": layout["codes"],
+        "sizes": layout["sizes"],
+        "groups": layout["groups"],
+        "background": "#fff0f0",
+        "edgecolor": "#fff0f0",
+        "linewidth": 2,
+        "ylim": (-50, 100),
+    }
+
+def bar_vertices(angles, heights, width):
+    """
+    Вершины столбцов в полярных координатах (угол, радиус): массив
+    (столбцы, точки, 2). Столбец - сектор от радиуса 0 до высоты; его
+    внутренняя и внешняя дуги разбиты на отрезки не длиннее ARC_STEP, потому
+    что прямые в координатах данных остаются прямыми и на полярной оси.
+    """
+    steps = max(1, int(np.ceil(width / ARC_STEP)))
+    arc = angles[:, None] + width * (np.linspace(0, 1, steps + 1) - 0.5)
+    vertices = np.empty((len(angles), 2 * (steps + 1), 2))
+    vertices[:, :steps + 1, 0] = arc
+    vertices[:, :steps + 1, 1] = 0.0
+    vertices[:, steps + 1:, 0] = arc[:, ::-1]
+    vertices[:, steps + 1:, 1] = heights[:, None]
+    return vertices
+
+def plot_circular_barchart(items, values, groups, ax, show_legend=True, group_colors=None, data_key=None):
+    """
+    Рисует круговую барчарт-диаграмму.
+
+    Параметры:
+    - items: Список названий (предметов).
+    - values: Список числовых значений.
+    - groups: Список категорий.
+    - ax: Ось для рисования графика.
+    - show_legend: Если True, отображает легенду, иначе скрывает.
+    - group_colors: Словарь с цветами для каждой группы.
+    - data_key: Ключ данных (версия данных и выбранные столбцы или набор элементов
+      и групп); при совпадении ключа геометрия берется из кэша.
+
+    Возвращает словарь с артистами графика: "legend" - легенда,
+    "recolor" - функция перекраски групп без перестроения графика.
+    """
+    with span("template.layout", cached=data_key in _layout_cache):
+        geometry = compute_geometry(items, values, groups, data_key)
+
+    # Извлечение данных
+    VALUES = geometry["heights"]
+    LABELS = geometry["labels"]
+    GROUP = geometry["groups"]
+
+    if group_colors is None:
+        CUSTOM_COLORS = ["#a8e6cf", "#dcedc1", "#ffd3b6", "#ffdca6", "#f2aeae", "#dbdcff"]
+        group_colors = {category: CUSTOM_COLORS[i % len(CUSTOM_COLORS)] for i, category in enumerate(GROUP)}
+
+    # Назначаем цвета, чтобы категории соответствовали цветам (по кодам групп)
+    palette = to_rgba_array([group_colors[cat] for cat in GROUP]).reshape(-1, 4)
+    COLORS = palette[geometry["codes"]]
+
+    ANGLES = geometry["angles"]
+    WIDTH = geometry["width"]
+
+    # Добавление фонового круга
+    ax.add_artist(plt.Circle((0, 0), 150, transform=ax.transData._b, color=geometry["background"], zorder=-1))
+
+    # Настройка оси
+    ax.set_theta_offset(geometry["theta_offset"])
+    ax.set_ylim(*geometry["ylim"])
+    ax.set_frame_on(False)
+    ax.xaxis.grid(False)
+    ax.yaxis.grid(False)
+    ax.set_xticks([])
+    ax.set_yticks([])
+
+    # Все столбцы одной коллекцией: один артист вместо патча на столбец
+    with span("template.bars", bars=len(VALUES)):
+        bars = PolyCollection(
+            bar_vertices(ANGLES, VALUES, WIDTH), closed=True, facecolors=COLORS,
+            edgecolors=geometry["edgecolor"], linewidths=geometry["linewidth"], transform=ax.transData
+        )
+        ax.add_collection(bars, autolim=False)
+
+    # Подписи элементов у концов столбцов; перекрывающиеся отбрасываются при отрисовке
+    with span("template.labels", labels=len(LABELS)):
+        add_circular_labels(ax, ANGLES, np.maximum(VALUES, 0), LABELS)
+
+    # Легенда создается всегда и только скрывается, чтобы ее можно было включить без перестроения
+    legend_groups = list(group_colors.keys())
+    handles = [plt.Rectangle((0, 0), 1, 1, color=group_colors[cat]) for cat in legend_groups]
+    legend = ax.legend(handles, legend_groups, loc="center left", bbox_to_anchor=(1.1, 0.5), fontsize=8, frameon=False)
+    legend.set_visible(show_legend)
+
+    def recolor(new_colors):
+        """Перекрашивает столбцы (одним массивом цветов по кодам групп) и легенду"""
+        new_palette = to_rgba_array([new_colors[cat] for cat in GROUP]).reshape(-1, 4)
+        bars.set_facecolors(new_palette[geometry["codes"]])
+        legend_handles = legend.legend_handles if hasattr(legend, "legend_handles") else legend.legendHandles
+        for handle, cat in zip(legend_handles, legend_groups):
+            if cat in new_colors:
+                handle.set_color(new_colors[cat])
+
+    return {"legend": legend, "recolor": recolor}
+
+
+PLOT_FUNCTION = plot_circular_barchart
+GEOMETRY_FUNCTION = compute_geometry
@@ -1,72 +1,122 @@
-import numpy as np
-import matplotlib.pyplot as plt
-
-def circular_scatter_plot_subjects(items, values, groups, ax, show_legend=True, group_colors=None):
-    """
-    Рисует scatter plot с точками, расположенными в секторах.
-
-    Параметры:
-    - items: Список названий (предметов).
-    - values: Список числовых значений.
-    - groups: Список категорий.
-    - ax: Ось для рисования графика.
-    - show_legend: Если True, отображает легенду, иначе скрывает.
-    - group_colors: Словарь с цветами для каждой группы.
-    """
-    # Если цвета не переданы, используем стандартные
-    if group_colors is None:
-        group_colors = {group: f"C{i}" for i, group in enumerate(set(groups))}
-
-    # Уникальные категории для цвета
-    unique_groups = list(set(groups))
-    num_groups = len(unique_groups)
-
-    # Углы для каждого элемента (сектора)
-    num_items = len(items)
-    angles = np.linspace(0, 2 * np.pi, num_items, endpoint=False)
-
-    # Радиусы для точек (10 кружков по Y)
-    # Новый диапазон: от -50 до 100
-    radii = np.linspace(-20, 90, 10)  # 10 кружков по радиусу (от -50 до 100)
-
-    # Отслеживание уже добавленных категорий в легенду
-    added_groups = set()
-
-    # Рисуем точки
-    for i, (item, value, group) in enumerate(zip(items, values, groups)):
-        angle = angles[i]
-        color = group_colors[group]
-
-        # Нормализуем значение (максимум 10 кружков по Y)
-        # Новый диапазон: от -50 до 100
-        normalized_score = min(int((value + 50) / 15), 10)  # Нормализация для диапазона (-50, 100)
-
-        # Добавляем категорию в легенду, если еще нет
-        label = group if group not in added_groups else ""
-        added_groups.add(group)
-
-        # Закрашенные точки (по радиусу)
-        ax.scatter(
-            np.full(normalized_score, angle), radii[:normalized_score],
-            c=[color], s=100, alpha=1, edgecolors='lightgray', linewidths=0.5, label=label
-        )
-
-        # Пустые точки (если не весь ряд заполнен)
-        if normalized_score < 10:
-            ax.scatter(
-                np.full(10 - normalized_score, angle), radii[normalized_score:],
-                c='white', s=100, alpha=1, edgecolors='lightgray', linewidths=0.5
-            )
-
-    # Настройки осей
-    ax.set_ylim(-50, 100)  # Новый диапазон оси Y
-    ax.set_frame_on(False)  # Убираем рамку
-    ax.xaxis.grid(False)  # Отключаем сетку по X
-    ax.yaxis.grid(False)  # Отключаем сетку по Y
-    ax.set_xticks([])  # Убираем подписи по X
-    ax.set_yticks([])  # Убираем подписи по Y
-
-    # Добавляем легенду, если show_legend True
-    if show_legend:
-        handles, labels = ax.get_legend_handles_labels()
-        ax.legend(handles, labels, loc='center left', bbox_to_anchor=(1, 0.5), fontsize=8, frameon=False)
\ No newline at end of file
+import numpy as np
+from matplotlib.colors import to_rgba
+from matplotlib.lines import Line2D
+from profiling import span
+from circular_labels import add_circular_labels
+from template_layout import first_appearance_codes
+
+def compute_geometry(items, values, groups):
+    """
+    Геометрия точек в полярных координатах: для каждого элемента кольцо из
+    10 точек по радиусу, закрашенных по значению цветом группы.
+
+    Используется и функцией построения, и отрисовкой без matplotlib (painter_view).
+    """
+    # Коды групп в порядке первого появления (как в легенде)
+    unique_groups, codes = first_appearance_codes(groups)
+
+    # Углы для каждого элемента (сектора)
+    num_items = len(items)
+    angles = np.linspace(0, 2 * np.pi, num_items, endpoint=False)
+
+    # Радиусы для точек (10 кружков по Y)
+    # Новый диапазон: от -50 до 100
+    num_rings = 10
+    radii = np.linspace(-20, 90, num_rings)  # 10 кружков по радиусу (от -50 до 100)
+
+    # Нормализуем значения (максимум 10 кружков по Y) для диапазона (-50, 100)
+    values = np.asarray(values, dtype=float)
+    normalized_scores = np.clip(np.trunc((values + 50) / 15), 0, num_rings).astype(int)
+
+    # Матрица "элемент x кружок": True - закрашенная точка, False - пустая
+    filled = np.arange(num_rings)[None, :] < normalized_scores[:, None]
+    filled_items, filled_rings = np.nonzero(filled)
+    empty_items, empty_rings = np.nonzero(~filled)
+
+    return {
+        "kind": "dots",
+        "theta_offset": 0.0,
+        "groups": unique_groups,
+        "empty_theta": angles[empty_items],
+        "empty_r": radii[empty_rings],
+        "filled_theta": angles[filled_items],
+        "filled_r": radii[filled_rings],
+        "filled_codes": codes[filled_items],
+        "item_angles": angles,
+        "ring_radii": radii,
+        "outer_radius": radii[-1],
+        "dot_size": 100,  # Площадь точки в pt^2, как s в ax.scatter
+        "empty_color": "white",
+        "edgecolor": "lightgray",
+        "linewidth": 0.5,
+        "ylim": (-50, 100),
+    }
+
+def circular_scatter_plot_subjects(items, values, groups, ax, show_legend=True, group_colors=None):
+    """
+    Рисует scatter plot с точками, расположенными в секторах.
+
+    Параметры:
+    - items: Список названий (предметов).
+    - values: Список числовых значений.
+    - groups: Список категорий.
+    - ax: Ось для рисования графика.
+    - show_legend: Если True, отображает легенду, иначе скрывает.
+    - group_colors: Словарь с цветами для каждой группы.
+
+    Возвращает словарь с артистами графика: "legend" - легенда,
+    "recolor" - функция перекраски групп без перестроения графика.
+    """
+    geometry = compute_geometry(items, values, groups)
+    unique_groups = geometry["groups"]
+    filled_codes = geometry["filled_codes"]
+    dot_style = dict(s=geometry["dot_size"], alpha=1, edgecolors=geometry["edgecolor"], linewidths=geometry["linewidth"])
+
+    # Если цвета не переданы, используем стандартные
+    if group_colors is None:
+        group_colors = {group: f"C{i}" for i, group in enumerate(unique_groups)}
+    palette = np.array([to_rgba(group_colors[group]) for group in unique_groups]).reshape(-1, 4)
+
+    with span("template.dots", dots=len(geometry["empty_r"]) + len(geometry["filled_r"])):
+        # Пустые точки всех элементов одной коллекцией (под закрашенными)
+        ax.scatter(geometry["empty_theta"], geometry["empty_r"], c=geometry["empty_color"], **dot_style)
+
+        # Закрашенные точки всех элементов одной коллекцией
+        filled_dots = ax.scatter(geometry["filled_theta"], geometry["filled_r"], c=palette[filled_codes], **dot_style)
+
+    # Подписи элементов снаружи внешнего кольца; перекрывающиеся отбрасываются при отрисовке
+    with span("template.labels", labels=len(items)):
+        dot_radius = np.sqrt(geometry["dot_size"]) / 2
+        add_circular_labels(ax, geometry["item_angles"], geometry["outer_radius"], items, pad=dot_radius + 2)
+
+    # Настройки осей
+    ax.set_ylim(*geometry["ylim"])  # Новый диапазон оси Y
+    ax.set_frame_on(False)  # Убираем рамку
+    ax.xaxis.grid(False)  # Отключаем сетку по X
+    ax.yaxis.grid(False)  # Отключаем сетку по Y
+    ax.set_xticks([])  # Убираем подписи по X
+    ax.set_yticks([])  # Убираем подписи по Y
+
+    # Легенда из маркеров-заместителей (по одному на группу); создается всегда
+    # и отображается, если show_legend True
+    handles = [
+        Line2D([], [], linestyle='', marker='o', markersize=10, markerfacecolor=color,
+               markeredgecolor=geometry["edgecolor"], markeredgewidth=geometry["linewidth"])
+        for color in palette
+    ]
+    labels = [str(group) for group in unique_groups]
+    legend = ax.legend(handles, labels, loc='center left', bbox_to_anchor=(1.05, 0.5), fontsize=8, frameon=False)
+    legend.set_visible(show_legend)
+
+    def recolor(new_colors):
+        """Перекрашивает закрашенные точки и маркеры легенды по новым цветам групп"""
+        new_palette = np.array([to_rgba(new_colors[group]) for group in unique_groups]).reshape(-1, 4)
+        filled_dots.set_facecolors(new_palette[filled_codes])
+        legend_handles = legend.legend_handles if hasattr(legend, "legend_handles") else legend.legendHandles
+        for handle, color in zip(legend_handles, new_palette):
+            handle.set_markerfacecolor(color)
+
+    return {"legend": legend, "recolor": recolor}
+
+PLOT_FUNCTION = circular_scatter_plot_subjects
+GEOMETRY_FUNCTION = compute_geometry
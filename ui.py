@@ -1,316 +1,1059 @@
-from PyQt6.QtCore import Qt
-from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QPushButton, QFileDialog,
-    QTableWidget, QTextEdit, QHBoxLayout, QMessageBox,
-    QTableWidgetItem, QStackedWidget, QComboBox, QLabel,
-    QHeaderView, QDoubleSpinBox
-)
-from PyQt6.QtWidgets import QColorDialog
-from PyQt6.QtGui import QColor
-from matplotlib.backends.backend_qt5agg import (
-    FigureCanvasQTAgg as FigureCanvas,
-    NavigationToolbar2QT as NavigationToolbar
-)
-from data_handler import DataHandler
-from visualization import Visualization
-
-
-class CSVViewer(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("CSV Viewer")
-        self.setGeometry(100, 100, 900, 500)
-        self.showMaximized()
-
-        # Инициализация модулей
-        self.data_handler = DataHandler()
-        self.visualization = Visualization()
-
-        # Основной контейнер с переключаемыми страницами
-        self.stack = QStackedWidget(self)
-
-        # Страница загрузки данных
-        self.data_page = self.create_data_page()
-        self.stack.addWidget(self.data_page)
-
-        # Страница визуализации
-        self.visualization_page = self.create_visualization_page()
-        self.stack.addWidget(self.visualization_page)
-
-        # Основной layout
-        layout = QVBoxLayout()
-        layout.addWidget(self.stack)
-        self.setLayout(layout)
-
-    def create_data_page(self):
-        """Создает страницу загрузки данных"""
-        page = QWidget()
-        layout = QHBoxLayout()
-
-        vbox = QVBoxLayout()
-
-        self.btn_load = QPushButton("Загрузить CSV")
-        self.btn_load.clicked.connect(self.load_csv)
-        vbox.addWidget(self.btn_load)
-
-        self.text_edit = QTextEdit()
-        self.text_edit.setPlaceholderText("Вставьте CSV-данные")
-        vbox.addWidget(self.text_edit)
-
-        self.btn_process = QPushButton("Обработать данные")
-        self.btn_process.clicked.connect(self.process_manual_input)
-        vbox.addWidget(self.btn_process)
-
-        self.btn_clear = QPushButton("Очистить данные")
-        self.btn_clear.clicked.connect(self.clear_data)
-        vbox.addWidget(self.btn_clear)
-
-        self.btn_visualize = QPushButton("Перейти к визуализации")
-        self.btn_visualize.clicked.connect(self.show_visualization_page)
-        self.btn_visualize.setEnabled(False)
-        vbox.addWidget(self.btn_visualize)
-
-        layout.addLayout(vbox, 1)
-
-        self.table = QTableWidget()
-        layout.addWidget(self.table, 3)
-
-        page.setLayout(layout)
-        return page
-
-    def create_visualization_page(self):
-        """Создает страницу визуализации"""
-        page = QWidget()
-        layout = QHBoxLayout()
-
-        # Левая панель с выпадающими списками для параметров
-        left_panel = QVBoxLayout()
-        left_panel.setAlignment(Qt.AlignmentFlag.AlignTop)
-
-        self.btn_back = QPushButton("Назад к данным")
-        self.btn_back.clicked.connect(self.show_data_page)
-        left_panel.addWidget(self.btn_back)
-
-        # Параметры функции для визуализации
-        self.param_widgets = {}
-
-        params = [
-            ('items', "Выберите столбец для 'items'"),
-            ('values', "Выберите столбец для 'values'"),
-            ('groups', "Выберите столбец для 'groups'")
-        ]
-
-        for param, label_text in params:
-            param_layout = QVBoxLayout()
-            param_layout.setSpacing(5)
-
-            label = QLabel(label_text)
-            self.param_widgets[param] = QComboBox()
-
-            param_layout.addWidget(label)
-            param_layout.addWidget(self.param_widgets[param])
-
-            left_panel.addLayout(param_layout)
-            left_panel.addSpacing(10)
-
-        # Добавляем выпадающий список для выбора шаблона
-        template_layout = QVBoxLayout()
-        template_layout.setSpacing(5)
-        template_label = QLabel("Выберите шаблон")
-        self.template_selector = QComboBox()
-        self.template_selector.addItems(self.visualization.load_templates())
-        template_layout.addWidget(template_label)
-        template_layout.addWidget(self.template_selector)
-        left_panel.addLayout(template_layout)
-        left_panel.addSpacing(10)
-
-        # Кнопка для выбора цветов
-        self.btn_choose_colors = QPushButton("Выбрать цвета")
-        self.btn_choose_colors.clicked.connect(self.choose_colors)
-        left_panel.addWidget(self.btn_choose_colors)
-
-        # Контейнер для отображения кружков с цветами
-        self.color_widgets_container = QVBoxLayout()
-        left_panel.addLayout(self.color_widgets_container)
-
-        # Элементы управления для ax.set_ylim
-        ylim_layout = QHBoxLayout()
-        ylim_label = QLabel("Границы оси Y:")
-        self.ylim_min = QDoubleSpinBox()
-        self.ylim_min.setRange(-100.0, 100.0)
-        self.ylim_min.setValue(-50.0)
-        self.ylim_max = QDoubleSpinBox()
-        self.ylim_max.setRange(-100.0, 100.0)
-        self.ylim_max.setValue(90.0)
-        self.btn_apply_ylim = QPushButton("Применить")
-        self.btn_apply_ylim.clicked.connect(self.plot_graph)
-
-        ylim_layout.addWidget(ylim_label)
-        ylim_layout.addWidget(self.ylim_min)
-        ylim_layout.addWidget(self.ylim_max)
-        ylim_layout.addWidget(self.btn_apply_ylim)
-
-        left_panel.addLayout(ylim_layout)
-
-        # Кнопки
-        self.btn_plot = QPushButton("Построить график")
-        self.btn_plot.clicked.connect(self.plot_graph)
-        left_panel.addWidget(self.btn_plot)
-
-        self.legend_visible = True
-        self.btn_toggle_legend = QPushButton("Скрыть легенду")
-        self.btn_toggle_legend.clicked.connect(self.toggle_legend)
-        left_panel.addWidget(self.btn_toggle_legend)
-
-        layout.addLayout(left_panel, 1)
-
-        # Правая панель (предпросмотр графика)
-        self.visualization.canvas = FigureCanvas(self.visualization.figure)
-        self.visualization.toolbar = NavigationToolbar(self.visualization.canvas, self)
-
-        right_panel = QVBoxLayout()
-        right_panel.addWidget(self.visualization.toolbar)
-        right_panel.addWidget(self.visualization.canvas)
-
-        layout.addLayout(right_panel, 3)
-
-        page.setLayout(layout)
-        return page
-
-    def choose_colors(self):
-        """Открывает диалог выбора цветов для каждой группы"""
-        if self.data_handler.df is None:
-            return
-
-        groups_column = self.param_widgets['groups'].currentText()
-        unique_groups = self.data_handler.df[groups_column].unique()
-
-        default_colors = [
-            "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
-            "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"
-        ]
-
-        self.visualization.group_colors = {}
-        for i, group in enumerate(unique_groups):
-            self.visualization.group_colors[group] = default_colors[i % len(default_colors)]
-
-        self.update_color_widgets()
-
-    def update_color_widgets(self):
-        """Обновляет цвет кружочков в соответствии с текущими цветами групп"""
-        # Очищаем контейнер перед добавлением новых виджетов
-        while self.color_widgets_container.count():
-            item = self.color_widgets_container.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
-
-        color_circles_layout = QHBoxLayout()
-        color_circles_layout.setSpacing(10)
-
-        for group, color in self.visualization.group_colors.items():
-            color_circle = QLabel()
-            color_circle.setFixedSize(30, 30)
-            color_circle.setStyleSheet(
-                f"background-color: {color};"
-                "border-radius: 15px;"
-                "border: 1px solid black;"
-            )
-            color_circle.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            color_circle.setToolTip(group)
-            color_circle.mousePressEvent = lambda event, g=group: self.change_group_color(g)
-
-            color_circles_layout.addWidget(color_circle)
-
-        self.color_widgets_container.addLayout(color_circles_layout)
-
-    def change_group_color(self, group):
-        """Изменяет цвет для конкретной группы"""
-        color = QColorDialog.getColor()
-        if color.isValid():
-            self.visualization.group_colors[group] = color.name()
-            self.update_color_widgets()  # Обновляем виджеты с цветами
-            self.plot_graph()  # Обновляем график
-
-    def load_csv(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Выберите CSV", "", "CSV (*.csv)")
-        if file_path and self.data_handler.load_csv(file_path):
-            self.show_data(self.data_handler.df)
-            self.btn_visualize.setEnabled(True)
-            self.update_column_list()
-
-    def process_manual_input(self):
-        text = self.text_edit.toPlainText()
-        if self.data_handler.process_text_input(text):
-            self.show_data(self.data_handler.df)
-            self.btn_visualize.setEnabled(True)
-            self.update_column_list()
-
-    def clear_data(self):
-        self.data_handler.clear_data()
-        self.table.setRowCount(0)
-        self.table.setColumnCount(0)
-        self.text_edit.clear()
-        self.param_widgets['items'].clear()
-        self.param_widgets['values'].clear()
-        self.param_widgets['groups'].clear()
-        self.template_selector.clear()
-        self.btn_visualize.setEnabled(False)
-
-    def show_error(self, message):
-        QMessageBox.critical(self, "Ошибка", message)
-
-    def show_data(self, df):
-        self.table.setRowCount(df.shape[0])
-        self.table.setColumnCount(df.shape[1])
-        self.table.setHorizontalHeaderLabels(df.columns)
-
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
-        self.table.horizontalHeader().setStretchLastSection(True)
-
-        for row in range(df.shape[0]):
-            for col in range(df.shape[1]):
-                self.table.setItem(row, col, QTableWidgetItem(str(df.iat[row, col])))
-
-    def show_visualization_page(self):
-        """Переключает на страницу визуализации"""
-        self.update_column_list()
-        self.stack.setCurrentWidget(self.visualization_page)
-
-    def show_data_page(self):
-        """Переключает на страницу загрузки данных"""
-        self.stack.setCurrentWidget(self.data_page)
-
-    def update_column_list(self):
-        """Обновляет список переменных, отображая их фактический тип данных"""
-        if self.data_handler.df is not None:
-            for param in self.param_widgets.values():
-                param.clear()
-                param.addItems(self.data_handler.get_columns())
-
-    def plot_graph(self):
-        """Вызывает выбранный шаблон визуализации"""
-        try:
-            items_column = self.param_widgets['items'].currentText()
-            values_column = self.param_widgets['values'].currentText()
-            groups_column = self.param_widgets['groups'].currentText()
-
-            items = self.data_handler.df[items_column].astype(str).tolist()
-            values = self.data_handler.df[values_column].astype(float).tolist()
-            groups = self.data_handler.df[groups_column].astype(str).tolist()
-
-            self.visualization.plot_graph(
-                items, values, groups,
-                self.template_selector.currentText(),
-                show_legend=self.legend_visible,
-                y_min=self.ylim_min.value(),
-                y_max=self.ylim_max.value()
-            )
-
-        except Exception as e:
-            self.show_error(f"Ошибка построения графика:\n{e}")
-
-    def toggle_legend(self):
-        """Переключает отображение легенды на графике"""
-        self.legend_visible = not self.legend_visible
-        self.plot_graph()
\ No newline at end of file
+from PyQt6.QtCore import Qt, QThread, QTimer, QFileSystemWatcher
+from PyQt6.QtWidgets import (
+    QWidget, QVBoxLayout, QPushButton, QFileDialog,
+    QTableView, QHBoxLayout, QMessageBox,
+    QStackedWidget, QComboBox, QLabel,
+    QHeaderView, QDoubleSpinBox, QProgressBar, QCheckBox,
+    QStatusBar
+)
+from PyQt6.QtWidgets import QColorDialog
+from PyQt6.QtGui import QColor
+from data_handler import DataHandler, is_columnar_file, filter_key
+from parse_cache import ParseCache, format_entries
+from table_model import DataFrameModel
+from workers import CSVLoadWorker, TextParseWorker
+from paste_edit import PasteEdit
+import profiling
+from profiling import span, trace
+
+DEFAULT_COLORS = [
+    "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+    "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"
+]
+PASTE_DEBOUNCE_MS = 400  # Пауза после правки вставленных данных перед фоновым разбором
+TAIL_READ_DELAY_MS = 300  # Задержка дочитывания после уведомления об изменении файла
+TAIL_PLOT_INTERVAL_MS = 1000  # Минимальный интервал перестроения графика при дочитывании
+
+
+class CSVViewer(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("CSV Viewer")
+        self.setGeometry(100, 100, 900, 500)
+        self.showMaximized()
+
+        # Инициализация модулей. Визуализация (matplotlib, фигура, шаблоны)
+        # создается при первом переходе на страницу визуализации
+        self.data_handler = DataHandler()
+        self.visualization = None
+        self.plot_rows = None  # Номера строк данных, прошедших фильтр, для построенного графика
+
+        # Фоновая загрузка CSV
+        self.load_thread = None
+        self.load_worker = None
+
+        # Слежение за дописыванием в загруженный CSV: уведомления файловой системы
+        # собираются таймером, новые строки дочитываются одним проходом
+        self.loaded_file = None  # (путь, прочитано байт) последнего загруженного CSV
+        self.tail_watcher = QFileSystemWatcher(self)
+        self.tail_watcher.fileChanged.connect(self.on_tail_file_changed)
+        self.tail_timer = QTimer(self)
+        self.tail_timer.setSingleShot(True)
+        self.tail_timer.setInterval(TAIL_READ_DELAY_MS)
+        self.tail_timer.timeout.connect(self.read_tail)
+        self.tail_plot_timer = QTimer(self)
+        self.tail_plot_timer.setSingleShot(True)
+        self.tail_plot_timer.setInterval(TAIL_PLOT_INTERVAL_MS)
+        self.tail_plot_timer.timeout.connect(self.refresh_tail_plot)
+
+        # Фоновый разбор вставленных данных: правки собираются таймером, результаты
+        # устаревших правок отбрасываются по номеру поколения
+        self.paste_generation = 0
+        self.paste_worker = None  # Разбор текущего поколения
+        self.paste_threads = []  # Все еще работающие потоки разбора (включая отмененные)
+        self.paste_result = None  # (DataFrame, схема) текущего поколения
+        self.paste_apply_pending = False  # Загрузить данные сразу после разбора
+        self.paste_timer = QTimer(self)
+        self.paste_timer.setSingleShot(True)
+        self.paste_timer.setInterval(PASTE_DEBOUNCE_MS)
+        self.paste_timer.timeout.connect(self.start_paste_parse)
+
+        # Основной контейнер с переключаемыми страницами
+        self.stack = QStackedWidget(self)
+
+        # Страница загрузки данных
+        self.data_page = self.create_data_page()
+        self.stack.addWidget(self.data_page)
+
+        # Страница визуализации создается лениво в ensure_visualization_page
+        self.visualization_page = None
+
+        # Основной layout
+        layout = QVBoxLayout()
+        layout.addWidget(self.stack)
+
+        # Строка состояния с разбивкой времени последней загрузки и отрисовки
+        self.status_bar = QStatusBar()
+        layout.addWidget(self.status_bar)
+        self.setLayout(layout)
+
+    def create_data_page(self):
+        """Создает страницу загрузки данных"""
+        page = QWidget()
+        layout = QHBoxLayout()
+
+        vbox = QVBoxLayout()
+
+        self.btn_load = QPushButton("Загрузить CSV")
+        self.btn_load.clicked.connect(self.load_csv)
+        vbox.addWidget(self.btn_load)
+
+        self.lean_checkbox = QCheckBox("Компактное хранение данных")
+        self.lean_checkbox.setToolTip(
+            "Строковые столбцы с небольшим числом значений хранятся как категории,\n"
+            "числа - в минимальной безопасной разрядности"
+        )
+        self.lean_checkbox.setChecked(self.data_handler.lean)
+        self.lean_checkbox.toggled.connect(self.set_lean_mode)
+        vbox.addWidget(self.lean_checkbox)
+
+        self.tail_checkbox = QCheckBox("Следить за дописыванием в файл")
+        self.tail_checkbox.setToolTip(
+            "Новые строки, дописанные в загруженный CSV, добавляются\n"
+            "в таблицу и на график без повторной загрузки файла"
+        )
+        self.tail_checkbox.toggled.connect(self.set_tail_mode)
+        vbox.addWidget(self.tail_checkbox)
+
+        self.parse_cache_checkbox = QCheckBox("Кэшировать разобранные файлы")
+        self.parse_cache_checkbox.setToolTip(
+            "Разобранный CSV сохраняется на диск в папку кэша пользователя,\n"
+            "и повторно открытый неизмененный файл читается оттуда без разбора"
+        )
+        self.parse_cache_checkbox.toggled.connect(self.set_parse_cache_mode)
+        vbox.addWidget(self.parse_cache_checkbox)
+
+        self.btn_parse_cache = QPushButton("Кэш разобранных файлов...")
+        self.btn_parse_cache.setToolTip("Записи кэша разобранных файлов и его очистка")
+        self.btn_parse_cache.clicked.connect(self.show_parse_cache)
+        vbox.addWidget(self.btn_parse_cache)
+
+        # Прогресс фоновой загрузки
+        self.load_progress = QProgressBar()
+        self.load_progress.setRange(0, 1000)
+        self.load_progress.setVisible(False)
+        vbox.addWidget(self.load_progress)
+
+        self.load_status = QLabel()
+        self.load_status.setVisible(False)
+        vbox.addWidget(self.load_status)
+
+        self.btn_cancel_load = QPushButton("Отменить загрузку")
+        self.btn_cancel_load.clicked.connect(self.cancel_loading)
+        self.btn_cancel_load.setVisible(False)
+        vbox.addWidget(self.btn_cancel_load)
+
+        self.text_edit = PasteEdit()
+        self.text_edit.setPlaceholderText("Вставьте CSV-данные")
+        self.text_edit.dataChanged.connect(self.paste_timer.start)
+        vbox.addWidget(self.text_edit)
+
+        # Предпросмотр вставленных данных: разделитель, типы и первые строки
+        self.paste_info = QLabel()
+        self.paste_info.setWordWrap(True)
+        self.paste_info.setVisible(False)
+        vbox.addWidget(self.paste_info)
+
+        self.paste_preview_model = DataFrameModel()
+        self.paste_preview = QTableView()
+        self.paste_preview.setModel(self.paste_preview_model)
+        self.paste_preview.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.paste_preview.setMaximumHeight(200)
+        self.paste_preview.setVisible(False)
+        vbox.addWidget(self.paste_preview)
+
+        self.btn_process = QPushButton("Обработать данные")
+        self.btn_process.clicked.connect(self.process_manual_input)
+        vbox.addWidget(self.btn_process)
+
+        self.btn_clear = QPushButton("Очистить данные")
+        self.btn_clear.clicked.connect(self.clear_data)
+        vbox.addWidget(self.btn_clear)
+
+        # Схема загруженных данных: типы столбцов и объем в памяти
+        self.schema_label = QLabel()
+        self.schema_label.setWordWrap(True)
+        vbox.addWidget(self.schema_label)
+
+        self.btn_visualize = QPushButton("Перейти к визуализации")
+        self.btn_visualize.clicked.connect(self.show_visualization_page)
+        self.btn_visualize.setEnabled(False)
+        vbox.addWidget(self.btn_visualize)
+
+        layout.addLayout(vbox, 1)
+
+        # Таблица с ленивой моделью: ячейки форматируются только для видимых строк
+        self.table_model = DataFrameModel()
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        layout.addWidget(self.table, 3)
+
+        page.setLayout(layout)
+        return page
+
+    def ensure_visualization_page(self):
+        """Создает визуализацию и ее страницу при первом обращении"""
+        if self.visualization_page is None:
+            with span("startup.visualization_page"):
+                from visualization import Visualization
+                self.visualization = Visualization()
+                self.visualization_page = self.create_visualization_page()
+                self.visualization.render_callback = self.on_background_render
+                self.visualization.start_render_thread()
+                self.stack.addWidget(self.visualization_page)
+        return self.visualization_page
+
+    def create_visualization_page(self):
+        """Создает страницу визуализации"""
+        from matplotlib.backends.backend_qt5agg import (
+            FigureCanvasQTAgg as FigureCanvas,
+            NavigationToolbar2QT as NavigationToolbar
+        )
+        from lod import AGGREGATIONS
+        from facet_view import FacetView
+        from painter_view import PortraitView
+        from inspector import PortraitInspector
+        from filter_panel import FilterPanel
+
+        page = QWidget()
+        layout = QHBoxLayout()
+
+        # Левая панель с выпадающими списками для параметров
+        left_panel = QVBoxLayout()
+        left_panel.setAlignment(Qt.AlignmentFlag.AlignTop)
+
+        self.btn_back = QPushButton("Назад к данным")
+        self.btn_back.clicked.connect(self.show_data_page)
+        left_panel.addWidget(self.btn_back)
+
+        # Параметры функции для визуализации
+        self.param_widgets = {}
+
+        params = [
+            ('items', "Выберите столбец для 'items'"),
+            ('values', "Выберите столбец для 'values'"),
+            ('groups', "Выберите столбец для 'groups'")
+        ]
+
+        for param, label_text in params:
+            param_layout = QVBoxLayout()
+            param_layout.setSpacing(5)
+
+            label = QLabel(label_text)
+            self.param_widgets[param] = QComboBox()
+
+            param_layout.addWidget(label)
+            param_layout.addWidget(self.param_widgets[param])
+
+            left_panel.addLayout(param_layout)
+            left_panel.addSpacing(10)
+
+        # Добавляем выпадающий список для выбора шаблона
+        template_layout = QVBoxLayout()
+        template_layout.setSpacing(5)
+        template_label = QLabel("Выберите шаблон")
+        self.template_selector = QComboBox()
+        self.template_selector.addItems(self.visualization.load_templates())
+        template_layout.addWidget(template_label)
+        template_layout.addWidget(self.template_selector)
+        left_panel.addLayout(template_layout)
+        left_panel.addSpacing(10)
+
+        # Столбец для малых множеств: по портрету на каждое значение столбца
+        facet_layout = QVBoxLayout()
+        facet_layout.setSpacing(5)
+        facet_label = QLabel("Сетка портретов по столбцу")
+        self.facet_selector = QComboBox()
+        facet_layout.addWidget(facet_label)
+        facet_layout.addWidget(self.facet_selector)
+        left_panel.addLayout(facet_layout)
+        left_panel.addSpacing(10)
+
+        # Фильтр групп, элементов и значений по индексам DataHandler
+        self.filter_panel = FilterPanel()
+        self.filter_panel.filterChanged.connect(self.apply_filter)
+        left_panel.addWidget(self.filter_panel)
+        left_panel.addSpacing(10)
+
+        # Кнопка для выбора цветов
+        self.btn_choose_colors = QPushButton("Выбрать цвета")
+        self.btn_choose_colors.clicked.connect(self.choose_colors)
+        left_panel.addWidget(self.btn_choose_colors)
+
+        # Контейнер для отображения кружков с цветами
+        self.color_widgets_container = QVBoxLayout()
+        left_panel.addLayout(self.color_widgets_container)
+
+        # Элементы управления для ax.set_ylim
+        ylim_layout = QHBoxLayout()
+        ylim_label = QLabel("Границы оси Y:")
+        self.ylim_min = QDoubleSpinBox()
+        self.ylim_min.setRange(-100.0, 100.0)
+        self.ylim_min.setValue(-50.0)
+        self.ylim_max = QDoubleSpinBox()
+        self.ylim_max.setRange(-100.0, 100.0)
+        self.ylim_max.setValue(90.0)
+        self.btn_apply_ylim = QPushButton("Применить")
+        self.btn_apply_ylim.clicked.connect(self.apply_ylim)
+
+        ylim_layout.addWidget(ylim_label)
+        ylim_layout.addWidget(self.ylim_min)
+        ylim_layout.addWidget(self.ylim_max)
+        ylim_layout.addWidget(self.btn_apply_ylim)
+
+        left_panel.addLayout(ylim_layout)
+
+        # Уровень детализации для портретов с очень большим числом элементов
+        lod_layout = QVBoxLayout()
+        lod_layout.setSpacing(5)
+        lod_label = QLabel("Детализация")
+        self.lod_selector = QComboBox()
+        self.lod_selector.addItem("Все элементы", None)
+        for how, label_text in AGGREGATIONS.items():
+            self.lod_selector.addItem(f"Агрегация: {label_text}", how)
+        self.lod_selector.setToolTip(
+            "Объединяет соседние элементы каждой группы в угловые слоты\n"
+            "по размеру холста, если элементов больше, чем помещается на экране.\n"
+            "Паутинные диаграммы не агрегируются: их элементы - оси"
+        )
+        self.lod_selector.currentIndexChanged.connect(self.set_lod_aggregation)
+        lod_layout.addWidget(lod_label)
+        lod_layout.addWidget(self.lod_selector)
+        left_panel.addLayout(lod_layout)
+        left_panel.addSpacing(10)
+
+        # Способ отрисовки одиночного графика
+        backend_layout = QVBoxLayout()
+        backend_layout.setSpacing(5)
+        backend_label = QLabel("Отрисовка")
+        self.backend_selector = QComboBox()
+        self.backend_selector.addItem("matplotlib", "matplotlib")
+        self.backend_selector.addItem("QPainter (быстрое масштабирование)", "painter")
+        self.backend_selector.setToolTip(
+            "QPainter рисует шаблоны, объявившие GEOMETRY_FUNCTION, без matplotlib:\n"
+            "колесо мыши - масштаб, перетаскивание - сдвиг, двойной щелчок - исходный вид"
+        )
+        self.backend_selector.currentIndexChanged.connect(self.set_backend)
+        backend_layout.addWidget(backend_label)
+        backend_layout.addWidget(self.backend_selector)
+        left_panel.addLayout(backend_layout)
+        left_panel.addSpacing(10)
+
+        # Кнопки
+        self.btn_plot = QPushButton("Построить график")
+        self.btn_plot.clicked.connect(self.plot_graph)
+        left_panel.addWidget(self.btn_plot)
+
+        self.legend_visible = True
+        self.btn_toggle_legend = QPushButton("Скрыть легенду")
+        self.btn_toggle_legend.clicked.connect(self.toggle_legend)
+        left_panel.addWidget(self.btn_toggle_legend)
+
+        self.btn_export = QPushButton("Сохранить изображение")
+        self.btn_export.clicked.connect(self.export_plot)
+        left_panel.addWidget(self.btn_export)
+
+        self.profiling_checkbox = QCheckBox("Замер времени отрисовки")
+        self.profiling_checkbox.setToolTip(
+            f"Разбивка времени показывается в строке состояния\n"
+            f"и пишется в журнал {profiling.DEFAULT_LOG_PATH}"
+        )
+        self.profiling_checkbox.setChecked(profiling.is_enabled())
+        self.profiling_checkbox.toggled.connect(self.set_profiling)
+        left_panel.addWidget(self.profiling_checkbox)
+
+        layout.addLayout(left_panel, 1)
+
+        # Правая панель (предпросмотр графика)
+        self.visualization.canvas = FigureCanvas(self.visualization.figure)
+        self.visualization.toolbar = NavigationToolbar(self.visualization.canvas, self)
+
+        # Подсказки при наведении и просмотр строки по щелчку
+        self.inspector = PortraitInspector(self.visualization)
+        self.inspector.on_select = self.show_inspected_row
+
+        plot_widget = QWidget()
+        plot_layout = QVBoxLayout()
+        plot_layout.setContentsMargins(0, 0, 0, 0)
+        plot_layout.addWidget(self.visualization.toolbar)
+        plot_layout.addWidget(self.visualization.canvas)
+        plot_widget.setLayout(plot_layout)
+
+        # Сетка фасетов показывается вместо одиночного графика
+        self.facet_view = FacetView(self.visualization.registry)
+
+        self.plot_stack = QStackedWidget()
+        self.plot_stack.addWidget(plot_widget)
+        self.plot_stack.addWidget(self.facet_view)
+
+        # Отрисовка через QPainter (для шаблонов с функцией геометрии)
+        self.painter_view = PortraitView(self.visualization)
+        self.plot_stack.addWidget(self.painter_view)
+
+        layout.addWidget(self.plot_stack, 3)
+
+        page.setLayout(layout)
+        return page
+
+    def choose_colors(self):
+        """Открывает диалог выбора цветов для каждой группы"""
+        if self.data_handler.df is None:
+            return
+
+        self.visualization.group_colors = {}
+        self.add_missing_colors()
+        self.update_color_widgets()
+
+    def add_missing_colors(self):
+        """
+        Назначает цвета по умолчанию группам, у которых еще нет цвета; возвращает True, если такие были.
+
+        Цвета получают только группы, оставшиеся после фильтра: они берутся
+        из индекса столбца групп по отобранным строкам.
+        """
+        group_colors = self.visualization.group_colors
+        added = False
+        for group in self.present_groups():
+            if group not in group_colors:
+                group_colors[group] = DEFAULT_COLORS[len(group_colors) % len(DEFAULT_COLORS)]
+                added = True
+        return added
+
+    def present_groups(self):
+        """Группы, которые есть в строках, прошедших фильтр (по индексу столбца групп)"""
+        columns = self.selected_columns()
+        rows = self.data_handler.filtered_arrays(columns, self.filter_panel.filter_state())[3]
+        return self.data_handler.category_index(columns[2]).present(rows)
+
+    def update_color_widgets(self):
+        """Обновляет цвет кружочков в соответствии с текущими цветами групп"""
+        # Очищаем контейнер перед добавлением новых виджетов
+        while self.color_widgets_container.count():
+            item = self.color_widgets_container.takeAt(0)
+            widget = item.widget()
+            if widget:
+                widget.deleteLater()
+
+        color_circles_layout = QHBoxLayout()
+        color_circles_layout.setSpacing(10)
+
+        for group, color in self.visualization.group_colors.items():
+            color_circle = QLabel()
+            color_circle.setFixedSize(30, 30)
+            color_circle.setStyleSheet(
+                f"background-color: {color};"
+                "border-radius: 15px;"
+                "border: 1px solid black;"
+            )
+            color_circle.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            color_circle.setToolTip(group)
+            color_circle.mousePressEvent = lambda event, g=group: self.change_group_color(g)
+
+            color_circles_layout.addWidget(color_circle)
+
+        self.color_widgets_container.addLayout(color_circles_layout)
+
+    def change_group_color(self, group):
+        """Изменяет цвет для конкретной группы"""
+        color = QColorDialog.getColor()
+        if color.isValid():
+            self.visualization.group_colors[group] = color.name()
+            self.update_color_widgets()  # Обновляем виджеты с цветами
+            # Перекрашиваем существующий график, перестраиваем только при необходимости
+            if not (self.is_plot_current() and self.active_view().update_colors()):
+                self.plot_graph()
+
+    def load_csv(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Выберите файл с данными", "",
+            "Данные (*.csv *.parquet *.pq *.feather *.arrow *.ipc);;"
+            "CSV (*.csv);;Parquet (*.parquet *.pq);;Feather/Arrow IPC (*.feather *.arrow *.ipc)"
+        )
+        if not file_path:
+            return
+        if is_columnar_file(file_path):
+            # Колоночные файлы открываются мгновенно: читаются только метаданные
+            self.stop_tail()
+            self.loaded_file = None
+            with trace("load", file=file_path):
+                loaded = self.data_handler.load_file(file_path)
+            if loaded:
+                self.show_data(self.data_handler.display_frame())
+                self.show_timings("load")
+                self.btn_visualize.setEnabled(True)
+                self.update_column_list()
+            else:
+                self.show_error("Не удалось открыть файл с данными")
+        else:
+            self.start_loading(file_path)
+
+    def start_loading(self, file_path):
+        """Запускает чтение CSV в фоновом потоке"""
+        if self.load_thread is not None:
+            return
+        self.stop_tail()
+
+        self.load_thread = QThread(self)
+        self.load_worker = CSVLoadWorker(
+            file_path, lean=self.data_handler.lean, cache=self.data_handler.parse_cache
+        )
+        self.load_worker.moveToThread(self.load_thread)
+
+        self.load_thread.started.connect(self.load_worker.run)
+        self.load_worker.progress.connect(self.on_load_progress)
+        self.load_worker.loaded.connect(self.on_csv_loaded)
+        self.load_worker.failed.connect(self.on_load_failed)
+        for signal in (self.load_worker.loaded, self.load_worker.failed, self.load_worker.cancelled):
+            signal.connect(self.load_thread.quit)
+        self.load_thread.finished.connect(self.load_worker.deleteLater)
+        self.load_thread.finished.connect(self.load_thread.deleteLater)
+        self.load_thread.finished.connect(self.on_load_thread_finished)
+
+        self.set_loading_state(True)
+        self.load_thread.start()
+
+    def cancel_loading(self):
+        """Прерывает фоновую загрузку"""
+        if self.load_worker is not None:
+            self.load_worker.cancel()
+            self.load_status.setText("Отмена загрузки...")
+
+    def set_loading_state(self, loading):
+        """Переключает элементы страницы данных на время загрузки"""
+        self.load_progress.setValue(0)
+        self.load_progress.setVisible(loading)
+        self.load_status.setText("Чтение файла..." if loading else "")
+        self.load_status.setVisible(loading)
+        self.btn_cancel_load.setVisible(loading)
+        self.btn_load.setEnabled(not loading)
+        self.btn_process.setEnabled(not loading)
+        self.btn_clear.setEnabled(not loading)
+
+    def on_load_progress(self, bytes_read, total_bytes, rows):
+        if total_bytes:
+            self.load_progress.setValue(int(1000 * bytes_read / total_bytes))
+        self.load_status.setText(f"Прочитано {bytes_read / 2**20:.1f} из {total_bytes / 2**20:.1f} МБ, строк: {rows}")
+
+    def on_csv_loaded(self, df, schema):
+        """Принимает готовый DataFrame из фонового потока"""
+        self.data_handler.set_dataframe(df, schema)
+        self.loaded_file = (self.load_worker.file_path, self.load_worker.bytes_read)
+        self.show_data(self.data_handler.df)
+        self.show_timings("load")
+        self.btn_visualize.setEnabled(True)
+        self.update_column_list()
+        if self.tail_checkbox.isChecked():
+            self.start_tail()
+
+    def set_parse_cache_mode(self, checked):
+        """Включает или выключает кэш разобранных файлов для следующих загрузок"""
+        if not checked:
+            self.data_handler.parse_cache = None
+            return
+        cache = ParseCache()
+        if not cache.enabled:
+            self.parse_cache_checkbox.setChecked(False)
+            self.show_error(cache.error)
+            return
+        self.data_handler.parse_cache = cache
+
+    def show_parse_cache(self):
+        """Показывает записи кэша разобранных файлов и предлагает очистить его"""
+        # Просмотр и очистка доступны и при выключенном кэше
+        cache = self.data_handler.parse_cache or ParseCache()
+        try:
+            text = format_entries(cache)
+            has_entries = bool(cache.entries())
+        except OSError as e:
+            self.show_error(f"Кэш разобранных файлов недоступен:\n{e}")
+            return
+        box = QMessageBox(self)
+        box.setWindowTitle("Кэш разобранных файлов")
+        box.setText(text)
+        btn_clear = box.addButton("Очистить кэш", QMessageBox.ButtonRole.DestructiveRole)
+        box.addButton(QMessageBox.StandardButton.Close)
+        btn_clear.setEnabled(self.load_thread is None and has_entries)
+        box.exec()
+        if box.clickedButton() is btn_clear:
+            try:
+                cache.clear()
+            except OSError as e:
+                self.show_error(f"Не удалось очистить кэш разобранных файлов:\n{e}")
+
+    def on_load_failed(self, message):
+        self.show_error(f"Ошибка загрузки CSV:\n{message}")
+
+    def on_load_thread_finished(self):
+        self.load_thread = None
+        self.load_worker = None
+        self.set_loading_state(False)
+
+    def closeEvent(self, event):
+        """Останавливает фоновую загрузку перед закрытием окна"""
+        if self.load_thread is not None:
+            self.load_worker.cancel()
+            self.load_thread.quit()
+            self.load_thread.wait()
+        self.paste_timer.stop()
+        self.cancel_paste_parse()
+        for thread in list(self.paste_threads):
+            thread.wait()
+        if self.visualization is not None:
+            self.visualization.stop_render_thread()
+        super().closeEvent(event)
+
+    def set_tail_mode(self, checked):
+        """Включает или выключает слежение за дописыванием в загруженный CSV"""
+        if checked:
+            self.start_tail()
+        else:
+            self.stop_tail()
+
+    def start_tail(self):
+        """Начинает дочитывать загруженный CSV с конца прочитанных данных"""
+        if self.loaded_file is None:
+            return
+        file_path, bytes_read = self.loaded_file
+        try:
+            started = self.data_handler.start_tail(file_path, bytes_read)
+        except OSError as e:
+            print(f"Ошибка слежения за файлом: {e}")
+            return
+        if started:
+            self.tail_watcher.addPath(file_path)
+            # Строки могли быть дописаны, пока файл загружался
+            self.tail_timer.start()
+
+    def stop_tail(self):
+        """Прекращает слежение за файлом"""
+        self.data_handler.stop_tail()
+        if self.tail_watcher.files():
+            self.tail_watcher.removePaths(self.tail_watcher.files())
+        self.tail_timer.stop()
+        self.tail_plot_timer.stop()
+
+    def on_tail_file_changed(self, file_path):
+        """Собирает частые уведомления об изменении файла в одно дочитывание"""
+        # Если файл был заменен, наблюдатель перестает за ним следить
+        if file_path not in self.tail_watcher.files():
+            self.tail_watcher.addPath(file_path)
+        if not self.tail_timer.isActive():
+            self.tail_timer.start()
+
+    def read_tail(self):
+        """Дочитывает новые строки и обновляет таблицу; график перестраивается не чаще интервала"""
+        tail = self.data_handler.tail
+        if tail is None:
+            return
+        rows = self.data_handler.read_tail()
+        if rows is None:
+            # Файл укорочен или заменен - загружаем его заново
+            file_path = tail["path"]
+            self.stop_tail()
+            self.start_loading(file_path)
+            return
+        if not rows:
+            return
+
+        self.table_model.append_rows(self.data_handler.last_rows(rows))
+        self.show_schema()
+        self.status_bar.showMessage(f"Дописано строк: {rows}, всего: {self.data_handler.row_count()}")
+        if not self.tail_plot_timer.isActive():
+            self.tail_plot_timer.start()
+
+    def refresh_tail_plot(self):
+        """Перестраивает график, построенный по текущим столбцам, после дочитывания"""
+        if self.visualization is None or self.active_view().plot_key is None:
+            return
+        template_name, data_key = self.active_view().plot_key
+        if template_name == self.template_selector.currentText() and data_key[1:4] == self.selected_columns():
+            # В дописанных строках могли появиться новые группы
+            if self.visualization.group_colors and self.add_missing_colors():
+                self.update_color_widgets()
+            self.plot_graph()
+
+    def start_paste_parse(self):
+        """Запускает фоновый разбор вставленных данных; предыдущий разбор отменяется"""
+        self.cancel_paste_parse()
+        self.paste_generation += 1
+        self.paste_result = None
+
+        text = self.text_edit.data_text()
+        if not text.strip():
+            self.paste_apply_pending = False
+            self.paste_info.setVisible(False)
+            self.paste_preview.setVisible(False)
+            self.paste_preview_model.clear()
+            return
+
+        thread = QThread(self)
+        worker = TextParseWorker(text, self.paste_generation, lean=self.data_handler.lean)
+        worker.moveToThread(thread)
+
+        thread.started.connect(worker.run)
+        worker.preview.connect(self.on_paste_preview)
+        worker.parsed.connect(self.on_paste_parsed)
+        worker.failed.connect(self.on_paste_failed)
+        for signal in (worker.parsed, worker.failed, worker.cancelled):
+            signal.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        thread.finished.connect(lambda: self.on_paste_thread_finished(thread, worker))
+
+        self.paste_worker = worker
+        self.paste_threads.append(thread)
+        self.paste_info.setText("Разбор данных...")
+        self.paste_info.setVisible(True)
+        thread.start()
+
+    def cancel_paste_parse(self):
+        """Отменяет разбор текущего поколения вставленных данных"""
+        if self.paste_worker is not None:
+            self.paste_worker.cancel()
+            self.paste_worker = None
+
+    def on_paste_preview(self, generation, rows, separator, columns):
+        """Показывает первые строки, разделитель и типы столбцов вставленных данных"""
+        if generation != self.paste_generation:
+            return
+        self.paste_preview_model.set_dataframe(rows)
+        self.paste_preview.setVisible(True)
+        types = ", ".join(f"{column}: {dtype}" for column, dtype in columns.items())
+        self.paste_info.setText(f"Разделитель: '{separator}'. Столбцы: {types}. Разбор данных...")
+
+    def on_paste_parsed(self, generation, df, schema):
+        if generation != self.paste_generation:
+            return
+        self.paste_result = (df, schema)
+        text = self.paste_info.text().removesuffix("Разбор данных...")
+        self.paste_info.setText(f"{text}Строк: {len(df)}")
+        if self.paste_apply_pending:
+            self.apply_paste()
+
+    def on_paste_failed(self, generation, message):
+        if generation != self.paste_generation:
+            return
+        self.paste_info.setText(f"Не удалось разобрать данные: {message}")
+        if self.paste_apply_pending:
+            self.paste_apply_pending = False
+            self.show_error(f"Ошибка обработки данных:\n{message}")
+
+    def on_paste_thread_finished(self, thread, worker):
+        self.paste_threads.remove(thread)
+        if self.paste_worker is worker:
+            self.paste_worker = None
+
+    def process_manual_input(self):
+        """Загружает вставленные данные; если разбор еще идет, данные загрузятся по его окончании"""
+        if self.paste_timer.isActive() or (self.paste_result is None and self.paste_worker is None):
+            # Последняя правка еще не разбиралась
+            self.paste_timer.stop()
+            self.start_paste_parse()
+        if self.paste_result is not None:
+            self.apply_paste()
+        elif self.paste_worker is not None:
+            self.paste_apply_pending = True
+
+    def apply_paste(self):
+        """Подменяет данные разобранным в фоне DataFrame"""
+        df, schema = self.paste_result
+        self.paste_apply_pending = False
+        self.stop_tail()
+        self.loaded_file = None
+        self.data_handler.set_dataframe(df, schema)
+        self.show_data(self.data_handler.df)
+        self.btn_visualize.setEnabled(True)
+        self.update_column_list()
+
+    def clear_data(self):
+        self.stop_tail()
+        self.loaded_file = None
+        self.data_handler.clear_data()
+        self.table_model.clear()
+        self.schema_label.clear()
+        self.text_edit.clear()
+        if self.visualization_page is not None:
+            self.param_widgets['items'].clear()
+            self.param_widgets['values'].clear()
+            self.param_widgets['groups'].clear()
+            self.template_selector.clear()
+            self.facet_selector.clear()
+            self.facet_view.clear()
+            self.painter_view.clear()
+            self.filter_panel.clear()
+            self.plot_rows = None
+            self.plot_stack.setCurrentIndex(0)
+        self.btn_visualize.setEnabled(False)
+
+    def show_error(self, message):
+        QMessageBox.critical(self, "Ошибка", message)
+
+    def show_data(self, df):
+        self.table_model.set_dataframe(df)
+        self.show_schema()
+
+    def show_schema(self):
+        """Показывает типы столбцов и объем загруженных данных в памяти"""
+        schema = self.data_handler.schema
+        if schema is None:
+            self.schema_label.clear()
+            return
+        lines = [f"{column}: {dtype}" for column, dtype in schema["columns"].items()]
+        lines.append(f"Объем в памяти: {schema['memory_bytes'] / 2**20:.1f} МБ")
+        self.schema_label.setText("\n".join(lines))
+
+    def set_lean_mode(self, checked):
+        """Включает или выключает компактное хранение для следующих загрузок"""
+        self.data_handler.lean = checked
+
+    def show_visualization_page(self):
+        """Переключает на страницу визуализации"""
+        self.ensure_visualization_page()
+        self.update_column_list()
+        self.stack.setCurrentWidget(self.visualization_page)
+
+    def show_data_page(self):
+        """Переключает на страницу загрузки данных"""
+        self.stack.setCurrentWidget(self.data_page)
+
+    def update_column_list(self):
+        """Обновляет список переменных, отображая их фактический тип данных"""
+        if self.data_handler.df is not None and self.visualization_page is not None:
+            for param in self.param_widgets.values():
+                param.clear()
+                param.addItems(self.data_handler.get_columns())
+            self.facet_selector.clear()
+            self.facet_selector.addItem("Нет", None)
+            for column in self.data_handler.get_columns():
+                self.facet_selector.addItem(column, column)
+
+    def plot_graph(self):
+        """Вызывает выбранный шаблон визуализации"""
+        if self.facet_selector.currentData() is not None:
+            self.plot_facets()
+            return
+        try:
+            template_name = self.template_selector.currentText()
+            with trace("render", template=template_name):
+                items, values, groups = self.prepare_plot_arrays()
+
+                geometry = None
+                if self.backend_selector.currentData() == "painter":
+                    geometry = self.visualization.compute_geometry(
+                        items, values, groups, template_name, data_key=self.current_data_key()
+                    )
+                    if geometry is None:
+                        self.status_bar.showMessage(
+                            f"Шаблон {template_name} не поддерживает отрисовку через QPainter, используется matplotlib"
+                        )
+
+                if geometry is not None:
+                    self.plot_stack.setCurrentWidget(self.painter_view)
+                    self.painter_view.set_portrait(
+                        geometry, template_name,
+                        show_legend=self.legend_visible,
+                        y_min=self.ylim_min.value(),
+                        y_max=self.ylim_max.value(),
+                        data_key=self.current_data_key()
+                    )
+                else:
+                    self.plot_stack.setCurrentIndex(0)
+                    self.plot_matplotlib(items, values, groups)
+            self.show_timings("render")
+
+        except Exception as e:
+            self.show_error(f"Ошибка построения графика:\n{e}")
+
+    def prepare_plot_arrays(self):
+        """Возвращает массивы items, values и groups для выбранных столбцов и строк, прошедших фильтр"""
+        columns = self.selected_columns()
+        with span("render.prepare_columns"):
+            # Для колоночных источников в памяти остаются только выбранные столбцы
+            self.data_handler.select_columns(list(columns))
+            self.show_schema()
+            self.update_filter_panel(columns)
+
+            # Подготовленные массивы берутся из кэша DataHandler без поэлементных преобразований,
+            # строки фильтра - по индексам столбцов
+            items, values, groups, rows = self.data_handler.filtered_arrays(
+                columns, self.filter_panel.filter_state()
+            )
+        self.plot_rows = rows
+        self.filter_panel.set_shown(len(items), self.data_handler.row_count())
+        return items, values, groups
+
+    def update_filter_panel(self, columns):
+        """Заполняет панель фильтра группами и границами значений выбранных столбцов"""
+        items_column, values_column, groups_column = columns
+        index = self.data_handler.category_index(groups_column)
+        self.filter_panel.set_groups(groups_column, index.labels, index.counts.tolist())
+        if self.filter_panel.values_column != values_column:
+            self.filter_panel.set_values_column(values_column, *self.data_handler.value_bounds(values_column))
+
+    def apply_filter(self):
+        """Перестраивает показанный график или сетку портретов по новому фильтру"""
+        if self.data_handler.df is None:
+            return
+        if self.plot_stack.currentWidget() is self.facet_view or self.active_view().plot_key is not None:
+            # После фильтра могли остаться группы, которым еще не назначен цвет
+            if self.visualization.group_colors and self.add_missing_colors():
+                self.update_color_widgets()
+            self.plot_graph()
+
+    def plot_matplotlib(self, items, values, groups):
+        """Строит график выбранным шаблоном на фигуре matplotlib"""
+        self.inspector.column_names = self.selected_columns()
+        self.visualization.plot_graph(
+            items, values, groups,
+            self.template_selector.currentText(),
+            show_legend=self.legend_visible,
+            y_min=self.ylim_min.value(),
+            y_max=self.ylim_max.value(),
+            data_key=self.current_data_key(),
+            present_groups=self.present_groups()
+        )
+
+    def set_backend(self):
+        """Переключает способ отрисовки и перестраивает построенный график"""
+        if self.active_view().plot_key is not None:
+            self.plot_graph()
+
+    def export_plot(self):
+        """Сохраняет текущий график в файл через matplotlib (в том числе при отрисовке через QPainter)"""
+        if self.data_handler.df is None:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Сохранить изображение", "portrait.png", "PNG (*.png);;SVG (*.svg);;PDF (*.pdf)"
+        )
+        if not file_path:
+            return
+        try:
+            expected_key = (self.template_selector.currentText(), self.current_data_key())
+            if self.visualization.plot_key != expected_key:
+                # При отрисовке через QPainter фигура matplotlib строится только для экспорта
+                self.plot_matplotlib(*self.prepare_plot_arrays())
+            # Фоновая отрисовка могла еще не закончиться
+            self.visualization.finish_render()
+            self.visualization.save_figure(file_path, bbox_inches="tight")
+            self.status_bar.showMessage(f"Изображение сохранено: {file_path}")
+        except Exception as e:
+            self.show_error(f"Ошибка сохранения изображения:\n{e}")
+
+    def on_background_render(self, error):
+        """Показывает результат отрисовки в фоновом потоке"""
+        if error is not None:
+            self.show_error(f"Ошибка построения графика:\n{error}")
+        else:
+            self.show_timings("render_worker")
+
+    def show_inspected_row(self, row, aggregated):
+        """Показывает в строке состояния строку данных элемента, на котором щелкнули"""
+        if aggregated:
+            description = self.inspector.describe(row).replace("\n", "; ")
+            self.status_bar.showMessage(f"{description} (элементы объединены детализацией)")
+            return
+        df = self.data_handler.df
+        if self.plot_rows is not None:
+            # Номер строки отфильтрованных массивов -> номер строки данных
+            if row >= len(self.plot_rows):
+                return
+            row = int(self.plot_rows[row])
+        if df is None or row >= len(df):
+            return
+        values = "; ".join(f"{column}: {value}" for column, value in df.iloc[row].items())
+        self.status_bar.showMessage(f"Строка {row + 1}: {values}")
+
+    def active_view(self):
+        """Возвращает отрисовку одиночного графика, показанную сейчас: matplotlib или QPainter"""
+        if self.plot_stack.currentWidget() is self.painter_view:
+            return self.painter_view
+        return self.visualization
+
+    def plot_facets(self):
+        """Строит сетку портретов по значениям выбранного столбца"""
+        try:
+            with trace("render", template=self.template_selector.currentText(), facets=True):
+                facet_column = self.facet_selector.currentData()
+                items_column, values_column, groups_column = self.selected_columns()
+
+                with span("render.prepare_columns"):
+                    self.data_handler.select_columns([facet_column, items_column, values_column, groups_column])
+                    self.show_schema()
+                    self.update_filter_panel((items_column, values_column, groups_column))
+                    items = self.data_handler.get_array(items_column, 'str')
+                    values = self.data_handler.get_array(values_column, 'float')
+                    groups = self.data_handler.get_array(groups_column, 'str')
+
+                # Одно разбиение groupby на все фасеты
+                with span("render.facet_positions"):
+                    positions = self.data_handler.group_positions(facet_column)
+
+                # Номера строк фасетов сужаются до строк, прошедших фильтр
+                rows = self.data_handler.filter_rows(
+                    (items_column, values_column, groups_column), self.filter_panel.filter_state()
+                )
+                self.filter_panel.set_shown(len(items) if rows is None else len(rows), len(items))
+                if rows is not None:
+                    with span("render.facet_filter", rows=len(rows)):
+                        positions = self.data_handler.filter_positions(positions, rows)
+
+                self.plot_stack.setCurrentWidget(self.facet_view)
+                self.facet_view.set_facets(
+                    positions, items, values, groups,
+                    self.template_selector.currentText(),
+                    self.visualization.group_colors,
+                    y_min=self.ylim_min.value(),
+                    y_max=self.ylim_max.value(),
+                    data_key=self.current_data_key() + (facet_column,)
+                )
+            self.show_timings("render")
+
+        except Exception as e:
+            self.show_error(f"Ошибка построения сетки портретов:\n{e}")
+
+    def set_lod_aggregation(self):
+        """Меняет способ агрегации элементов и перестраивает построенный график"""
+        self.visualization.lod_aggregation = self.lod_selector.currentData()
+        if self.active_view().plot_key is not None:
+            self.plot_graph()
+
+    def show_timings(self, kind):
+        """Показывает в строке состояния разбивку времени последней операции"""
+        if profiling.is_enabled():
+            self.status_bar.showMessage(profiling.format_trace(kind))
+
+    def set_profiling(self, checked):
+        """Включает или выключает замеры времени"""
+        if checked:
+            profiling.enable()
+        else:
+            profiling.disable()
+            self.status_bar.clearMessage()
+
+    def selected_columns(self):
+        """Возвращает выбранные столбцы для items, values и groups"""
+        return tuple(self.param_widgets[param].currentText() for param in ('items', 'values', 'groups'))
+
+    def current_data_key(self):
+        """Ключ данных для шаблонов: версия данных, выбранные столбцы и фильтр"""
+        return (self.data_handler.version,) + self.selected_columns() + (filter_key(self.filter_panel.filter_state()),)
+
+    def is_plot_current(self):
+        """Проверяет, построен ли график для текущих данных, столбцов и шаблона"""
+        if self.facet_selector.currentData() is not None:
+            return False
+        return self.active_view().plot_key == (self.template_selector.currentText(), self.current_data_key())
+
+    def apply_ylim(self):
+        """Применяет границы оси Y без перестроения графика"""
+        if not (self.is_plot_current() and self.active_view().set_ylim(self.ylim_min.value(), self.ylim_max.value())):
+            self.plot_graph()
+
+    def toggle_legend(self):
+        """Переключает отображение легенды на графике"""
+        self.legend_visible = not self.legend_visible
+        if not (self.is_plot_current() and self.active_view().set_legend_visible(self.legend_visible)):
+            self.plot_graph()
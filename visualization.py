@@ -1,64 +1,489 @@
-import os
-import importlib.util
-import matplotlib.pyplot as plt
-
-class Visualization:
-    def __init__(self):
-        self.templates_dir = "templates"  # Папка с шаблонами графиков
-        self.figure, self.ax = plt.subplots(subplot_kw=dict(polar=True))
-        self.canvas = None
-        self.toolbar = None
-        self.group_colors = {}
-
-    def load_templates(self):
-        """Загружает список доступных шаблонов визуализации"""
-        templates = []
-        if os.path.exists(self.templates_dir):
-            templates = [f.replace(".py", "") for f in os.listdir(self.templates_dir) if f.endswith(".py")]
-        return templates
-
-    def plot_graph(self, items, values, groups, template_name, show_legend=True, y_min=-0.1, y_max=0.7):
-        """Вызывает выбранный шаблон визуализации"""
-        try:
-            # Очищаем текущий график
-            self.ax.clear()
-
-            # Импортируем шаблон как модуль
-            template_path = os.path.join(self.templates_dir, f"{template_name}.py")
-            spec = importlib.util.spec_from_file_location(template_name, template_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-
-            # Список возможных имен функций для построения графиков
-            plot_functions = [
-                "circular_scatter_plot_subjects",  # Для scatter шаблона
-                "plot_circular_barchart",  # Для нового barchart шаблона
-            ]
-
-            # Поиск и вызов функции из шаблона
-            plot_function = None
-            for func_name in plot_functions:
-                if hasattr(module, func_name):
-                    plot_function = getattr(module, func_name)
-                    break
-
-            if plot_function is None:
-                raise ValueError(f"В шаблоне {template_name} нет подходящей функции для построения графика.")
-
-            # Вызов функции построения графика
-            plot_function(
-                items, values, groups, self.ax,
-                show_legend=show_legend,
-                group_colors=self.group_colors
-            )
-
-            # Устанавливаем границы оси Y
-            self.ax.set_ylim(y_min, y_max)
-
-            # Обновляем канвас
-            if self.canvas:
-                self.canvas.draw()
-
-        except Exception as e:
-            print(f"Ошибка при построении графика: {e}")
-            raise e
\ No newline at end of file
+from collections import OrderedDict
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.artist import Artist
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from template_registry import TemplateRegistry
+from profiling import span
+import lod
+
+LOD_CACHE_SIZE = 8  # Сколько агрегированных наборов хранить в кэше
+LOD_REFRESH_DELAY_MS = 200  # Задержка пересчета детализации после изменения размера или масштаба
+
+def offscreen_figure(job, spare=None):
+    """
+    Возвращает (фигура, ось) с холстом Agg размером и разрешением видимой фигуры.
+
+    spare - свободная пара (фигура, ось) для повторного использования.
+    """
+    if spare is None:
+        figure = Figure(figsize=job["size_inches"], dpi=job["dpi"])
+        FigureCanvasAgg(figure)
+        spare = (figure, figure.add_subplot(polar=True))
+    figure, ax = spare
+    figure.set_dpi(job["dpi"])
+    figure.set_size_inches(*job["size_inches"], forward=False)
+    return spare
+
+
+class RenderedImage(Artist):
+    """
+    Растровое изображение закадровой фигуры на видимой фигуре.
+
+    Шаблоны рисуют на закадровой фигуре с холстом Agg (в фоновом потоке или
+    сразу), видимая фигура показывает только ее буфер. Перед показом
+    закадровая фигура приводится к размеру холста и границам видимой оси
+    и растеризуется заново, только если они изменились или артисты
+    перекрашены на месте.
+    """
+
+    def __init__(self, visualization):
+        super().__init__()
+        self.visualization = visualization
+        self.set_zorder(-1)
+
+    def draw(self, renderer):
+        if not self.get_visible() or self.visualization.offscreen is None:
+            return
+        rgba = self.visualization.rasterize_offscreen()
+        gc = renderer.new_gc()
+        # Буфер Agg хранится сверху вниз, draw_image ждет строки снизу вверх
+        renderer.draw_image(gc, 0, 0, rgba[::-1])
+        gc.restore()
+        self.stale = False
+
+
+class Visualization:
+    def __init__(self):
+        self.templates_dir = "templates"  # Папка с шаблонами графиков
+        self.registry = TemplateRegistry(self.templates_dir)
+        # Видимая фигура: ось задает координаты для панели инструментов и подсказок,
+        # сам график рисуется на закадровой фигуре и показывается изображением
+        self.figure, self.ax = plt.subplots(subplot_kw=dict(polar=True))
+        self.image = RenderedImage(self)
+        self.figure.add_artist(self.image)
+        self.canvas = None
+        self.toolbar = None
+        self.group_colors = {}
+        self.offscreen = None  # (фигура, ось) показанного графика
+        self._offscreen_dirty = False  # Артисты закадровой фигуры изменены на месте
+        self.handles = None  # Артисты последнего построения, которые вернул шаблон
+        self.plot_key = None  # Шаблон и ключ данных последнего построения
+
+        # Уровень детализации: None - рисовать все элементы, иначе способ агрегации из lod.AGGREGATIONS
+        self.lod_aggregation = None
+        self._lod_cache = OrderedDict()  # {(ключ данных, слоты, агрегация): агрегированные массивы}
+        self._lod_slots = None  # Число слотов, использованное при последнем построении
+        self._lod_timer = None
+        self._resize_cid = None
+        self._ylim_cid = None
+        self._last_plot = None  # Аргументы последнего построения для пересчета детализации
+
+        # Фоновая отрисовка (start_render_thread): задания нумеруются поколениями
+        self._render_thread = None
+        self._render_worker = None
+        self._render_generation = 0  # Поколение последнего задания
+        self._shown_generation = 0  # Поколение, показанное на холсте
+        self._pending_job = None  # Задание, которое еще рисуется в фоновом потоке
+        self.shown_job = None  # Задание, нарисованное на холсте (массивы после агрегации)
+        self.render_callback = None  # Вызывается после фоновой отрисовки: callback(текст ошибки или None)
+
+    def load_templates(self):
+        """Загружает список доступных шаблонов визуализации"""
+        return self.registry.names()
+
+    def plot_graph(self, items, values, groups, template_name, show_legend=True, y_min=-0.1, y_max=0.7,
+                   data_key=None, present_groups=None, view_ylim=None, background=True):
+        """
+        Вызывает выбранный шаблон визуализации.
+
+        items, values и groups - NumPy-массивы (или списки) одинаковой длины;
+        шаблоны не должны изменять их на месте.
+
+        data_key - ключ данных (версия данных и выбранные столбцы), по которому
+        шаблоны могут кэшировать геометрию между перерисовками.
+
+        present_groups - группы, которые есть в groups (например, после фильтра);
+        шаблон получает цвета только этих групп, и в легенде нет отфильтрованных.
+        None - все группы из group_colors.
+
+        view_ylim - текущие границы оси Y, если они отличаются от (y_min, y_max)
+        (например, после приближения панелью инструментов).
+
+        background - рисовать в фоновом потоке, если он запущен (start_render_thread);
+        тогда метод возвращается сразу, а готовый график показывается позже.
+        """
+        self._last_plot = dict(
+            items=items, values=values, groups=groups, template_name=template_name,
+            show_legend=show_legend, y_min=y_min, y_max=y_max, data_key=data_key,
+            present_groups=present_groups
+        )
+        try:
+            if background and self._render_worker is not None:
+                self._request_render(view_ylim)
+                self.plot_key = (template_name, data_key)
+                return
+
+            self.handles = None
+            self.plot_key = None
+            self._draw_now(self._make_job(view_ylim))
+            self.plot_key = (template_name, data_key)
+
+        except Exception as e:
+            print(f"Ошибка при построении графика: {e}")
+            raise e
+
+    def _make_job(self, view_ylim=None):
+        """
+        Готовит задание отрисовки по аргументам последнего построения.
+
+        Все, что зависит от состояния интерфейса (детализация, шаблон из реестра,
+        цвета, размер фигуры), берется здесь, в потоке интерфейса.
+        """
+        plot = self._last_plot
+        template_name = plot["template_name"]
+        self._render_generation += 1
+
+        # Уровень детализации: агрегируем элементы до разрешения холста
+        with span("render.lod"):
+            items, values, groups, layout_key = self._apply_lod(
+                template_name, plot["items"], plot["values"], plot["groups"], plot["data_key"]
+            )
+
+        # Функция шаблона берется из реестра: модуль импортируется один раз
+        # и перезагружается только при изменении файла
+        with span("render.template_lookup", template=template_name):
+            plot_function = self.registry.get(template_name)
+
+        # Необязательные параметры передаются только поддерживающим их шаблонам
+        group_colors = self.group_colors
+        if plot["present_groups"] is not None:
+            present = set(plot["present_groups"])
+            group_colors = {group: color for group, color in group_colors.items() if group in present}
+        kwargs = dict(show_legend=plot["show_legend"], group_colors=dict(group_colors))
+        if layout_key is not None and self.registry.accepts(template_name, "data_key"):
+            kwargs["data_key"] = layout_key
+
+        return dict(
+            generation=self._render_generation,
+            template_name=template_name,
+            plot_function=plot_function,
+            items=items, values=values, groups=groups,
+            source_rows=len(plot["items"]),
+            kwargs=kwargs,
+            ylim=tuple(view_ylim or (plot["y_min"], plot["y_max"])),
+            size_inches=tuple(self.figure.get_size_inches()),
+            dpi=self.figure.dpi,
+        )
+
+    @staticmethod
+    def draw_job(ax, job):
+        """Рисует задание на оси: очищает ее, вызывает шаблон и задает границы оси Y"""
+        with span("render.clear"):
+            ax.clear()
+        with span("render.template", template=job["template_name"], items=len(job["items"])):
+            handles = job["plot_function"](job["items"], job["values"], job["groups"], ax, **job["kwargs"])
+        ax.set_ylim(*job["ylim"])
+        # Шаблоны, вернувшие свои артисты, поддерживают обновление без перестроения
+        return handles if isinstance(handles, dict) else None
+
+    def _draw_now(self, job):
+        """Рисует задание сразу на закадровой фигуре; задания фонового потока при этом устаревают"""
+        if self._render_worker is not None:
+            self._render_worker.cancel(job["generation"])
+        # Показанная фигура принадлежит потоку интерфейса и рисуется заново
+        figure, ax = offscreen_figure(job, self.offscreen)
+        handles = self.draw_job(ax, job)
+        self._show(figure, ax, handles, job)
+        self._offscreen_dirty = True
+
+        # Обновляем канвас
+        if self.canvas:
+            with span("render.canvas_draw"):
+                self.canvas.draw()
+
+    def _show(self, figure, ax, handles, job):
+        """
+        Показывает нарисованную закадровую фигуру.
+
+        Видимая ось получает расположение, направление углов и границы оси
+        закадровой, чтобы координаты событий холста совпадали с графиком.
+        Возвращает пару (фигура, ось), показанную до этого, или None.
+        """
+        previous = self.offscreen if self.offscreen is not None and self.offscreen[0] is not figure else None
+        self.offscreen = (figure, ax)
+        self.handles = handles
+        self._shown_generation = job["generation"]
+        self.shown_job = job
+        # Фигура из фонового потока уже растеризована; фигура другого размера
+        # или с другими границами растеризуется заново (sync_offscreen)
+        self._offscreen_dirty = False
+
+        visible = self.ax
+        visible.set_axis_off()
+        visible.set_position(ax.get_position())
+        visible.set_theta_offset(ax.get_theta_offset())
+        visible.set_theta_direction(ax.get_theta_direction())
+        visible.set_xlim(ax.get_xlim())
+        visible.set_rlabel_position(ax.get_rlabel_position())
+        visible.set_ylim(ax.get_ylim())
+        self._connect_axes()
+        self.draw_idle()
+        return previous
+
+    def sync_offscreen(self):
+        """
+        Приводит закадровую фигуру к размеру видимой и к границам видимой оси
+        (после изменения размера холста, приближения или set_ylim).
+        Возвращает True, если фигуру нужно растеризовать заново.
+        """
+        figure, ax = self.offscreen
+        changed = self._offscreen_dirty
+        if figure.dpi != self.figure.dpi or tuple(figure.get_size_inches()) != tuple(self.figure.get_size_inches()):
+            figure.set_dpi(self.figure.dpi)
+            figure.set_size_inches(*self.figure.get_size_inches(), forward=False)
+            changed = True
+        view = (self.ax.get_ylim(), self.ax.get_rlabel_position())
+        if (ax.get_ylim(), ax.get_rlabel_position()) != view:
+            ax.set_ylim(*view[0])
+            ax.set_rlabel_position(view[1])
+            changed = True
+        return changed
+
+    def rasterize_offscreen(self):
+        """Возвращает буфер RGBA закадровой фигуры, растеризуя ее только при изменениях"""
+        figure = self.offscreen[0]
+        if self.sync_offscreen():
+            with span("render.offscreen_draw"):
+                figure.canvas.draw()
+            self._offscreen_dirty = False
+        return np.asarray(figure.canvas.buffer_rgba())
+
+    def save_figure(self, file_path, **kwargs):
+        """Сохраняет показанный график в файл (векторные форматы - из артистов, а не из изображения)"""
+        self.finish_render()
+        if self.offscreen is None:
+            self.figure.savefig(file_path, **kwargs)
+            return
+        self.sync_offscreen()
+        # Разрешение файла - без множителя плотности пикселей экрана, как у savefig видимой фигуры
+        if self.canvas is not None:
+            kwargs.setdefault("dpi", self.figure.dpi / self.canvas.device_pixel_ratio)
+        self.offscreen[0].savefig(file_path, **kwargs)
+        # savefig растеризует фигуру по-своему: буфер для показа обновляется заново
+        self._offscreen_dirty = True
+
+    def _connect_axes(self):
+        """Подключает обработчики оси и холста (один раз: видимая ось не очищается)"""
+        if self._ylim_cid is None:
+            self._ylim_cid = self.ax.callbacks.connect("ylim_changed", self._on_view_changed)
+        if self.canvas and self._resize_cid is None:
+            self._resize_cid = self.canvas.mpl_connect("resize_event", self._on_view_changed)
+
+    def connect_canvas_event(self, event, handler):
+        """Подключает обработчик события холста; возвращает номер подключения"""
+        return self.canvas.mpl_connect(event, handler)
+
+    def start_render_thread(self):
+        """
+        Запускает фоновый поток отрисовки.
+
+        После этого plot_graph и пересчет детализации не рисуют в потоке
+        интерфейса, а ставят задание с номером поколения. Пока поток занят,
+        новые задания заменяют друг друга; результат устаревшего поколения не
+        показывается. Перекраска, легенда и границы оси по-прежнему меняются
+        на месте.
+        """
+        from PyQt6.QtCore import QThread
+        from workers import RenderWorker
+
+        self._render_thread = QThread()
+        self._render_worker = RenderWorker(self.draw_job, offscreen_figure)
+        self._render_worker.moveToThread(self._render_thread)
+        self._render_worker.rendered.connect(self._on_rendered)
+        self._render_worker.failed.connect(self._on_render_failed)
+        self._render_thread.start()
+
+    def stop_render_thread(self):
+        """Останавливает фоновый поток отрисовки (ожидает текущее задание)"""
+        if self._render_thread is None:
+            return
+        self._render_worker.cancel(self._render_generation + 1)
+        self._render_thread.quit()
+        self._render_thread.wait()
+        self._render_thread = None
+        self._render_worker = None
+
+    def finish_render(self):
+        """Дорисовывает ожидающее задание сразу (например, перед сохранением фигуры в файл)"""
+        if self._pending_job is not None and self._pending_job["generation"] > self._shown_generation:
+            self._draw_now(self._pending_job)
+        self._pending_job = None
+
+    def _request_render(self, view_ylim=None):
+        """Ставит в фоновый поток задание с текущими настройками"""
+        self._pending_job = self._make_job(view_ylim)
+        self._render_worker.submit(self._pending_job)
+
+    def _on_rendered(self, generation, figure, ax, handles):
+        """Показывает готовую закадровую фигуру; результаты устаревших поколений возвращаются в запас"""
+        # Поколение могло быть уже нарисовано сразу (finish_render), пока результат шел из потока
+        if generation != self._render_generation or generation <= self._shown_generation:
+            self._render_worker.recycle(figure, ax)
+            return
+        job, self._pending_job = self._pending_job, None
+        with span("render.show"):
+            previous = self._show(figure, ax, handles, job)
+        if previous is not None:
+            self._render_worker.recycle(*previous)
+        if self.render_callback is not None:
+            self.render_callback(None)
+
+    def _on_render_failed(self, generation, message):
+        if generation != self._render_generation:
+            return
+        print(f"Ошибка при построении графика: {message}")
+        self._pending_job = None
+        self.plot_key = None
+        if self.render_callback is not None:
+            self.render_callback(message)
+
+    def update_colors(self):
+        """
+        Перекрашивает группы на существующем графике по self.group_colors.
+
+        Возвращает False, если шаблон не поддерживает перекраску на месте
+        и график нужно перестроить.
+        """
+        if self._pending_job is not None:
+            # Задание, которое еще рисуется, получило прежние цвета
+            return self._rerender(keep_view=True)
+        recolor = self.handles.get("recolor") if self.handles else None
+        if recolor is None:
+            return False
+        try:
+            recolor(self.group_colors)
+        except KeyError:
+            # Цвета заданы для других групп - нужен полный перестрой
+            return False
+        self._offscreen_dirty = True
+        self.draw_idle()
+        return True
+
+    def set_legend_visible(self, visible):
+        """Показывает или скрывает легенду без перестроения графика"""
+        if self._last_plot is not None:
+            self._last_plot["show_legend"] = visible
+        if self._pending_job is not None:
+            return self._rerender(keep_view=True)
+        legend = self.handles.get("legend") if self.handles else None
+        if legend is None:
+            return False
+        legend.set_visible(visible)
+        self._offscreen_dirty = True
+        self.draw_idle()
+        return True
+
+    def set_ylim(self, y_min, y_max):
+        """Меняет границы оси Y на существующем графике"""
+        if self.plot_key is None:
+            return False
+        if self._last_plot is not None:
+            self._last_plot.update(y_min=y_min, y_max=y_max)
+        if self._pending_job is not None:
+            return self._rerender(keep_view=False)
+        # Закадровая фигура получит границы видимой оси при следующей отрисовке холста
+        self.ax.set_ylim(y_min, y_max)
+        self.draw_idle()
+        return True
+
+    def _rerender(self, keep_view):
+        """Перерисовывает последний график в фоновом потоке с текущими настройками"""
+        if self.plot_key is None or self._last_plot is None:
+            return False
+        view_ylim = None
+        if keep_view:
+            # Границы еще не показанного задания новее, чем у видимой оси
+            view_ylim = self._pending_job["ylim"] if self._pending_job is not None else self.ax.get_ylim()
+        self._request_render(view_ylim)
+        return True
+
+    def compute_geometry(self, items, values, groups, template_name, data_key=None):
+        """Возвращает геометрию шаблона для отрисовки через QPainter или None, если шаблон ее не объявляет"""
+        geometry_function = self.registry.get_geometry(template_name)
+        if geometry_function is None:
+            return None
+        extra_kwargs = {}
+        if data_key is not None and self.registry.geometry_accepts(template_name, "data_key"):
+            extra_kwargs["data_key"] = data_key
+        with span("render.geometry", template=template_name, items=len(items)):
+            return geometry_function(items, values, groups, **extra_kwargs)
+
+    def lod_slots(self):
+        """Возвращает число угловых слотов для текущего размера холста и масштаба"""
+        bbox = self.ax.bbox
+        diameter = min(bbox.width, bbox.height)
+        zoom = 1.0
+        if self._last_plot is not None:
+            base_span = self._last_plot["y_max"] - self._last_plot["y_min"]
+            view_min, view_max = self.ax.get_ylim()
+            if view_max != view_min:
+                zoom = abs(base_span / (view_max - view_min))
+        return lod.slot_budget(diameter, zoom)
+
+    def _apply_lod(self, template_name, items, values, groups, data_key):
+        """
+        Агрегирует элементы, если их больше, чем слотов на холсте.
+
+        Агрегируются только шаблоны с функцией геометрии (элементы - сектора
+        круга). У паутинных диаграмм элементы - оси сводной таблицы, и
+        агрегированные подписи заменили бы их названия.
+        """
+        self._lod_slots = None
+        if self.lod_aggregation is None or self.registry.get_geometry(template_name) is None:
+            return items, values, groups, data_key
+
+        slots = self.lod_slots()
+        self._lod_slots = slots
+        if len(items) <= slots:
+            return items, values, groups, data_key
+
+        key = (data_key, slots, self.lod_aggregation)
+        aggregated = self._lod_cache.get(key) if data_key is not None else None
+        if aggregated is None:
+            aggregated = lod.aggregate(items, values, groups, slots, self.lod_aggregation)[:3]
+            if data_key is not None:
+                self._lod_cache[key] = aggregated
+                if len(self._lod_cache) > LOD_CACHE_SIZE:
+                    self._lod_cache.popitem(last=False)
+        else:
+            self._lod_cache.move_to_end(key)
+
+        lod_key = None if data_key is None else (data_key, "lod", slots, self.lod_aggregation)
+        return aggregated + (lod_key,)
+
+    def _on_view_changed(self, *args):
+        """Откладывает пересчет детализации после изменения размера холста или масштаба"""
+        if self.lod_aggregation is None or self._last_plot is None or self.canvas is None:
+            return
+        # None - детализация к построенному шаблону не применялась
+        if self._lod_slots is None or self.lod_slots() == self._lod_slots:
+            return
+        if self._lod_timer is None:
+            self._lod_timer = self.canvas.new_timer(interval=LOD_REFRESH_DELAY_MS)
+            self._lod_timer.single_shot = True
+            self._lod_timer.add_callback(self._refresh_lod)
+        self._lod_timer.stop()
+        self._lod_timer.start()
+
+    def _refresh_lod(self):
+        """Перестраивает график с детализацией под новый размер холста или масштаб"""
+        if self._last_plot is None or self._lod_slots is None or self.lod_slots() == self._lod_slots:
+            return
+        self.plot_graph(view_ylim=self.ax.get_ylim(), **self._last_plot)
+
+    def draw_idle(self):
+        """Запрашивает отложенную перерисовку канваса"""
+        if self.canvas:
+            self.canvas.draw_idle()
@@ -0,0 +1,185 @@
+import threading
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from data_handler import read_csv_chunks, read_text_chunks, describe_schema, LoadCancelled
+from profiling import span, trace
+
+
+class CSVLoadWorker(QObject):
+    """
+    Загружает CSV в фоновом потоке (объект переносится в QThread).
+
+    Файл читается по частям, прогресс передается сигналом progress, готовый
+    DataFrame передается в поток интерфейса целиком сигналом loaded. Если
+    передан кэш разбора (ParseCache), неизмененный файл читается из него.
+    """
+
+    progress = pyqtSignal(object, object, object)  # Прочитано байт, всего байт, прочитано строк
+    loaded = pyqtSignal(object, object)  # Готовый DataFrame и его схема
+    failed = pyqtSignal(str)  # Текст ошибки
+    cancelled = pyqtSignal()
+
+    def __init__(self, file_path, lean=False, cache=None):
+        super().__init__()
+        self.file_path = file_path
+        self.lean = lean
+        self.cache = cache
+        self.bytes_read = 0  # Сколько байт файла разобрано (смещение для дочитывания)
+        self._cancel_event = threading.Event()
+
+    def run(self):
+        """Читает файл; вызывается в фоновом потоке"""
+        try:
+            with trace("load", file=self.file_path):
+                df = read_csv_chunks(
+                    self.file_path,
+                    progress_callback=self.report_progress,
+                    is_cancelled=self._cancel_event.is_set,
+                    lean=self.lean,
+                    cache=self.cache
+                )
+                with span("load.describe_schema"):
+                    schema = describe_schema(df)
+        except LoadCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.loaded.emit(df, schema)
+
+    def report_progress(self, bytes_read, total_bytes, rows):
+        self.bytes_read = bytes_read
+        self.progress.emit(bytes_read, total_bytes, rows)
+
+    def cancel(self):
+        """Запрашивает остановку загрузки (потокобезопасно)"""
+        self._cancel_event.set()
+
+
+class TextParseWorker(QObject):
+    """
+    Разбирает вставленный текст в фоновом потоке.
+
+    Сначала сигналом preview передаются первые строки, разделитель и типы
+    столбцов, затем сигналом parsed - весь DataFrame. Каждый сигнал несет номер
+    поколения текста, чтобы интерфейс отбрасывал результаты устаревших правок.
+    """
+
+    preview = pyqtSignal(int, object, str, object)  # Поколение, первые строки, разделитель, типы столбцов
+    parsed = pyqtSignal(int, object, object)  # Поколение, DataFrame и его схема
+    failed = pyqtSignal(int, str)  # Поколение, текст ошибки
+    cancelled = pyqtSignal()
+
+    def __init__(self, text, generation, lean=False):
+        super().__init__()
+        self.text = text  # Ссылка на строку, без копирования
+        self.generation = generation
+        self.lean = lean
+        self._cancel_event = threading.Event()
+
+    def run(self):
+        """Разбирает текст; вызывается в фоновом потоке"""
+        try:
+            with trace("paste", chars=len(self.text)):
+                df = read_text_chunks(
+                    self.text,
+                    preview_callback=lambda rows, separator, columns: self.preview.emit(
+                        self.generation, rows, separator, columns
+                    ),
+                    is_cancelled=self._cancel_event.is_set,
+                    lean=self.lean
+                )
+                with span("paste.describe_schema"):
+                    schema = describe_schema(df)
+        except LoadCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(self.generation, str(e))
+            return
+        finally:
+            self.text = None
+        self.parsed.emit(self.generation, df, schema)
+
+    def cancel(self):
+        """Запрашивает остановку разбора (потокобезопасно)"""
+        self._cancel_event.set()
+
+
+class RenderWorker(QObject):
+    """
+    Рисует графики в фоновом потоке (объект переносится в QThread).
+
+    Задания рисуются на запасной закадровой фигуре с холстом Agg, готовая
+    фигура передается в поток интерфейса сигналом rendered и показывается
+    на видимом холсте изображением.
+    Хранится только последнее задание: задания, пришедшие, пока поток был
+    занят, заменяют друг друга, а устаревшее поколение бросается до растеризации.
+    """
+
+    rendered = pyqtSignal(int, object, object, object)  # Поколение, фигура, ось, артисты шаблона
+    failed = pyqtSignal(int, str)  # Поколение, текст ошибки
+    _wake = pyqtSignal()
+
+    def __init__(self, draw_function, figure_function):
+        super().__init__()
+        self.draw_function = draw_function  # draw_function(ax, job) рисует задание и возвращает артисты шаблона
+        self.figure_function = figure_function  # figure_function(job, spare) возвращает (фигура, ось) под задание
+        self._lock = threading.Lock()
+        self._pending = None  # Последнее не начатое задание
+        self._latest = 0  # Поколение последнего запроса
+        self._spare = []  # Свободные фигуры с осями для следующих заданий
+        self._wake.connect(self.process)
+
+    def submit(self, job):
+        """Ставит задание в очередь вместо предыдущего (потокобезопасно)"""
+        with self._lock:
+            self._pending = job
+            self._latest = job["generation"]
+        self._wake.emit()
+
+    def cancel(self, generation):
+        """Отменяет задания старше поколения generation (потокобезопасно)"""
+        with self._lock:
+            self._latest = max(self._latest, generation)
+            if self._pending is not None and self._pending["generation"] < self._latest:
+                self._pending = None
+
+    def recycle(self, figure, ax):
+        """Возвращает фигуру для повторного использования (потокобезопасно)"""
+        with self._lock:
+            self._spare.append((figure, ax))
+
+    def is_superseded(self, generation):
+        return generation < self._latest
+
+    @pyqtSlot()
+    def process(self):
+        """Рисует последнее задание; вызывается в фоновом потоке"""
+        with self._lock:
+            job, self._pending = self._pending, None
+        if job is None or self.is_superseded(job["generation"]):
+            return
+
+        figure, ax = self._take_figure(job)
+        generation = job["generation"]
+        try:
+            with trace("render_worker", template=job["template_name"], generation=generation):
+                handles = self.draw_function(ax, job)
+                # Растеризация - самый долгий этап, устаревшее задание до нее не доходит
+                if self.is_superseded(generation):
+                    self.recycle(figure, ax)
+                    return
+                with span("render.canvas_draw"):
+                    figure.canvas.draw()
+        except Exception as e:
+            self.recycle(figure, ax)
+            self.failed.emit(generation, str(e))
+            return
+        self.rendered.emit(generation, figure, ax, handles)
+
+    def _take_figure(self, job):
+        """Берет свободную фигуру (или создает новую) с размером и разрешением видимой"""
+        with self._lock:
+            spare = self._spare.pop() if self._spare else None
+        return self.figure_function(job, spare)